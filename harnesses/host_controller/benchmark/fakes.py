@@ -0,0 +1,129 @@
+#
+# Copyright (C) 2018 The Android Open Source Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""Fake services which let the console run offline in benchmarks."""
+
+import json
+import SocketServer
+import threading
+
+from host_controller.tradefed import remote_client
+
+
+class FakeBuildProvider(object):
+    """A build provider which has no artifacts and never downloads."""
+
+    def Authenticate(self, *args, **kwargs):
+        pass
+
+    def GetBuildList(self, *args, **kwargs):
+        return []
+
+    def GetArtifact(self, *args, **kwargs):
+        return {}, {}, {"build_id": "0"}, {}
+
+    def GetAdditionalFile(self, rel_path=None):
+        return {}
+
+    def __del__(self):
+        pass
+
+
+class FakeVtiClient(object):
+    """A VTI endpoint client which accepts every call and leases no job."""
+
+    def LeaseJob(self, *args, **kwargs):
+        return None, {}
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: None
+
+
+class FakeTfcClient(object):
+    """A TFC client which has no requests and accepts every call."""
+
+    def TestResourceList(self, request_id):
+        return []
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: None
+
+
+class _RemoteManagerHandler(SocketServer.StreamRequestHandler):
+    """Responds to the operations in one connection."""
+
+    def handle(self):
+        responses = []
+        for line in self.rfile.read().split("\n"):
+            if not line:
+                continue
+            operation = json.loads(line)
+            responses.append(
+                json.dumps(self.server.Respond(operation["type"])))
+        self.wfile.write("\n".join(responses) + "\n")
+
+
+class FakeRemoteManager(SocketServer.ThreadingMixIn, SocketServer.TCPServer):
+    """A TradeFed remote manager which reports fake devices.
+
+    Attributes:
+        port: integer, the port which the manager listens to.
+        _devices: list of dicts, the ListDevices response.
+        _thread: threading.Thread, the serving thread.
+    """
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, num_devices=4):
+        SocketServer.TCPServer.__init__(self, (remote_client.LOCALHOST, 0),
+                                        _RemoteManagerHandler)
+        self.port = self.server_address[1]
+        self._devices = [{
+            "product": "sailfish",
+            "variant": "sailfish",
+            "battery": "100",
+            "stub": False,
+            "state": "Available",
+            "build": "0",
+            "serial": "FAKE%04d" % index,
+            "sdk": "28",
+        } for index in range(num_devices)]
+        self._thread = None
+
+    def Respond(self, operation_type):
+        """Returns the JSON response to an operation type."""
+        if operation_type == "LIST_DEVICES":
+            return {"serials": self._devices}
+        if operation_type == "GET_LAST_COMMAND_RESULT":
+            return {
+                "status": "INVOCATION_SUCCESS",
+                "free_device_state": "AVAILABLE"
+            }
+        return {}
+
+    def Start(self):
+        """Serves in a daemon thread."""
+        self._thread = threading.Thread(target=self.serve_forever)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def Stop(self):
+        """Stops serving and closes the socket."""
+        self.shutdown()
+        self.server_close()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
@@ -0,0 +1,358 @@
+#!/usr/bin/env python
+#
+# Copyright (C) 2018 The Android Open Source Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""Benchmarks the start-up time and the command latency of the console.
+
+The console runs offline with fake build providers, fake VTI and TFC
+clients, and a fake TradeFed remote manager. The results are stored as
+JSON and compared with the previous run:
+
+    python -m host_controller.benchmark.startup_benchmark [--baseline FILE]
+
+The exit code is 1 if any metric regresses by more than the threshold.
+"""
+
+import argparse
+import glob
+import json
+import os
+import StringIO
+import subprocess
+import sys
+import time
+
+from host_controller import common
+
+# The directory where the results are stored by default.
+_DEFAULT_OUTPUT_DIR = os.path.join(common._DATA_DIR, "benchmark")
+
+# The directory containing the host_controller package.
+_PACKAGE_PARENT_DIR = os.path.dirname(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# The modules whose import time is measured in a new interpreter, in
+# addition to the command processors.
+_IMPORTED_MODULES = (
+    "host_controller.console",
+    "host_controller.main",
+    "host_controller.build.build_provider_ab",
+    "host_controller.build.build_provider_gcs",
+    "host_controller.build.build_provider_local_fs",
+    "host_controller.build.build_provider_pab",
+)
+
+# The default relative change of a metric reported as a regression.
+_DEFAULT_THRESHOLD = 0.2
+
+
+def _CreateConsole(out_file, remote_port=None):
+    """Creates a console connected to fake services.
+
+    Args:
+        out_file: the file object of the console output.
+        remote_port: integer, the port of the fake remote manager. None if
+                     the console has no host.
+
+    Returns:
+        A console.Console object.
+    """
+    from host_controller import console
+    from host_controller import tfc_host_controller
+    from host_controller.benchmark import fakes
+    from host_controller.tradefed import remote_client
+
+    tfc = fakes.FakeTfcClient()
+    hosts = []
+    if remote_port is not None:
+        hosts.append(
+            tfc_host_controller.HostController(
+                remote_client.RemoteClient(port=remote_port), tfc,
+                "localhost", ["local-cluster"]))
+    return console.Console(
+        fakes.FakeVtiClient(),
+        tfc,
+        fakes.FakeBuildProvider(),
+        hosts,
+        in_file=StringIO.StringIO(),
+        out_file=out_file)
+
+
+def _Median(values):
+    """Returns the median of a non-empty list."""
+    values = sorted(values)
+    middle = len(values) // 2
+    if len(values) % 2:
+        return values[middle]
+    return (values[middle - 1] + values[middle]) / 2.0
+
+
+def _RunPython(args):
+    """Runs a new interpreter in the package directory.
+
+    Args:
+        args: list of strings, the arguments of the interpreter.
+
+    Returns:
+        A tuple of (wall time in seconds, stdout). stdout is None if the
+        process fails.
+    """
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(
+        [_PACKAGE_PARENT_DIR] + ([env["PYTHONPATH"]]
+                                 if env.get("PYTHONPATH") else []))
+    start_time = time.time()
+    proc = subprocess.Popen(
+        [sys.executable] + args,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        cwd=_PACKAGE_PARENT_DIR,
+        env=env)
+    stdout, stderr = proc.communicate()
+    elapsed_secs = time.time() - start_time
+    if proc.returncode:
+        print("Failed to run %s: %s" % (args, stderr.strip().split("\n")[-1]))
+        return elapsed_secs, None
+    return elapsed_secs, stdout
+
+
+def MeasureColdStart(iterations):
+    """Measures the time to start an interpreter and create a console.
+
+    Returns:
+        A float, the median seconds. None if the console cannot start.
+    """
+    times = []
+    for _ in range(iterations):
+        elapsed_secs, stdout = _RunPython(
+            ["-m", "host_controller.benchmark.startup_benchmark",
+             "--child-cold-start"])
+        if stdout is None:
+            return None
+        times.append(elapsed_secs)
+    return _Median(times)
+
+
+def MeasureImportTimes(module_names, iterations):
+    """Measures the time to import each module in a new interpreter.
+
+    Args:
+        module_names: list of strings, the module names.
+        iterations: integer, the number of interpreters per module.
+
+    Returns:
+        A dict of {module name: median seconds}. The modules which cannot be
+        imported are excluded.
+    """
+    import_times = {}
+    for module_name in module_names:
+        times = []
+        for _ in range(iterations):
+            _, stdout = _RunPython([
+                "-c", "import time; start = time.time(); "
+                "__import__(%r); print(time.time() - start)" % module_name
+            ])
+            if stdout is None:
+                break
+            times.append(float(stdout.strip().split("\n")[-1]))
+        if times:
+            import_times[module_name] = _Median(times)
+    return import_times
+
+
+def MeasureConsoleInit(iterations):
+    """Measures the construction time of a console in this process.
+
+    Returns:
+        A float, the median seconds.
+    """
+    _CreateConsole(StringIO.StringIO())
+    times = []
+    for _ in range(iterations):
+        start_time = time.time()
+        _CreateConsole(StringIO.StringIO())
+        times.append(time.time() - start_time)
+    return _Median(times)
+
+
+def MeasureCommandThroughput(console, command, num_commands):
+    """Measures the number of commands executed per second.
+
+    Args:
+        console: the console.Console object.
+        command: string, the command line.
+        num_commands: integer, the number of executions.
+
+    Returns:
+        A float, the commands per second.
+    """
+    stdout = sys.stdout
+    sys.stdout = open(os.devnull, "w")
+    try:
+        start_time = time.time()
+        for _ in range(num_commands):
+            console.onecmd(command)
+        elapsed_secs = time.time() - start_time
+    finally:
+        sys.stdout.close()
+        sys.stdout = stdout
+    return num_commands / max(elapsed_secs, 1e-9)
+
+
+def RunBenchmarks(iterations, num_commands):
+    """Runs all benchmarks.
+
+    Args:
+        iterations: integer, the number of repetitions of the start-up
+                    benchmarks.
+        num_commands: integer, the number of commands in the throughput
+                      benchmarks.
+
+    Returns:
+        A dict of {metric name: value}. The names ending with "_secs" are
+        better when lower; the names ending with "_per_sec" are better when
+        higher.
+    """
+    from host_controller import console
+    from host_controller.benchmark import fakes
+
+    metrics = {}
+    cold_start_secs = MeasureColdStart(iterations)
+    if cold_start_secs is not None:
+        metrics["cold_start_secs"] = cold_start_secs
+
+    module_names = list(_IMPORTED_MODULES) + sorted(
+        "host_controller.command_processor." + module_name
+        for module_name, _ in console.COMMAND_PROCESSORS.itervalues())
+    for module_name, secs in MeasureImportTimes(module_names,
+                                                iterations).iteritems():
+        metrics["import.%s_secs" % module_name] = secs
+
+    metrics["console_init_secs"] = MeasureConsoleInit(iterations)
+
+    remote_manager = fakes.FakeRemoteManager()
+    remote_manager.Start()
+    try:
+        bench_console = _CreateConsole(
+            StringIO.StringIO(), remote_port=remote_manager.port)
+        bench_console.do_noop = lambda line: None
+        metrics["noop_commands_per_sec"] = MeasureCommandThroughput(
+            bench_console, "noop --arg value", num_commands)
+        metrics["list_devices_commands_per_sec"] = MeasureCommandThroughput(
+            bench_console, "list devices", num_commands)
+        bench_console.TearDown()
+    finally:
+        remote_manager.Stop()
+    return metrics
+
+
+def CompareMetrics(baseline, current, threshold=_DEFAULT_THRESHOLD):
+    """Finds the metrics which regress from the baseline.
+
+    Args:
+        baseline: dict of {metric name: value}.
+        current: dict of {metric name: value}.
+        threshold: float, the relative change reported as a regression.
+
+    Returns:
+        A list of (metric name, baseline value, current value), sorted by
+        name.
+    """
+    regressions = []
+    for name in sorted(set(baseline) & set(current)):
+        old_value = baseline[name]
+        new_value = current[name]
+        if not old_value:
+            continue
+        if name.endswith("_per_sec"):
+            change = (old_value - new_value) / float(old_value)
+        else:
+            change = (new_value - old_value) / float(old_value)
+        if change > threshold:
+            regressions.append((name, old_value, new_value))
+    return regressions
+
+
+def _GetLatestResult(output_dir):
+    """Returns the path to the latest result file. None if none exists."""
+    paths = sorted(glob.glob(os.path.join(output_dir, "*.json")))
+    return paths[-1] if paths else None
+
+
+def main():
+    """Runs the benchmarks, stores the result and compares with baseline."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument(
+        "--iterations",
+        type=int,
+        default=5,
+        help="The number of repetitions of the start-up benchmarks.")
+    parser.add_argument(
+        "--commands",
+        type=int,
+        default=1000,
+        help="The number of commands in the throughput benchmarks.")
+    parser.add_argument(
+        "--output-dir",
+        default=_DEFAULT_OUTPUT_DIR,
+        help="The directory where the result is stored.")
+    parser.add_argument(
+        "--baseline",
+        default=None,
+        help="The result file to compare with. Default: the latest result "
+        "in the output directory.")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=_DEFAULT_THRESHOLD,
+        help="The relative change reported as a regression.")
+    parser.add_argument(
+        "--child-cold-start", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child_cold_start:
+        _CreateConsole(StringIO.StringIO())
+        return 0
+
+    baseline_path = args.baseline or _GetLatestResult(args.output_dir)
+    metrics = RunBenchmarks(args.iterations, args.commands)
+    for name in sorted(metrics):
+        print("%-70s %12.4f" % (name, metrics[name]))
+
+    if not os.path.exists(args.output_dir):
+        os.makedirs(args.output_dir)
+    output_path = os.path.join(args.output_dir,
+                               time.strftime("%Y%m%d-%H%M%S.json"))
+    with open(output_path, "w") as output_file:
+        json.dump({
+            "timestamp": time.time(),
+            "python": sys.version.split()[0],
+            "metrics": metrics
+        }, output_file, indent=2, sort_keys=True)
+    print("Result: %s" % output_path)
+
+    if not baseline_path:
+        return 0
+    with open(baseline_path, "r") as baseline_file:
+        baseline = json.load(baseline_file)["metrics"]
+    regressions = CompareMetrics(baseline, metrics, args.threshold)
+    print("Baseline: %s" % baseline_path)
+    for name, old_value, new_value in regressions:
+        print("REGRESSION %s: %.4f -> %.4f" % (name, old_value, new_value))
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+#
+# Copyright (C) 2018 The Android Open Source Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+
+import unittest
+
+from host_controller.benchmark import fakes
+from host_controller.benchmark import startup_benchmark
+from host_controller.tradefed import remote_client
+
+
+class StartupBenchmarkTest(unittest.TestCase):
+    """A class for unit testing startup_benchmark.py."""
+
+    def testCompareMetrics(self):
+        """Tests the direction of the regressions."""
+        baseline = {
+            "cold_start_secs": 1.0,
+            "console_init_secs": 1.0,
+            "noop_commands_per_sec": 1000.0,
+            "list_devices_commands_per_sec": 1000.0,
+            "removed_secs": 1.0,
+        }
+        current = {
+            "cold_start_secs": 1.5,
+            "console_init_secs": 0.5,
+            "noop_commands_per_sec": 700.0,
+            "list_devices_commands_per_sec": 1500.0,
+            "added_secs": 1.0,
+        }
+        self.assertEqual([("cold_start_secs", 1.0, 1.5),
+                          ("noop_commands_per_sec", 1000.0, 700.0)],
+                         startup_benchmark.CompareMetrics(
+                             baseline, current, threshold=0.2))
+        self.assertEqual([],
+                         startup_benchmark.CompareMetrics(
+                             baseline, current, threshold=0.6))
+
+    def testMedian(self):
+        """Tests the median of odd and even lengths."""
+        self.assertEqual(2, startup_benchmark._Median([3, 1, 2]))
+        self.assertEqual(2.5, startup_benchmark._Median([4, 1, 3, 2]))
+
+    def testFakeRemoteManager(self):
+        """Tests listing the fake devices through RemoteClient."""
+        manager = fakes.FakeRemoteManager(num_devices=2)
+        manager.Start()
+        try:
+            devices = remote_client.RemoteClient(
+                port=manager.port).ListDevices()
+        finally:
+            manager.Stop()
+        self.assertEqual(["FAKE0000", "FAKE0001"],
+                         [device.device_serial for device in devices])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -15,26 +15,68 @@
 #
 """Class to flash build artifacts onto devices"""
 
+import contextlib
 import hashlib
 import logging
 import os
 import resource
+import shutil
 import sys
 import tempfile
 import time
+import zipfile
 
 from host_controller import common
+from host_controller.utils.cmd import cmd_watchdog
+from host_controller.utils.metrics import metrics
+from host_controller.utils.trace import tracer
 from vts.utils.python.common import cmd_utils
 from vts.utils.python.controllers import android_device
 
 
+class _StepResult(object):
+    """The result of a flash step.
+
+    Attributes:
+        success: boolean, whether the step succeeded. The body of the step
+                 sets it to False if the step fails without raising.
+    """
+
+    def __init__(self):
+        self.success = True
+
+
 class BuildFlasher(object):
     """Client that manages build flashing.
 
     Attributes:
         device: AndroidDevice, the device associated with the client.
+        _ANDROID_INFO_FILE_NAME: string, the file that fastboot checks the
+                                 requirements in before update or flashall.
+        _UPDATE_PACKAGE_EXCLUDED: tuple of strings, the partitions flashed
+                                  separately from the update package.
+        _STEP_TIMEOUT_SECS: dict of {step name: seconds}, the deadlines
+                            after which the adb or fastboot processes of a
+                            hung step are killed.
+        _flash_stats: FlashStats, where the timing of each step is recorded.
+                      None to disable recording.
     """
 
+    _ANDROID_INFO_FILE_NAME = "android-info.txt"
+    _UPDATE_PACKAGE_EXCLUDED = (common.FULL_ZIPFILE, "bootloader", "radio")
+    _STEP_TIMEOUT_SECS = {
+        "wait_for_device": 600,
+        "reboot_bootloader": 300,
+        "flash": 900,
+        "update": 1800,
+        "flashall": 1800,
+        "erase": 300,
+        "wipe": 600,
+        "reboot": 300,
+    }
+
+    _flash_stats = None
+
     def __init__(self, serial="", customflasher_path=""):
         """Initialize the client.
 
@@ -81,6 +123,90 @@ class BuildFlasher(object):
             serial, device_callback_port=-1)
         return True
 
+    def SetFlashStats(self, flash_stats):
+        """Sets the object recording the timing of flash steps.
+
+        Args:
+            flash_stats: FlashStats object. None to disable recording.
+        """
+        self._flash_stats = flash_stats
+
+    @contextlib.contextmanager
+    def _TimedStep(self, step, partition=None, image_path=None):
+        """Enforces the deadline of a flash step and records its duration.
+
+        The step is recorded in the trace, the metrics and, if set, the
+        FlashStats.
+
+        Args:
+            step: string, the name of the step, e.g., "flash" or "reboot".
+            partition: string, the partition that the step writes to.
+            image_path: string, the path to the image written by the step.
+
+        Yields:
+            A _StepResult object, which the step marks as failed if it
+            fails without raising an exception.
+
+        Raises:
+            cmd_watchdog.CommandTimeoutError if the step is killed.
+        """
+        name = "%s %s" % (step, partition) if partition else step
+        serial = str(self.device.serial)
+        deadline = cmd_watchdog.Deadline(
+            self._STEP_TIMEOUT_SECS.get(step), serial, name)
+        num_bytes = 0
+        if image_path and os.path.isfile(image_path):
+            num_bytes = os.path.getsize(image_path)
+        span = tracer.Span(name, "flash", serial=serial, bytes=num_bytes)
+        start_time = time.time()
+        step_result = _StepResult()
+        success = False
+        try:
+            with span, deadline:
+                yield step_result
+            success = step_result.success
+        finally:
+            duration_secs = time.time() - start_time
+            metrics.FLASH_STEP_SECONDS.Observe(duration_secs, serial=serial,
+                                               step=step)
+            if self._flash_stats is not None:
+                self._flash_stats.AddRecord(serial, step, partition,
+                                            num_bytes, start_time,
+                                            duration_secs, success)
+
+    def _WaitForAdbDevice(self):
+        """Waits for the device to be online in adb within a deadline."""
+        with cmd_watchdog.Deadline(self._STEP_TIMEOUT_SECS["wait_for_device"],
+                                   str(self.device.serial),
+                                   "adb wait-for-device"):
+            self.device.adb.wait_for_device()
+
+    def RebootToBootloader(self, timeout_secs=120):
+        """Reboots the device to bootloader unless it is already there.
+
+        Args:
+            timeout_secs: integer, the maximum time to wait for the device
+                          to enter bootloader mode (unit: seconds).
+
+        Returns:
+            True if the device is in bootloader mode; False otherwise.
+        """
+        if self.device.isBootloaderMode:
+            return True
+
+        self._WaitForAdbDevice()
+        with self._TimedStep("reboot_bootloader") as step_result:
+            self.device.log.info(self.device.adb.reboot_bootloader())
+            start = time.time()
+            while not self.device.isBootloaderMode:
+                if time.time() - start >= timeout_secs:
+                    logging.error("Timeout while waiting for %s to enter "
+                                  "bootloader mode.", self.device.serial)
+                    step_result.success = False
+                    break
+                time.sleep(1)
+        return step_result.success
+
     def FlashGSI(self, system_img, vbmeta_img=None, skip_check=False):
         """Flash the Generic System Image to the device.
 
@@ -92,18 +218,25 @@ class BuildFlasher(object):
         """
         if not os.path.exists(system_img):
             raise ValueError("Couldn't find system image at %s" % system_img)
-        if not skip_check:
-            self.device.adb.wait_for_device()
-            if not self.device.isBootloaderMode:
+        if not skip_check and not self.device.isBootloaderMode:
+            self._WaitForAdbDevice()
+            with self._TimedStep("reboot_bootloader"):
                 self.device.log.info(self.device.adb.reboot_bootloader())
         if vbmeta_img is not None:
+            with self._TimedStep("flash", "vbmeta", vbmeta_img):
+                self.device.log.info(
+                    self.device.fastboot.flash('vbmeta', vbmeta_img))
+        with self._TimedStep("erase", "system"):
+            self.device.log.info(self.device.fastboot.erase('system'))
+        with self._TimedStep("flash", "system", system_img):
             self.device.log.info(
-                self.device.fastboot.flash('vbmeta', vbmeta_img))
-        self.device.log.info(self.device.fastboot.erase('system'))
-        self.device.log.info(self.device.fastboot.flash('system', system_img))
-        self.device.log.info(self.device.fastboot.erase('metadata'))
-        self.device.log.info(self.device.fastboot._w())
-        self.device.log.info(self.device.fastboot.reboot())
+                self.device.fastboot.flash('system', system_img))
+        with self._TimedStep("erase", "metadata"):
+            self.device.log.info(self.device.fastboot.erase('metadata'))
+        with self._TimedStep("wipe"):
+            self.device.log.info(self.device.fastboot._w())
+        with self._TimedStep("reboot"):
+            self.device.log.info(self.device.fastboot.reboot())
 
     def Flashall(self, directory):
         """Flash all images in a directory to the device using flashall.
@@ -112,19 +245,51 @@ class BuildFlasher(object):
         Args:
             directory: string, path to directory containing images
         """
-        # fastboot flashall looks for imgs in $ANDROID_PRODUCT_OUT
-        os.environ['ANDROID_PRODUCT_OUT'] = directory
-        self.device.adb.wait_for_device()
         if not self.device.isBootloaderMode:
-            self.device.log.info(self.device.adb.reboot_bootloader())
-        self.device.log.info(self.device.fastboot.flashall())
+            self._WaitForAdbDevice()
+            with self._TimedStep("reboot_bootloader"):
+                self.device.log.info(self.device.adb.reboot_bootloader())
+        with self._TimedStep("flashall") as step_result:
+            step_result.success = self._FastbootFlashall(directory)
+
+    def _FastbootFlashall(self, product_out, *args):
+        """Runs fastboot flashall with the images in a directory.
 
-    def Flash(self, device_images):
+        fastboot reads the images from $ANDROID_PRODUCT_OUT. The variable is
+        set for the fastboot process only, so that the devices flashed in
+        parallel threads don't share it.
+
+        Args:
+            product_out: string, the directory containing the images.
+            *args: strings, the additional arguments of flashall.
+
+        Returns:
+            True if fastboot succeeds; False otherwise.
+        """
+        serial = str(self.device.serial)
+        # The Deadline of the flash step kills the command.
+        stdout, stderr, return_code = cmd_watchdog.ExecuteOneShellCommand(
+            " ".join(["fastboot", "-s", serial, "flashall"] + list(args)),
+            timeout_secs=None,
+            serial=serial,
+            env={"ANDROID_PRODUCT_OUT": product_out})
+        self.device.log.info(stderr or stdout)
+        if return_code != 0:
+            logging.error("fastboot flashall on %s returned %s", serial,
+                          return_code)
+            return False
+        return True
+
+    def Flash(self, device_images, update_package=None):
         """Flash the Generic System Image to the device.
 
         Args:
             device_images: dict, where the key is partition name and value is
                            image file path.
+            update_package: string, "zip" or "dir" to flash all partitions
+                            except bootloader and radio by one fastboot
+                            update or flashall command respectively.
+                            None to flash the partitions one by one.
 
         Returns:
             True if succesful; False otherwise
@@ -134,9 +299,10 @@ class BuildFlasher(object):
             return False
 
         if not self.device.isBootloaderMode:
-            self.device.adb.wait_for_device()
+            self._WaitForAdbDevice()
             print("rebooting to bootloader")
-            self.device.log.info(self.device.adb.reboot_bootloader())
+            with self._TimedStep("reboot_bootloader"):
+                self.device.log.info(self.device.adb.reboot_bootloader())
 
         print("checking to flash bootloader.img and radio.img")
         for partition in ["bootloader", "radio"]:
@@ -144,19 +310,27 @@ class BuildFlasher(object):
                 image_path = device_images[partition]
                 self.device.log.info("fastboot flash %s %s",
                                      partition, image_path)
-                self.device.log.info(
-                    self.device.fastboot.flash(partition, image_path))
+                with self._TimedStep("flash", partition, image_path):
+                    self.device.log.info(
+                        self.device.fastboot.flash(partition, image_path))
                 self.device.log.info("fastboot reboot_bootloader")
-                self.device.log.info(self.device.fastboot.reboot_bootloader())
+                with self._TimedStep("reboot_bootloader"):
+                    self.device.log.info(
+                        self.device.fastboot.reboot_bootloader())
+
+        if update_package:
+            return self._FlashUpdatePackage(device_images, update_package)
 
         print("starting to flash vendor and other images...")
         if common.FULL_ZIPFILE in device_images:
             print("fastboot update %s --skip-reboot" %
                   (device_images[common.FULL_ZIPFILE]))
-            self.device.log.info(
-                self.device.fastboot.update(
-                    device_images[common.FULL_ZIPFILE],
-                    "--skip-reboot"))
+            with self._TimedStep("update", common.FULL_ZIPFILE,
+                                 device_images[common.FULL_ZIPFILE]):
+                self.device.log.info(
+                    self.device.fastboot.update(
+                        device_images[common.FULL_ZIPFILE],
+                        "--skip-reboot"))
 
         for partition, image_path in device_images.iteritems():
             if partition in (common.FULL_ZIPFILE, "system", "vbmeta",
@@ -166,8 +340,9 @@ class BuildFlasher(object):
                 self.device.log.warning("%s image is empty", partition)
                 continue
             self.device.log.info("fastboot flash %s %s", partition, image_path)
-            self.device.log.info(
-                self.device.fastboot.flash(partition, image_path))
+            with self._TimedStep("flash", partition, image_path):
+                self.device.log.info(
+                    self.device.fastboot.flash(partition, image_path))
 
         print("starting to flash system and other images...")
         if "system" in device_images and device_images["system"]:
@@ -177,6 +352,119 @@ class BuildFlasher(object):
                 and device_images["vbmeta"]) else None
             self.FlashGSI(system_img, vbmeta_img, skip_check=True)
         else:
+            with self._TimedStep("reboot"):
+                self.device.log.info(self.device.fastboot.reboot())
+        return True
+
+    def _CreateUpdatePackage(self, device_images, package_type, dest_dir):
+        """Assembles the images into a package that fastboot flashes at once.
+
+        The images in the full zip file are extracted unless the same
+        partition is given separately. Other images are symlinked.
+
+        Args:
+            device_images: dict, where the key is partition name and value is
+                           image file path.
+            package_type: string, "zip" for an uncompressed zip file for
+                          fastboot update, "dir" for a directory for
+                          fastboot flashall.
+            dest_dir: string, the directory to create the package in.
+
+        Returns:
+            string, the path to the zip file or the directory.
+
+        Raises:
+            ValueError if package_type is unknown.
+        """
+        if package_type not in ("zip", "dir"):
+            raise ValueError("Unknown update package type: %s" % package_type)
+
+        image_dir = os.path.join(dest_dir, "images")
+        os.mkdir(image_dir)
+        for partition, image_path in device_images.iteritems():
+            if partition in self._UPDATE_PACKAGE_EXCLUDED or not image_path:
+                continue
+            file_name = (partition if partition.endswith(".img") else
+                         partition + ".img")
+            os.symlink(os.path.abspath(image_path),
+                       os.path.join(image_dir, file_name))
+
+        full_zip_path = device_images.get(common.FULL_ZIPFILE)
+        if full_zip_path:
+            with zipfile.ZipFile(full_zip_path, "r") as full_zip:
+                for name in full_zip.namelist():
+                    if not os.path.exists(os.path.join(image_dir, name)):
+                        full_zip.extract(name, image_dir)
+
+        android_info_path = os.path.join(image_dir,
+                                         self._ANDROID_INFO_FILE_NAME)
+        if not os.path.exists(android_info_path):
+            # fastboot requires the file but no requirement in it.
+            open(android_info_path, "w").close()
+
+        if package_type == "dir":
+            return image_dir
+
+        zip_path = os.path.join(dest_dir, "update.zip")
+        with zipfile.ZipFile(
+                zip_path, "w", zipfile.ZIP_STORED,
+                allowZip64=True) as update_zip:
+            for file_name in sorted(os.listdir(image_dir)):
+                update_zip.write(
+                    os.path.join(image_dir, file_name), file_name)
+        return zip_path
+
+    def _FlashUpdatePackage(self, device_images, package_type):
+        """Flashes the images by one fastboot command and reboots.
+
+        The device must be in bootloader mode.
+
+        Args:
+            device_images: dict, where the key is partition name and value is
+                           image file path.
+            package_type: string, "zip" or "dir".
+
+        Returns:
+            True if succesful; False otherwise
+        """
+        image_paths = [
+            path for partition, path in device_images.iteritems()
+            if path and partition not in ("bootloader", "radio")
+        ]
+        if not image_paths:
+            logging.warn("No image to flash by update package.")
+            with self._TimedStep("reboot"):
+                self.device.log.info(self.device.fastboot.reboot())
+            return True
+
+        # The package is large. Create it on the file system of the images.
+        package_dir = tempfile.mkdtemp(
+            dir=os.path.dirname(os.path.abspath(image_paths[0])))
+        try:
+            package_path = self._CreateUpdatePackage(
+                device_images, package_type, package_dir)
+            if package_type == "zip":
+                print("fastboot update %s --skip-reboot" % package_path)
+                with self._TimedStep("update", "package", package_path):
+                    self.device.log.info(
+                        self.device.fastboot.update(package_path,
+                                                    "--skip-reboot"))
+            else:
+                print("fastboot flashall --skip-reboot (%s)" % package_path)
+                with self._TimedStep("flashall", "package") as step_result:
+                    step_result.success = self._FastbootFlashall(
+                        package_path, "--skip-reboot")
+                if not step_result.success:
+                    return False
+        finally:
+            shutil.rmtree(package_dir, ignore_errors=True)
+
+        if "system" in device_images and device_images["system"]:
+            with self._TimedStep("erase", "metadata"):
+                self.device.log.info(self.device.fastboot.erase('metadata'))
+            with self._TimedStep("wipe"):
+                self.device.log.info(self.device.fastboot._w())
+        with self._TimedStep("reboot"):
             self.device.log.info(self.device.fastboot.reboot())
         return True
 
@@ -196,16 +484,19 @@ class BuildFlasher(object):
             return False
 
         if not self.device.isBootloaderMode:
-            self.device.adb.wait_for_device()
-            self.device.log.info(self.device.adb.reboot_bootloader())
+            self._WaitForAdbDevice()
+            with self._TimedStep("reboot_bootloader"):
+                self.device.log.info(self.device.adb.reboot_bootloader())
 
         for partition, image_path in device_images.iteritems():
             if partition.endswith(".img"):
                 partition = partition[:-4]
-            self.device.log.info(
-                self.device.fastboot.flash(partition, image_path))
+            with self._TimedStep("flash", partition, image_path):
+                self.device.log.info(
+                    self.device.fastboot.flash(partition, image_path))
         if reboot:
-            self.device.log.info(self.device.fastboot.reboot())
+            with self._TimedStep("reboot"):
+                self.device.log.info(self.device.fastboot.reboot())
         return True
 
     def WaitForDevice(self, timeout_secs=600):
@@ -218,7 +509,10 @@ class BuildFlasher(object):
         Returns:
             True if device is booted successfully; False otherwise.
         """
-        return self.device.waitForBootCompletion(timeout=timeout_secs)
+        with self._TimedStep("boot_wait") as step_result:
+            step_result.success = bool(
+                self.device.waitForBootCompletion(timeout=timeout_secs))
+        return step_result.success
 
     def FlashUsingCustomBinary(self,
                                device_images,
@@ -249,7 +543,7 @@ class BuildFlasher(object):
             return False
 
         if not self.device.isBootloaderMode:
-            self.device.adb.wait_for_device()
+            self._WaitForAdbDevice()
             print("rebooting to %s mode" % reboot_mode)
             self.device.log.info(self.device.adb.reboot(reboot_mode))
 
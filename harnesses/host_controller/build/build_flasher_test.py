@@ -16,8 +16,11 @@
 #
 
 import os
+import shutil
 import sys
+import tempfile
 import unittest
+import zipfile
 
 try:
     from unittest import mock
@@ -54,14 +57,130 @@ class BuildFlasherTest(unittest.TestCase):
         mock_device.fastboot.flash.assert_any_call('system', 'exists.img')
         mock_device.fastboot.erase.assert_any_call('metadata')
 
+    @mock.patch(
+        "host_controller.build.build_flasher.cmd_watchdog."
+        "ExecuteOneShellCommand")
     @mock.patch(
         "host_controller.build.build_flasher.android_device")
-    def testFlashall(self, mock_class):
+    def testFlashall(self, mock_class, mock_execute):
         mock_device = mock.Mock()
+        mock_device.serial = "thisismyserial"
+        mock_device.isBootloaderMode = True
         mock_class.AndroidDevice.return_value = mock_device
+        mock_execute.return_value = ("", "", 0)
         flasher = build_flasher.BuildFlasher("thisismyserial")
         flasher.Flashall("path/to/dir")
-        mock_device.fastboot.flashall.assert_called_with()
+        mock_execute.assert_called_with(
+            "fastboot -s thisismyserial flashall",
+            timeout_secs=None,
+            serial="thisismyserial",
+            env={"ANDROID_PRODUCT_OUT": "path/to/dir"})
+        self.assertNotEqual("path/to/dir",
+                            os.environ.get("ANDROID_PRODUCT_OUT"))
+
+    @mock.patch(
+        "host_controller.build.build_flasher.android_device")
+    def testFlashImageRecordsSteps(self, mock_class):
+        """Tests that each flash step is recorded with its partition."""
+        mock_device = mock.Mock()
+        mock_device.serial = "thisismyserial"
+        mock_device.isBootloaderMode = False
+        mock_class.AndroidDevice.return_value = mock_device
+        mock_stats = mock.Mock()
+        flasher = build_flasher.BuildFlasher("thisismyserial")
+        flasher.SetFlashStats(mock_stats)
+        flasher.FlashImage({"boot.img": "not/exists/boot.img"}, True)
+        steps = [(call[0][0], call[0][1], call[0][2], call[0][3], call[0][6])
+                 for call in mock_stats.AddRecord.call_args_list]
+        self.assertEqual([
+            ("thisismyserial", "reboot_bootloader", None, 0, True),
+            ("thisismyserial", "flash", "boot", 0, True),
+            ("thisismyserial", "reboot", None, 0, True),
+        ], steps)
+
+    @mock.patch(
+        "host_controller.build.build_flasher.android_device")
+    def testWaitForDeviceRecordsFailure(self, mock_class):
+        """Tests that a boot timeout is recorded as a failed step."""
+        mock_device = mock.Mock()
+        mock_device.serial = "thisismyserial"
+        mock_device.waitForBootCompletion.return_value = False
+        mock_class.AndroidDevice.return_value = mock_device
+        mock_stats = mock.Mock()
+        flasher = build_flasher.BuildFlasher("thisismyserial")
+        flasher.SetFlashStats(mock_stats)
+        self.assertFalse(flasher.WaitForDevice(1))
+        args = mock_stats.AddRecord.call_args[0]
+        self.assertEqual(("thisismyserial", "boot_wait", False),
+                         (args[0], args[1], args[6]))
+
+    @mock.patch("host_controller.build.build_flasher.time")
+    @mock.patch(
+        "host_controller.build.build_flasher.android_device")
+    def testRebootToBootloaderRecordsTimeout(self, mock_class, mock_time):
+        """Tests that a reboot timeout is recorded as a failed step."""
+        mock_device = mock.Mock()
+        mock_device.serial = "thisismyserial"
+        mock_device.isBootloaderMode = False
+        mock_class.AndroidDevice.return_value = mock_device
+        mock_time.time.side_effect = [0, 0, 0, 10, 10]
+        mock_stats = mock.Mock()
+        flasher = build_flasher.BuildFlasher("thisismyserial")
+        flasher.SetFlashStats(mock_stats)
+        self.assertFalse(flasher.RebootToBootloader(5))
+        args = mock_stats.AddRecord.call_args[0]
+        self.assertEqual(("thisismyserial", "reboot_bootloader", False),
+                         (args[0], args[1], args[6]))
+
+    @mock.patch(
+        "host_controller.build.build_flasher.android_device")
+    def testFlashUpdatePackage(self, mock_class):
+        """Tests flashing all partitions but radio by one fastboot update."""
+        mock_device = mock.Mock()
+        mock_device.isBootloaderMode = True
+        mock_class.AndroidDevice.return_value = mock_device
+        temp_dir = tempfile.mkdtemp()
+        try:
+            device_images = {}
+            for partition in ("radio", "system", "vendor"):
+                device_images[partition] = os.path.join(
+                    temp_dir, partition + ".img")
+                with open(device_images[partition], "w") as image_file:
+                    image_file.write(partition)
+            full_zip_path = os.path.join(temp_dir, "full.zip")
+            with zipfile.ZipFile(full_zip_path, "w") as full_zip:
+                full_zip.writestr("boot.img", "boot")
+                full_zip.writestr("vendor.img", "old vendor")
+                full_zip.writestr("android-info.txt", "require board=x")
+            device_images["full-zipfile"] = full_zip_path
+
+            packages = {}
+
+            def ReadPackage(package_path, *args):
+                with zipfile.ZipFile(package_path, "r") as package:
+                    packages.update((name, package.read(name))
+                                    for name in package.namelist())
+                    self.assertEqual(zipfile.ZIP_STORED,
+                                     package.getinfo("boot.img").compress_type)
+
+            mock_device.fastboot.update.side_effect = ReadPackage
+            flasher = build_flasher.BuildFlasher("thisismyserial")
+            self.assertTrue(flasher.Flash(device_images, update_package="zip"))
+
+            self.assertEqual({
+                "android-info.txt": "require board=x",
+                "boot.img": "boot",
+                "system.img": "system",
+                "vendor.img": "vendor",
+            }, packages)
+            mock_device.fastboot.flash.assert_called_once_with(
+                "radio", device_images["radio"])
+            mock_device.fastboot.erase.assert_called_once_with("metadata")
+            mock_device.fastboot.reboot.assert_called_once_with()
+            self.assertEqual(["full.zip", "radio.img", "system.img",
+                              "vendor.img"], sorted(os.listdir(temp_dir)))
+        finally:
+            shutil.rmtree(temp_dir)
 
     @mock.patch(
         "host_controller.build.build_flasher.android_device")
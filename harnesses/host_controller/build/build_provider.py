@@ -20,6 +20,7 @@ import tempfile
 import zipfile
 
 from host_controller import common
+from host_controller.utils.trace import tracer
 from vts.runners.host import utils
 
 
@@ -43,6 +44,8 @@ class BuildProvider(object):
         _test_suites: dict where the key is test suite type and value is the
                       test suite package file path.
         _tmp_dirpath: string, the temp dir path created to keep artifacts.
+        _keep_tmp_dir: boolean, whether the temp dir is kept after the
+                       provider is deleted, e.g., for a warm restart.
     """
     _CONFIG_FILE_EXTENSION = ".zip"
     _IMAGE_FILE_EXTENSIONS = [".img", ".bin"]
@@ -57,17 +60,53 @@ class BuildProvider(object):
         if not os.path.exists(tempdir_base):
             os.mkdir(tempdir_base)
         self._tmp_dirpath = tempfile.mkdtemp(dir=tempdir_base)
+        self._keep_tmp_dir = False
 
     def __del__(self):
-        """Deletes the temp dir if still set."""
-        if self._tmp_dirpath:
+        """Deletes the temp dir if still set and not kept."""
+        if self._tmp_dirpath and not self._keep_tmp_dir:
             shutil.rmtree(self._tmp_dirpath)
-            self._tmp_dirpath = None
+        self._tmp_dirpath = None
 
     @property
     def tmp_dirpath(self):
         return self._tmp_dirpath
 
+    def KeepTmpDir(self):
+        """Keeps the temp dir after this provider is deleted."""
+        self._keep_tmp_dir = True
+
+    def GetState(self):
+        """Returns the fetched files and the temp dir.
+
+        Returns:
+            A dict of built-in types which can be passed to RestoreState.
+        """
+        return {
+            "tmp_dirpath": self._tmp_dirpath,
+            "device_images": dict(self._device_images),
+            "test_suites": dict(self._test_suites),
+            "configs": dict(self._configs),
+            "additional_files": dict(self._additional_files),
+        }
+
+    def RestoreState(self, state):
+        """Adopts the temp dir and the fetched files of a previous provider.
+
+        The temp dir created by this provider is deleted.
+
+        Args:
+            state: dict returned by GetState.
+        """
+        if self._tmp_dirpath and self._tmp_dirpath != state["tmp_dirpath"]:
+            shutil.rmtree(self._tmp_dirpath, ignore_errors=True)
+        self._tmp_dirpath = state["tmp_dirpath"]
+        self._keep_tmp_dir = False
+        self._device_images = dict(state["device_images"])
+        self._test_suites = dict(state["test_suites"])
+        self._configs = dict(state["configs"])
+        self._additional_files = dict(state["additional_files"])
+
     def CreateNewTmpDir(self):
         return tempfile.mkdtemp(dir=self._tmp_dirpath)
 
@@ -108,7 +147,10 @@ class BuildProvider(object):
             if self._IsFullDeviceImage(zip_ref.namelist()):
                 self.SetDeviceImage(common.FULL_ZIPFILE, path)
             else:
-                zip_ref.extractall(dest_path)
+                with tracer.Span("extract", "build",
+                                 file=os.path.basename(path),
+                                 bytes=os.path.getsize(path)):
+                    zip_ref.extractall(dest_path)
                 self.SetFetchedDirectory(dest_path)
 
     def GetDeviceImage(self, name=None):
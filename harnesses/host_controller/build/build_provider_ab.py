@@ -15,8 +15,11 @@
 #
 
 import os
+import time
 
 from host_controller.build import build_provider
+from host_controller.utils.metrics import metrics
+from host_controller.utils.trace import tracer
 from vts.utils.python.build.api import artifact_fetcher
 
 
@@ -50,6 +53,7 @@ class BuildProviderAB(build_provider.BuildProvider):
 
         return recent_build_ids[0]
 
+    @tracer.Traced("ab fetch", "build")
     def Fetch(self, branch, target, artifact_name, build_id="latest"):
         """Fetches Android device artifact file(s) from Android Build.
 
@@ -78,9 +82,16 @@ class BuildProviderAB(build_provider.BuildProvider):
             artifact_name = artifact_name.replace("{build_id}", build_id)
 
         dest_filepath = os.path.join(self.tmp_dirpath, artifact_name)
-        self._artifact_fetcher.DownloadArtifactToFile(
-            branch, target, build_id, artifact_name,
-            dest_filepath=dest_filepath)
+        start_time = time.time()
+        with tracer.Span("download", "build", file=artifact_name) as span:
+            self._artifact_fetcher.DownloadArtifactToFile(
+                branch, target, build_id, artifact_name,
+                dest_filepath=dest_filepath)
+            if os.path.isfile(dest_filepath):
+                span.args["bytes"] = os.path.getsize(dest_filepath)
+        if "bytes" in span.args:
+            metrics.ObserveDownload("ab", span.args["bytes"],
+                                    time.time() - start_time)
 
         self.SetFetchedFile(dest_filepath)
 
@@ -17,13 +17,29 @@
 import logging
 import os
 import re
+import time
 import zipfile
 
 from host_controller.build import build_provider
+from host_controller.utils.cmd import cmd_watchdog
+from host_controller.utils.metrics import metrics
+from host_controller.utils.trace import tracer
 from vts.utils.python.common import cmd_utils
 
 _GCLOUD_AUTH_ENV_KEY = "run_gcs_key"
 
+# The cached result of GetGsutilPath.
+_gsutil_path = None
+
+
+def _GetSize(dir_path):
+    """Returns the total size of the files in a directory."""
+    num_bytes = 0
+    for dir_name, _, file_names in os.walk(dir_path):
+        for file_name in file_names:
+            num_bytes += os.path.getsize(os.path.join(dir_name, file_name))
+    return num_bytes
+
 
 class BuildProviderGCS(build_provider.BuildProvider):
     """A build provider for GCS (Google Cloud Storage)."""
@@ -57,11 +73,18 @@ class BuildProviderGCS(build_provider.BuildProvider):
 
     @staticmethod
     def GetGsutilPath():
-        """Returns the gsutil file path if found; None otherwise."""
+        """Returns the gsutil file path if found; None otherwise.
+
+        The path is cached after it is found.
+        """
+        global _gsutil_path
+        if _gsutil_path:
+            return _gsutil_path
         sh_stdout, sh_stderr, ret_code = cmd_utils.ExecuteOneShellCommand(
             "which gsutil")
         if ret_code == 0:
-            return sh_stdout.strip()
+            _gsutil_path = sh_stdout.strip()
+            return _gsutil_path
         else:
             logging.fatal("`gsutil` doesn't exist on the host; "
                           "please install Google Cloud SDK before retrying.")
@@ -82,6 +105,7 @@ class BuildProviderGCS(build_provider.BuildProvider):
         _, _, ret_code = cmd_utils.ExecuteOneShellCommand(check_command)
         return ret_code == 0
 
+    @tracer.Traced("gcs fetch", "build")
     def Fetch(self, path):
         """Fetches Android device artifact file(s) from GCS.
 
@@ -113,8 +137,13 @@ class BuildProviderGCS(build_provider.BuildProvider):
                 copy_command = "%s cp %s %s" % (gsutil_path, path,
                                                 temp_dir_path)
 
-            _, _, ret_code = cmd_utils.ExecuteOneShellCommand(copy_command)
+            start_time = time.time()
+            # The copy is killed with the console job.
+            _, _, ret_code = cmd_watchdog.ExecuteOneShellCommand(
+                copy_command, timeout_secs=None)
             if ret_code == 0:
+                metrics.ObserveDownload("gcs", _GetSize(temp_dir_path),
+                                        time.time() - start_time)
                 self.SetFetchedFile(dest_path, temp_dir_path)
             else:
                 logging.error("Error in copy file from GCS (code %s)." %
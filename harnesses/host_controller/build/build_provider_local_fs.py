@@ -15,6 +15,7 @@
 #
 
 from host_controller.build import build_provider
+from host_controller.utils.trace import tracer
 
 
 class BuildProviderLocalFS(build_provider.BuildProvider):
@@ -23,6 +24,7 @@ class BuildProviderLocalFS(build_provider.BuildProvider):
     def __init__(self):
         super(BuildProviderLocalFS, self).__init__()
 
+    @tracer.Traced("local_fs fetch", "build")
     def Fetch(self, path):
         """Fetches Android device artifact file(s) from a local path.
 
@@ -22,6 +22,7 @@ import json
 import logging
 import os
 import requests
+import time
 import urlparse
 from posixpath import join as path_urljoin
 
@@ -39,6 +40,9 @@ from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.support.ui import WebDriverWait
 
 from host_controller.build import build_provider
+from host_controller.utils.cmd import job_table
+from host_controller.utils.metrics import metrics
+from host_controller.utils.trace import tracer
 
 # constants for GET and POST endpoints
 GET = 'GET'
@@ -439,11 +443,20 @@ class BuildProviderPAB(build_provider.BuildProvider):
         response.raise_for_status()
 
         logging.info('%s now downloading...', download_url)
-        with open(filename, 'wb') as handle:
-            for block in response.iter_content(self.DEFAULT_CHUNK_SIZE):
-                handle.write(block)
+        start_time = time.time()
+        with tracer.Span("download", "build",
+                         file=os.path.basename(filename)) as span:
+            with open(filename, 'wb') as handle:
+                for block in response.iter_content(self.DEFAULT_CHUNK_SIZE):
+                    # Stops downloading if the console job is killed.
+                    job_table.CheckCurrentJob()
+                    handle.write(block)
+            span.args["bytes"] = os.path.getsize(filename)
+        metrics.ObserveDownload("pab", span.args["bytes"],
+                                time.time() - start_time)
         return True
 
+    @tracer.Traced("pab fetch", "build")
     def GetArtifact(self,
                     account_id,
                     branch,
@@ -151,6 +151,25 @@ class BuildProviderTest(unittest.TestCase):
             {"additional.txt": txt_file},
             self._build_provider.GetAdditionalFile())
 
+    def testKeepAndRestoreState(self):
+        """Tests that a new provider adopts the kept temp dir."""
+        img_file = self._CreateFile("boot.img")
+        self._build_provider.SetDeviceImage("boot.img", img_file)
+        state = self._build_provider.GetState()
+        self._build_provider.KeepTmpDir()
+        self._build_provider.__del__()
+        self.assertTrue(os.path.isdir(state["tmp_dirpath"]))
+
+        new_provider = build_provider.BuildProvider()
+        new_tmp_dirpath = new_provider.tmp_dirpath
+        new_provider.RestoreState(state)
+        self.assertFalse(os.path.exists(new_tmp_dirpath))
+        self.assertEqual(state["tmp_dirpath"], new_provider.tmp_dirpath)
+        self.assertEqual({"boot.img": img_file},
+                         new_provider.GetDeviceImage())
+        new_provider.__del__()
+        self.assertFalse(os.path.exists(state["tmp_dirpath"]))
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,145 @@
+#
+# Copyright (C) 2018 The Android Open Source Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""Module to reboot devices into bootloader ahead of flash jobs."""
+
+import errno
+import fcntl
+import logging
+import os
+import tempfile
+import threading
+
+from host_controller import common
+from host_controller.build import build_flasher
+
+# The directory of the per-device lock files held while a device reboots.
+_DEFAULT_LOCK_DIR = os.path.join(tempfile.gettempdir(),
+                                 "vts_hc_prestage_locks")
+
+
+class DevicePrestager(object):
+    """Reboots devices into bootloader in background threads.
+
+    A device is locked by a file lock while it is being staged, so a flash
+    in this process, in a thread, or in a forked sub-command process waits
+    for the reboot to finish instead of racing with it.
+
+    Attributes:
+        _lock_dir: string, the directory containing the lock files.
+        _previous_status: dict of {serial: integer}, the device status
+                          before staging, restored by Release.
+        _threads: dict of {serial: threading.Thread}, the staging threads.
+    """
+
+    def __init__(self, lock_dir=_DEFAULT_LOCK_DIR):
+        self._lock_dir = lock_dir
+        self._previous_status = {}
+        self._threads = {}
+
+    def _OpenLockFile(self, serial):
+        """Opens the lock file of a device.
+
+        Args:
+            serial: string, the device serial.
+
+        Returns:
+            The file object.
+        """
+        if not os.path.exists(self._lock_dir):
+            try:
+                os.makedirs(self._lock_dir)
+            except OSError as e:
+                if e.errno != errno.EEXIST:
+                    raise
+        return open(os.path.join(self._lock_dir, serial), "a")
+
+    def _StageDevice(self, serial, device_status, lock_file):
+        """Reboots a device into bootloader and marks it as staged.
+
+        Args:
+            serial: string, the device serial.
+            device_status: SharedDict, the status of the devices.
+            lock_file: the file object locked by Prestage.
+        """
+        try:
+            flasher = build_flasher.BuildFlasher(serial)
+            if flasher.RebootToBootloader():
+                device_status[serial] = common._DEVICE_STATUS_DICT["staged"]
+                logging.info("%s is staged in bootloader.", serial)
+        except Exception as e:
+            logging.exception("Failed to stage %s: %s", serial, e)
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+            lock_file.close()
+
+    def Prestage(self, serials, device_status):
+        """Starts rebooting devices into bootloader.
+
+        Args:
+            serials: list of strings, the device serials.
+            device_status: SharedDict, the status of the devices.
+
+        Returns:
+            list of threading.Thread, the started threads.
+        """
+        threads = []
+        for serial in serials:
+            thread = self._threads.get(serial)
+            if thread is not None and thread.is_alive():
+                logging.info("%s is being staged.", serial)
+                continue
+            # Lock in the caller so that a flash issued right after this
+            # method returns waits for the reboot.
+            lock_file = self._OpenLockFile(serial)
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            status = device_status[serial]
+            if status != common._DEVICE_STATUS_DICT["staged"]:
+                self._previous_status[serial] = status
+            thread = threading.Thread(
+                target=self._StageDevice,
+                args=(serial, device_status, lock_file))
+            thread.daemon = True
+            thread.start()
+            self._threads[serial] = thread
+            threads.append(thread)
+        return threads
+
+    def WaitForPrestage(self, serial):
+        """Blocks until a device is not being staged by any process.
+
+        Args:
+            serial: string, the device serial.
+        """
+        if not serial:
+            return
+        lock_file = self._OpenLockFile(serial)
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+        finally:
+            lock_file.close()
+
+    def Release(self, serial, device_status):
+        """Restores the status of a staged device after flashing it.
+
+        Args:
+            serial: string, the device serial.
+            device_status: SharedDict, the status of the devices.
+        """
+        if device_status[serial] != common._DEVICE_STATUS_DICT["staged"]:
+            return
+        device_status[serial] = self._previous_status.pop(
+            serial, common._DEVICE_STATUS_DICT["use"])
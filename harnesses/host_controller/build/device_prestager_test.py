@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+#
+# Copyright (C) 2018 The Android Open Source Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import collections
+import shutil
+import tempfile
+import threading
+import unittest
+
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+
+from host_controller import common
+from host_controller.build import device_prestager
+
+
+class DevicePrestagerTest(unittest.TestCase):
+    """Tests for DevicePrestager.
+
+    Attributes:
+        _lock_dir: string, the temporary directory of the lock files.
+        _device_status: dict of {serial: status}.
+        _prestager: the DevicePrestager being tested.
+    """
+
+    def setUp(self):
+        """Creates the prestager."""
+        self._lock_dir = tempfile.mkdtemp()
+        self._device_status = collections.defaultdict(int)
+        self._device_status["ABC001"] = common._DEVICE_STATUS_DICT["use"]
+        self._prestager = device_prestager.DevicePrestager(self._lock_dir)
+
+    def tearDown(self):
+        """Deletes the lock files."""
+        shutil.rmtree(self._lock_dir)
+
+    @mock.patch("host_controller.build.device_prestager.build_flasher")
+    def testPrestageAndRelease(self, mock_build_flasher):
+        """Tests that flash waits for staging and restores the status."""
+        rebooted = threading.Event()
+        mock_flasher = mock.Mock()
+        mock_flasher.RebootToBootloader.side_effect = (
+            lambda: rebooted.wait(5))
+        mock_build_flasher.BuildFlasher.return_value = mock_flasher
+
+        threads = self._prestager.Prestage(["ABC001"], self._device_status)
+        self.assertEqual(1, len(threads))
+        waited = threading.Event()
+
+        def WaitForPrestage():
+            self._prestager.WaitForPrestage("ABC001")
+            waited.set()
+
+        wait_thread = threading.Thread(target=WaitForPrestage)
+        wait_thread.start()
+        self.assertFalse(waited.wait(0.5))
+        rebooted.set()
+        self.assertTrue(waited.wait(5))
+        wait_thread.join()
+        threads[0].join()
+
+        mock_build_flasher.BuildFlasher.assert_called_once_with("ABC001")
+        self.assertEqual(common._DEVICE_STATUS_DICT["staged"],
+                         self._device_status["ABC001"])
+        self._prestager.Release("ABC001", self._device_status)
+        self.assertEqual(common._DEVICE_STATUS_DICT["use"],
+                         self._device_status["ABC001"])
+
+    @mock.patch("host_controller.build.device_prestager.build_flasher")
+    def testPrestageFailure(self, mock_build_flasher):
+        """Tests that a device failing to reboot is not staged."""
+        mock_build_flasher.BuildFlasher.return_value.RebootToBootloader.\
+            return_value = False
+        for thread in self._prestager.Prestage(["ABC002"],
+                                               self._device_status):
+            thread.join()
+        self._prestager.WaitForPrestage("ABC002")
+        self.assertEqual(common._DEVICE_STATUS_DICT["unknown"],
+                         self._device_status["ABC002"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,261 @@
+#
+# Copyright (C) 2018 The Android Open Source Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""Module to collect timing and throughput records of flash steps."""
+
+import collections
+import json
+import logging
+import threading
+
+# Upper bounds (MB/s) of the throughput histogram buckets. The last bucket
+# keeps every record faster than the last bound.
+THROUGHPUT_BUCKETS_MBPS = [1, 2, 5, 10, 20, 40, 80]
+
+# The maximum number of records kept in memory.
+_MAX_RECORDS = 10000
+
+_BYTES_PER_MB = 1024.0 * 1024.0
+
+FlashStepRecord = collections.namedtuple(
+    "FlashStepRecord", ["serial", "step", "partition", "num_bytes",
+                        "start_time", "duration_secs", "success"])
+
+
+class FlashStepSummary(object):
+    """Aggregated statistics of a group of flash step records.
+
+    Attributes:
+        name: string, the value of the grouping key.
+        count: integer, the number of records in the group.
+        failures: integer, the number of failed steps in the group.
+        total_secs: float, the sum of the step durations.
+        max_secs: float, the longest step duration.
+        total_mb: float, the number of megabytes flashed.
+        avg_mbps: float, total_mb divided by the duration of the steps that
+                  transferred bytes. 0 if no byte was transferred.
+        min_mbps: float, the slowest throughput of a single step.
+        max_mbps: float, the fastest throughput of a single step.
+        histogram: list of integers, the number of steps in each throughput
+                   bucket defined by THROUGHPUT_BUCKETS_MBPS.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.count = 0
+        self.failures = 0
+        self.total_secs = 0.0
+        self.max_secs = 0.0
+        self.total_mb = 0.0
+        self.avg_mbps = 0.0
+        self.min_mbps = 0.0
+        self.max_mbps = 0.0
+        self.histogram = [0] * (len(THROUGHPUT_BUCKETS_MBPS) + 1)
+        self._transfer_secs = 0.0
+
+    def Add(self, record):
+        """Adds a record to the summary.
+
+        Args:
+            record: FlashStepRecord.
+        """
+        self.count += 1
+        if not record.success:
+            self.failures += 1
+        self.total_secs += record.duration_secs
+        self.max_secs = max(self.max_secs, record.duration_secs)
+        if not record.num_bytes or record.duration_secs <= 0:
+            return
+
+        mb = record.num_bytes / _BYTES_PER_MB
+        mbps = mb / record.duration_secs
+        if self._transfer_secs == 0:
+            self.min_mbps = mbps
+        self.total_mb += mb
+        self._transfer_secs += record.duration_secs
+        self.avg_mbps = self.total_mb / self._transfer_secs
+        self.min_mbps = min(self.min_mbps, mbps)
+        self.max_mbps = max(self.max_mbps, mbps)
+        self.histogram[_GetBucketIndex(mbps)] += 1
+
+
+def _GetBucketIndex(mbps):
+    """Returns the index of the throughput bucket that mbps falls in."""
+    for index, upper_bound in enumerate(THROUGHPUT_BUCKETS_MBPS):
+        if mbps < upper_bound:
+            return index
+    return len(THROUGHPUT_BUCKETS_MBPS)
+
+
+def GetHistogramHeader():
+    """Returns the labels of the throughput buckets.
+
+    Returns:
+        list of strings, e.g., ["<1", "1-2", ..., ">=80"].
+    """
+    labels = []
+    lower_bound = 0
+    for upper_bound in THROUGHPUT_BUCKETS_MBPS:
+        if lower_bound == 0:
+            labels.append("<%d" % upper_bound)
+        else:
+            labels.append("%d-%d" % (lower_bound, upper_bound))
+        lower_bound = upper_bound
+    labels.append(">=%d" % lower_bound)
+    return labels
+
+
+class FlashStats(object):
+    """Thread-safe store of flash step records.
+
+    The leased jobs flash devices in the job pool processes. Their records
+    are kept in a list shared with the main process, which is created by a
+    multiprocessing manager.
+
+    Attributes:
+        _lock: threading.Lock, protects _records.
+        _records: collections.deque of FlashStepRecord, the most recent
+                  records.
+        _shared_records: the list proxy shared with other processes. If it
+                         is not None, the records are kept in it instead of
+                         _records.
+    """
+
+    def __init__(self, max_records=_MAX_RECORDS):
+        self._lock = threading.Lock()
+        self._records = collections.deque(maxlen=max_records)
+        self._shared_records = None
+
+    def SetSharedRecords(self, shared_records):
+        """Keeps the records in a list shared with other processes.
+
+        The records added before are moved to the list.
+
+        Args:
+            shared_records: the list proxy created by a multiprocessing
+                            manager.
+        """
+        with self._lock:
+            self._shared_records = shared_records
+            records = list(self._records)
+            self._records.clear()
+        self.AddRecords(records)
+
+    def AddRecords(self, records):
+        """Adds the records collected in another process.
+
+        Args:
+            records: list of FlashStepRecord.
+        """
+        if not records:
+            return
+        with self._lock:
+            if self._shared_records is None:
+                self._records.extend(records)
+                return
+            try:
+                self._shared_records.extend(records)
+                excess = len(self._shared_records) - self._records.maxlen
+                if excess > 0:
+                    del self._shared_records[:excess]
+            except (IOError, EOFError) as e:
+                logging.error("Failed to share flash records: %s", e)
+
+    def AddRecord(self, serial, step, partition, num_bytes, start_time,
+                  duration_secs, success):
+        """Adds a record and logs it in JSON format.
+
+        Args:
+            serial: string, the device serial.
+            step: string, the flash step such as "flash" or "reboot".
+            partition: string, the partition name. None if the step is not
+                       specific to a partition.
+            num_bytes: integer, the size of the image written to the device.
+                       0 if no image is transferred.
+            start_time: float, the start time in seconds since the epoch.
+            duration_secs: float, the duration of the step.
+            success: boolean, whether the step completed without exception.
+
+        Returns:
+            The added FlashStepRecord.
+        """
+        record = FlashStepRecord(serial, step, partition, num_bytes,
+                                 start_time, duration_secs, success)
+        self.AddRecords([record])
+        logging.info("flash_step %s", json.dumps(record._asdict()))
+        return record
+
+    def GetRecords(self, serial=None, step=None):
+        """Returns the records matching the given conditions.
+
+        Args:
+            serial: string, the device serial. None to match all devices.
+            step: string, the step name. None to match all steps.
+
+        Returns:
+            A list of FlashStepRecord ordered by time.
+        """
+        with self._lock:
+            if self._shared_records is None:
+                records = list(self._records)
+            else:
+                try:
+                    records = list(self._shared_records)
+                except (IOError, EOFError) as e:
+                    logging.error("Failed to read flash records: %s", e)
+                    records = []
+        # The records of other processes are not added in order.
+        records.sort(key=lambda record: record.start_time)
+        return [
+            record for record in records
+            if (serial is None or record.serial == serial) and (
+                step is None or record.step == step)
+        ]
+
+    def Summarize(self, group_by, serial=None):
+        """Aggregates the records into per-group summaries.
+
+        Args:
+            group_by: string, "serial", "partition", or "step".
+            serial: string, the device serial to filter records.
+
+        Returns:
+            A list of FlashStepSummary sorted by name.
+
+        Raises:
+            ValueError if group_by is not a field of FlashStepRecord.
+        """
+        if group_by not in FlashStepRecord._fields:
+            raise ValueError("Unknown group: %s" % group_by)
+
+        summaries = {}
+        for record in self.GetRecords(serial=serial):
+            name = getattr(record, group_by)
+            if name is None:
+                continue
+            if name not in summaries:
+                summaries[name] = FlashStepSummary(name)
+            summaries[name].Add(record)
+        return [summaries[name] for name in sorted(summaries)]
+
+    def Clear(self):
+        """Deletes all records."""
+        with self._lock:
+            self._records.clear()
+            if self._shared_records is not None:
+                try:
+                    del self._shared_records[:]
+                except (IOError, EOFError) as e:
+                    logging.error("Failed to clear flash records: %s", e)
@@ -0,0 +1,121 @@
+#!/usr/bin/env python
+#
+# Copyright (C) 2018 The Android Open Source Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import multiprocessing
+import unittest
+
+from host_controller.build import flash_stats
+
+_MB = 1024 * 1024
+
+
+class FlashStatsTest(unittest.TestCase):
+    """Tests for FlashStats."""
+
+    def setUp(self):
+        """Creates the stats with records of two devices."""
+        self._stats = flash_stats.FlashStats()
+        self._stats.AddRecord("ABC001", "flash", "system", 100 * _MB, 0, 10,
+                              True)
+        self._stats.AddRecord("ABC001", "flash", "vendor", 30 * _MB, 10, 1,
+                              True)
+        self._stats.AddRecord("ABC001", "reboot", None, 0, 11, 5, True)
+        self._stats.AddRecord("ABC002", "flash", "system", 100 * _MB, 0, 50,
+                              False)
+
+    def testGetRecords(self):
+        """Tests filtering records by serial and step."""
+        self.assertEqual(4, len(self._stats.GetRecords()))
+        self.assertEqual(3, len(self._stats.GetRecords(serial="ABC001")))
+        self.assertEqual(
+            ["reboot"],
+            [r.step for r in self._stats.GetRecords(step="reboot")])
+
+    def testSummarizeBySerial(self):
+        """Tests per-device throughput and histogram."""
+        summaries = self._stats.Summarize("serial")
+        self.assertEqual(["ABC001", "ABC002"], [s.name for s in summaries])
+        abc001, abc002 = summaries
+        self.assertEqual(3, abc001.count)
+        self.assertEqual(0, abc001.failures)
+        self.assertAlmostEqual(130.0, abc001.total_mb)
+        self.assertAlmostEqual(130.0 / 11, abc001.avg_mbps)
+        self.assertAlmostEqual(10.0, abc001.min_mbps)
+        self.assertAlmostEqual(30.0, abc001.max_mbps)
+        self.assertEqual(16.0, abc001.total_secs)
+        # 10 MB/s and 30 MB/s fall in 10-20 and 20-40 buckets.
+        self.assertEqual([0, 0, 0, 0, 1, 1, 0, 0], abc001.histogram)
+        self.assertEqual(1, abc002.failures)
+        self.assertEqual([0, 0, 1, 0, 0, 0, 0, 0], abc002.histogram)
+
+    def testSummarizeByPartition(self):
+        """Tests that steps without partition are excluded."""
+        summaries = self._stats.Summarize("partition")
+        self.assertEqual(["system", "vendor"], [s.name for s in summaries])
+        self.assertEqual(2, summaries[0].count)
+
+    def testSummarizeUnknownGroup(self):
+        """Tests the error on unknown grouping key."""
+        self.assertRaises(ValueError, self._stats.Summarize, "unknown")
+
+    def testHistogramHeader(self):
+        """Tests the labels of the buckets."""
+        header = flash_stats.GetHistogramHeader()
+        self.assertEqual(len(flash_stats.THROUGHPUT_BUCKETS_MBPS) + 1,
+                         len(header))
+        self.assertEqual("<1", header[0])
+        self.assertEqual("1-2", header[1])
+        self.assertEqual(">=80", header[-1])
+
+    def testClear(self):
+        """Tests deleting records."""
+        self._stats.Clear()
+        self.assertEqual([], self._stats.GetRecords())
+
+    def testSharedRecords(self):
+        """Tests sharing the records with another process."""
+        manager = multiprocessing.Manager()
+        try:
+            shared_records = manager.list()
+            self._stats.SetSharedRecords(shared_records)
+
+            def AddRecord():
+                stats = flash_stats.FlashStats()
+                stats.SetSharedRecords(shared_records)
+                stats.AddRecord("ABC003", "flash", "boot", _MB, 5, 1, True)
+
+            process = multiprocessing.Process(target=AddRecord)
+            process.start()
+            process.join()
+            self.assertEqual(["ABC001", "ABC002", "ABC003", "ABC001",
+                              "ABC001"],
+                             [r.serial for r in self._stats.GetRecords()])
+            self._stats.Clear()
+            self.assertEqual(0, len(shared_records))
+        finally:
+            manager.shutdown()
+
+    def testAddRecords(self):
+        """Tests adding the records collected in another process."""
+        stats = flash_stats.FlashStats(max_records=5)
+        stats.AddRecords(self._stats.GetRecords())
+        stats.AddRecords(self._stats.GetRecords())
+        self.assertEqual(5, len(stats.GetRecords()))
+
+
+if __name__ == "__main__":
+    unittest.main()
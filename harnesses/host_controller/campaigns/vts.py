@@ -15,6 +15,7 @@
 #
 
 from host_controller import common
+from host_controller.utils.cmd import command_graph
 
 # The list of the kwargs key. can retrieve informations on the leased job.
 _JOB_ATTR_LIST = [
@@ -55,6 +56,15 @@ def EmitConsoleCommands(**kwargs):
     else:
         pab_account_id = common._DEFAULT_ACCOUNT_ID_INTERNAL
 
+    serials = kwargs["serial"]
+    if serials:
+        # Reboots the devices into bootloader while the artifacts are fetched.
+        result.append("prestage --serial %s" % ",".join(serials))
+
+    # The fetch, gsispl, and flash commands run by their data dependencies,
+    # so that the devices are flashed while the test suite is fetched.
+    # The console runs the fetch commands one at a time.
+    image_outputs = ["device_image_info"]
     manifest_branch = kwargs["manifest_branch"]
     build_id = kwargs["build_id"]
     result.append(
@@ -62,16 +72,21 @@ def EmitConsoleCommands(**kwargs):
         "--build_id=%s --account_id=%s" %
         (manifest_branch, build_target, build_target.split("-")[0], build_id
          if build_id != "latest" else "{build_id}", build_id, pab_account_id))
+    result[-1] = command_graph.Node(result[-1], outputs=image_outputs)
 
     result.append(
-        "fetch --type=pab --branch=%s --target=%s --artifact_name=bootloader.img "
-        "--build_id=%s --account_id=%s" % (manifest_branch, build_target,
-                                           build_id, pab_account_id))
+        command_graph.Node(
+            "fetch --type=pab --branch=%s --target=%s "
+            "--artifact_name=bootloader.img --build_id=%s --account_id=%s" %
+            (manifest_branch, build_target, build_id, pab_account_id),
+            outputs=image_outputs))
 
     result.append(
-        "fetch --type=pab --branch=%s --target=%s --artifact_name=radio.img "
-        "--build_id=%s --account_id=%s" % (manifest_branch, build_target,
-                                           build_id, pab_account_id))
+        command_graph.Node(
+            "fetch --type=pab --branch=%s --target=%s "
+            "--artifact_name=radio.img --build_id=%s --account_id=%s" %
+            (manifest_branch, build_target, build_id, pab_account_id),
+            outputs=image_outputs))
 
     if "gsi_branch" in kwargs and kwargs["gsi_branch"]:
         gsi = True
@@ -89,6 +104,7 @@ def EmitConsoleCommands(**kwargs):
             (kwargs["gsi_branch"], kwargs["gsi_build_target"], gsi_build_id))
         if "gsi_pab_account_id" in kwargs and kwargs["gsi_pab_account_id"] != "":
             result[-1] += " --account_id=%s" % kwargs["gsi_pab_account_id"]
+        result[-1] = command_graph.Node(result[-1], outputs=image_outputs)
 
     if "test_build_id" in kwargs and kwargs["test_build_id"]:
         test_build_id = kwargs["test_build_id"]
@@ -100,47 +116,68 @@ def EmitConsoleCommands(**kwargs):
                    test_build_id))
     if "test_pab_account_id" in kwargs and kwargs["test_pab_account_id"] != "":
         result[-1] += " --account_id=%s" % kwargs["test_pab_account_id"]
+    result[-1] = command_graph.Node(result[-1], outputs=["test_suite_info"])
 
-    result.append("info")
     if gsi:
-        result.append("gsispl --version_from_path=boot.img")
-        result.append("info")
+        result.append(
+            command_graph.Node(
+                "gsispl --version_from_path=boot.img",
+                inputs=image_outputs,
+                outputs=image_outputs))
+    result.append(
+        command_graph.Node(
+            "info", inputs=["device_image_info", "test_suite_info"]))
 
     shards = int(kwargs["shards"])
     test_name = kwargs["test_name"].split("/")[-1]
-    serials = kwargs["serial"]
     param = ""
     if "param" in kwargs and kwargs["param"]:
         param = " ".join(kwargs["param"])
 
+    # The result directory is uploaded while the test is running. The
+    # retries upload to the same destination.
+    upload_option = (
+        "--upload-dest=gs://vts-report/%s/{branch}/{target}/"
+        "%s_{build_id}_{timestamp}/" % (test_name, build_target))
+
+    retry_serials = ""
     if shards > 1:
-        sub_commands = []
-        test_command = "test --keep-result -- %s --shards %d %s" % (
-            test_name, shards, param)
+        test_command = "test --keep-result %s -- %s --shards %d %s" % (
+            upload_option, test_name, shards, param)
         if shards <= len(serials):
             for shard_index in range(shards):
-                new_cmd_list = []
-                new_cmd_list.append(
-                    "flash --current --serial %s" % serials[shard_index])
-                test_command += " --serial %s" % serials[shard_index]
-                sub_commands.append(new_cmd_list)
-        result.append(sub_commands)
+                result.append(
+                    command_graph.Node(
+                        "flash --current --serial %s" % serials[shard_index],
+                        inputs=image_outputs))
+            # The modules are assigned to the devices by their past
+            # durations, and the shard results are merged into one.
+            retry_serials = ",".join(serials[:shards])
+            test_command = (
+                "test --keep-result --balanced-shards --serial %s %s -- %s %s"
+                % (retry_serials, upload_option, test_name, param))
         result.append(test_command)
     else:
-        result.append("flash --current --serial %s" % serials[0])
+        result.append(
+            command_graph.Node(
+                "flash --current --serial %s" % serials[0],
+                inputs=image_outputs))
         if serials:
-            result.append("test --keep-result -- %s --serial %s --shards %s %s" %
-                          (test_name, ",".join(serials), shards, param))
+            result.append(
+                "test --keep-result %s -- %s --serial %s --shards %s %s" %
+                (upload_option, test_name, ",".join(serials), shards, param))
         else:
-            result.append("test --keep-result -- %s --shards %s %s" % (
-                test_name, shards, param))
+            result.append("test --keep-result %s -- %s --shards %s %s" % (
+                upload_option, test_name, shards, param))
 
     if "retry_count" in kwargs:
         retry_count = int(kwargs["retry_count"])
-        result.append("retry --count %d" % retry_count)
-
-    result.append(
-        "upload --src={result_full} --dest=gs://vts-report/{suite_plan}"
-        "/{branch}/{target}/%s_{build_id}_{timestamp}/" % build_target)
+        if retry_serials:
+            # Each shard's session is retried on its own device.
+            result.append("retry --count %d --serial %s" %
+                          (retry_count, retry_serials))
+        else:
+            result.append("retry --count %d" % retry_count)
 
     return result
+
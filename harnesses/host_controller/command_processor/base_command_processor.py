@@ -17,6 +17,7 @@
 import logging
 
 from host_controller import console_argument_parser
+from host_controller.utils.trace import tracer
 
 
 class BaseCommandProcessor(object):
@@ -53,7 +54,8 @@ class BaseCommandProcessor(object):
         Args:
             arg_line: string, line of command arguments
         '''
-        ret = self.Run(arg_line)
+        with tracer.Span(self.command, "processor"):
+            ret = self.Run(arg_line)
 
         if ret is not None:
             if ret == True:  # exit command executed.
@@ -26,8 +26,14 @@ from host_controller import common
 from host_controller.command_processor import base_command_processor
 from host_controller.console_argument_parser import ConsoleArgumentError
 from host_controller.tradefed import remote_operation
+from host_controller.utils.cmd import cmd_watchdog
 
-from vts.utils.python.common import cmd_utils
+# The devices in these states are not updated because jobs are using them.
+_IN_USE_STATUS = (common._DEVICE_STATUS_DICT["use"],
+                  common._DEVICE_STATUS_DICT["staged"])
+
+# The deadline of an adb or fastboot command polling the devices.
+_POLL_COMMAND_TIMEOUT_SECS = 30
 
 
 class CommandDevice(base_command_processor.BaseCommandProcessor):
@@ -55,8 +61,8 @@ class CommandDevice(base_command_processor.BaseCommandProcessor):
         if server_type == "vti":
             devices = []
 
-            stdout, stderr, returncode = cmd_utils.ExecuteOneShellCommand(
-                "adb devices")
+            stdout, stderr, returncode = cmd_watchdog.ExecuteOneShellCommand(
+                "adb devices", _POLL_COMMAND_TIMEOUT_SECS)
 
             lines = stdout.split("\n")[1:]
             for line in lines:
@@ -65,11 +71,12 @@ class CommandDevice(base_command_processor.BaseCommandProcessor):
                     device["serial"] = line.split()[0]
                     serial = device["serial"]
 
-                    if (self.console.device_status[serial] !=
-                            common._DEVICE_STATUS_DICT["use"]):
-                        stdout, _, retcode = cmd_utils.ExecuteOneShellCommand(
-                            "adb -s %s shell getprop ro.product.board" %
-                            device["serial"])
+                    if (self.console.device_status[serial] not in
+                            _IN_USE_STATUS):
+                        stdout, _, retcode = (
+                            cmd_watchdog.ExecuteOneShellCommand(
+                                "adb -s %s shell getprop ro.product.board" %
+                                serial, _POLL_COMMAND_TIMEOUT_SECS, serial))
                         if retcode == 0:
                             device["product"] = stdout.strip()
                         else:
@@ -81,8 +88,8 @@ class CommandDevice(base_command_processor.BaseCommandProcessor):
                         device["status"] = self.console.device_status[serial]
                         devices.append(device)
 
-            stdout, stderr, returncode = cmd_utils.ExecuteOneShellCommand(
-                "fastboot devices")
+            stdout, stderr, returncode = cmd_watchdog.ExecuteOneShellCommand(
+                "fastboot devices", _POLL_COMMAND_TIMEOUT_SECS)
             lines = stdout.split("\n")
             for line in lines:
                 if len(line.strip()):
@@ -90,10 +97,12 @@ class CommandDevice(base_command_processor.BaseCommandProcessor):
                     device["serial"] = line.split()[0]
                     serial = device["serial"]
 
-                    if (self.console.device_status[serial] !=
-                            common._DEVICE_STATUS_DICT["use"]):
-                        _, stderr, retcode = cmd_utils.ExecuteOneShellCommand(
-                            "fastboot -s %s getvar product" % device["serial"])
+                    if (self.console.device_status[serial] not in
+                            _IN_USE_STATUS):
+                        _, stderr, retcode = (
+                            cmd_watchdog.ExecuteOneShellCommand(
+                                "fastboot -s %s getvar product" % serial,
+                                _POLL_COMMAND_TIMEOUT_SECS, serial))
                         if retcode == 0:
                             res = stderr.splitlines()[0].rstrip()
                             if ":" in res:
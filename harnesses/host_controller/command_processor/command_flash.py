@@ -15,12 +15,15 @@
 #
 
 import importlib
+import logging
 import os
 import stat
+import threading
 
 from host_controller import common
 from host_controller.build import build_flasher
 from host_controller.command_processor import base_command_processor
+from host_controller.utils.usb import usb_topology
 
 
 class CommandFlash(base_command_processor.BaseCommandProcessor):
@@ -93,6 +96,92 @@ class CommandFlash(base_command_processor.BaseCommandProcessor):
             help="false to not wait for devie booting.")
         self.arg_parser.add_argument(
             "--reboot", default="false", help="true to reboot the device(s).")
+        self.arg_parser.add_argument(
+            "--update-package",
+            choices=("zip", "dir"),
+            default=None,
+            help="Used with --current. Assemble the images except "
+            "bootloader and radio into an uncompressed zip for fastboot "
+            "update or a directory for fastboot flashall, and flash them "
+            "by one fastboot command.")
+        self.arg_parser.add_argument(
+            "--parallel",
+            default="false",
+            help="true to flash the devices concurrently.")
+        self.arg_parser.add_argument(
+            "--usb-budget-mbps",
+            type=int,
+            default=common._USB_FLASH_BANDWIDTH_MBPS,
+            help="The USB bandwidth (Mbps) reserved for flashing one device. "
+            "The devices sharing a USB bus flash concurrently as long as "
+            "the bus speed allows. 0 to disable the limit.")
+
+    def _FlashDevice(self, flasher, args, partition_image, scheduler):
+        """Flashes one device after it is staged by prestage command.
+
+        Args:
+            flasher: BuildFlasher object of the device.
+            args: argparse.Namespace object, the parsed flash command.
+            partition_image: dict where the key is partition name and value
+                             is image file path.
+            scheduler: FlashScheduler object.
+
+        Returns:
+            False if flashing fails; otherwise the return value of the
+            flasher.
+        """
+        serial = str(flasher.device.serial)
+        self.console.device_prestager.WaitForPrestage(serial)
+        try:
+            return self._FlashDeviceInSlot(flasher, args, partition_image,
+                                           scheduler, serial)
+        finally:
+            self.console.device_prestager.Release(serial,
+                                                  self.console.device_status)
+
+    def _FlashDeviceInSlot(self, flasher, args, partition_image, scheduler,
+                           serial):
+        """Flashes one device after getting a slot on its USB bus.
+
+        Args:
+            flasher: BuildFlasher object of the device.
+            args: argparse.Namespace object, the parsed flash command.
+            partition_image: dict where the key is partition name and value
+                             is image file path.
+            scheduler: FlashScheduler object.
+            serial: string, the device serial.
+
+        Returns:
+            False if flashing fails; otherwise the return value of the
+            flasher.
+        """
+        with scheduler.Slot(serial):
+            if args.flasher_type == "fastboot":
+                if args.image is not None:
+                    return flasher.FlashImage(partition_image, True
+                                              if args.reboot == "true"
+                                              else False)
+                elif args.current is not None:
+                    if args.update_package:
+                        return flasher.Flash(
+                            partition_image,
+                            update_package=args.update_package)
+                    return flasher.Flash(partition_image)
+                ret_flash = True
+                if args.build_dir is not None:
+                    ret_flash = flasher.Flashall(args.build_dir)
+                if args.gsi is not None:
+                    ret_flash = flasher.FlashGSI(args.gsi, args.vbmeta)
+                return ret_flash
+            elif args.flasher_type == "custom":
+                if args.repackage is not None:
+                    flasher.RepackageArtifacts(self.console.device_image_info,
+                                               args.repackage)
+                return flasher.FlashUsingCustomBinary(
+                    self.console.device_image_info, args.reboot_mode,
+                    args.flasher_args, 300)
+            return flasher.Flash(partition_image, self.console.tools_info,
+                                 *args.flasher_args)
 
     # @Override
     def Run(self, arg_line):
@@ -149,44 +238,49 @@ class CommandFlash(base_command_processor.BaseCommandProcessor):
                     "%s is not a subclass of BuildFlasher." % class_path[1])
 
         flashers = [flasher_class(s, flasher_path) for s in flasher_serials]
-
-        # Can be parallelized as long as that's proven reliable.
         for flasher in flashers:
-            ret_flash = True
-            if args.flasher_type == "fastboot":
-                if args.image is not None:
-                    ret_flash = flasher.FlashImage(partition_image, True
-                                                   if args.reboot == "true"
-                                                   else False)
-                elif args.current is not None:
-                    ret_flash = flasher.Flash(partition_image)
-                else:
-                    if args.gsi is None and args.build_dir is None:
-                        self.arg_parser.error("Nothing requested: "
-                                              "specify --gsi or --build_dir")
-                        return False
-                    if args.build_dir is not None:
-                        ret_flash = flasher.Flashall(args.build_dir)
-                    if args.gsi is not None:
-                        ret_flash = flasher.FlashGSI(args.gsi, args.vbmeta)
-            elif args.flasher_type == "custom":
-                if flasher_path is not None:
-                    if args.repackage is not None:
-                        flasher.RepackageArtifacts(
-                            self.console.device_image_info, args.repackage)
-                    ret_flash = flasher.FlashUsingCustomBinary(
-                        self.console.device_image_info, args.reboot_mode,
-                        args.flasher_args, 300)
-                else:
-                    self.arg_parser.error(
-                        "Please specify the path to custom flash tool.")
-                    return False
-            else:
-                ret_flash = flasher.Flash(partition_image,
-                                          self.console.tools_info,
-                                          *args.flasher_args)
-            if ret_flash == False:
+            flasher.SetFlashStats(self.console.flash_stats)
+
+        if (args.flasher_type == "fastboot" and args.image is None
+                and args.current is None and args.gsi is None
+                and args.build_dir is None):
+            self.arg_parser.error("Nothing requested: "
+                                  "specify --gsi or --build_dir")
+            return False
+        if args.flasher_type == "custom" and flasher_path is None:
+            self.arg_parser.error(
+                "Please specify the path to custom flash tool.")
+            return False
+
+        scheduler = usb_topology.FlashScheduler(args.usb_budget_mbps)
+        # Custom flashers repackage the shared device_image_info in place.
+        if args.parallel == "true" and args.flasher_type != "custom":
+            results = [None] * len(flashers)
+
+            def FlashThread(index, flasher):
+                try:
+                    results[index] = self._FlashDevice(
+                        flasher, args, partition_image, scheduler)
+                except Exception as e:
+                    logging.exception(e)
+                    results[index] = False
+
+            threads = [
+                threading.Thread(target=FlashThread, args=(index, flasher))
+                for index, flasher in enumerate(flashers)
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            if False in results:
                 return False
+        else:
+            for flasher in flashers:
+                ret_flash = self._FlashDevice(flasher, args, partition_image,
+                                              scheduler)
+                if ret_flash == False:
+                    return False
 
         if args.wait_for_boot == "true":
             for flasher in flashers:
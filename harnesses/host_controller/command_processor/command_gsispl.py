@@ -21,9 +21,11 @@ import zipfile
 
 from host_controller import common
 from host_controller.command_processor import base_command_processor
+from host_controller.utils.cmd import cmd_watchdog
 from host_controller.utils.gsi import img_utils
 
-from vts.utils.python.common import cmd_utils
+# The deadline of the script which rewrites the SPL in a system image.
+_CHANGE_SPL_TIMEOUT_SECS = 1800
 
 
 class CommandGsispl(base_command_processor.BaseCommandProcessor):
@@ -119,11 +121,11 @@ class CommandGsispl(base_command_processor.BaseCommandProcessor):
         output_path = os.path.join(
             os.path.dirname(os.path.abspath(gsi_path)),
             "system-{}.img".format(version))
-        stdout, _, err_code = cmd_utils.ExecuteOneShellCommand(
+        stdout, _, err_code = cmd_watchdog.ExecuteOneShellCommand(
             "{} {} {} {}".format(
                 os.path.join(os.getcwd(), "host_controller", "gsi",
                              "change_security_patch_ver.sh"), gsi_path,
-                output_path, version))
+                output_path, version), _CHANGE_SPL_TIMEOUT_SECS)
         if err_code is 0:
             if not args.gsi:
                 print("system.img path is updated to : {}".format(output_path))
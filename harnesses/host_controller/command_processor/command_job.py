@@ -0,0 +1,241 @@
+#
+# Copyright (C) 2018 The Android Open Source Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import time
+
+from host_controller.command_processor import base_command_processor
+from host_controller.utils.cmd import job_table
+
+
+class CommandBackground(base_command_processor.BaseCommandProcessor):
+    """Command processor for bg command.
+
+    Attributes:
+        arg_parser: ConsoleArgumentParser object, argument parser.
+        console: cmd.Cmd console object.
+        command: string, command name which this processor will handle.
+        command_detail: string, detailed explanation for the command.
+    """
+
+    command = "bg"
+    command_detail = "Run a console command in a background job."
+
+    # @Override
+    def SetUp(self):
+        """Initializes the parser for bg command."""
+        self.arg_parser.add_argument(
+            "line", nargs="+", help="The command and its arguments.")
+
+    # @Override
+    def Run(self, arg_line):
+        """Starts a background job."""
+        # The command is not parsed so that its quotes are preserved.
+        line = arg_line.strip()
+        if not line:
+            self.arg_parser.ParseLine(arg_line)
+            return False
+        job = self.console.RunInBackground(line)
+        self.console._Print("Job %d: %s" % (job.id, job.command))
+
+
+class CommandJobs(base_command_processor.BaseCommandProcessor):
+    """Command processor for jobs command.
+
+    Attributes:
+        arg_parser: ConsoleArgumentParser object, argument parser.
+        console: cmd.Cmd console object.
+        command: string, command name which this processor will handle.
+        command_detail: string, detailed explanation for the command.
+    """
+
+    command = "jobs"
+    command_detail = "List the background jobs."
+
+    # @Override
+    def SetUp(self):
+        """Initializes the parser for jobs command."""
+        self.arg_parser.add_argument(
+            "--clear",
+            action="store_true",
+            help="Remove the ended jobs from the list after showing them.")
+
+    # @Override
+    def Run(self, arg_line):
+        """Shows the job table."""
+        args = self.arg_parser.ParseLine(arg_line)
+        self.console._PrintObjects(
+            [_FormattedJob(job) for job in self.console.jobs.GetJobs()],
+            ("id", "state", "elapsed_secs", "output_lines", "command"))
+        if args.clear:
+            self.console.jobs.RemoveFinishedJobs()
+
+
+class CommandWait(base_command_processor.BaseCommandProcessor):
+    """Command processor for wait command.
+
+    Attributes:
+        arg_parser: ConsoleArgumentParser object, argument parser.
+        console: cmd.Cmd console object.
+        command: string, command name which this processor will handle.
+        command_detail: string, detailed explanation for the command.
+    """
+
+    command = "wait"
+    command_detail = "Wait for background jobs to end."
+
+    # @Override
+    def SetUp(self):
+        """Initializes the parser for wait command."""
+        self.arg_parser.add_argument(
+            "ids",
+            nargs="*",
+            type=int,
+            help="The job IDs. Default: all jobs except the one running "
+            "this command.")
+        self.arg_parser.add_argument(
+            "--timeout",
+            type=float,
+            default=None,
+            help="The maximum seconds to wait.")
+
+    # @Override
+    def Run(self, arg_line):
+        """Waits for the jobs and returns False if any of them fails."""
+        args = self.arg_parser.ParseLine(arg_line)
+        jobs = _GetJobs(self.console, args.ids)
+        if jobs is None:
+            return False
+        # A job waiting for itself would block until the timeout.
+        current_job = job_table.GetCurrentJob()
+        if current_job in jobs:
+            if args.ids:
+                print("Job %d cannot wait for itself." % current_job.id)
+                return False
+            jobs.remove(current_job)
+        deadline = (None if args.timeout is None else
+                    time.time() + args.timeout)
+        for job in jobs:
+            timeout = (None if deadline is None else
+                       max(0, deadline - time.time()))
+            job.Wait(timeout)
+        self.console._PrintObjects(
+            [_FormattedJob(job) for job in jobs],
+            ("id", "state", "elapsed_secs", "output_lines", "command"))
+        if any(job.state != job_table.DONE for job in jobs):
+            return False
+
+
+class CommandKill(base_command_processor.BaseCommandProcessor):
+    """Command processor for kill command.
+
+    Attributes:
+        arg_parser: ConsoleArgumentParser object, argument parser.
+        console: cmd.Cmd console object.
+        command: string, command name which this processor will handle.
+        command_detail: string, detailed explanation for the command.
+    """
+
+    command = "kill"
+    command_detail = ("Kill background jobs. A running job stops before its "
+                      "next command. Its shell commands, vts-tradefed, "
+                      "flash steps, and PAB and GCS downloads are killed.")
+
+    # @Override
+    def SetUp(self):
+        """Initializes the parser for kill command."""
+        self.arg_parser.add_argument(
+            "ids", nargs="+", type=int, help="The job IDs.")
+
+    # @Override
+    def Run(self, arg_line):
+        """Kills the jobs."""
+        args = self.arg_parser.ParseLine(arg_line)
+        jobs = _GetJobs(self.console, args.ids)
+        if jobs is None:
+            return False
+        for job in jobs:
+            if job.Kill():
+                self.console._Print("Killed job %d." % job.id)
+            else:
+                self.console._Print("Job %d has ended." % job.id)
+
+
+class CommandOutput(base_command_processor.BaseCommandProcessor):
+    """Command processor for output command.
+
+    Attributes:
+        arg_parser: ConsoleArgumentParser object, argument parser.
+        console: cmd.Cmd console object.
+        command: string, command name which this processor will handle.
+        command_detail: string, detailed explanation for the command.
+    """
+
+    command = "output"
+    command_detail = "Show the output of a background job."
+
+    # @Override
+    def SetUp(self):
+        """Initializes the parser for output command."""
+        self.arg_parser.add_argument("id", type=int, help="The job ID.")
+        self.arg_parser.add_argument(
+            "--tail",
+            type=int,
+            default=None,
+            help="The number of last lines to show. Default: all lines "
+            "kept in memory.")
+
+    # @Override
+    def Run(self, arg_line):
+        """Prints the output of the job."""
+        args = self.arg_parser.ParseLine(arg_line)
+        jobs = _GetJobs(self.console, [args.id])
+        if jobs is None:
+            return False
+        for line in jobs[0].GetOutput(args.tail):
+            self.console._Print(line)
+
+
+def _GetJobs(console, job_ids):
+    """Finds the jobs by IDs.
+
+    Args:
+        console: the console.Console object.
+        job_ids: list of integers. Empty for all jobs.
+
+    Returns:
+        A list of job_table.Job. None if any ID is not found.
+    """
+    if not job_ids:
+        return console.jobs.GetJobs()
+    jobs = []
+    for job_id in job_ids:
+        job = console.jobs.GetJob(job_id)
+        if job is None:
+            console._Print("Job %d is not found." % job_id)
+            return None
+        jobs.append(job)
+    return jobs
+
+
+class _FormattedJob(object):
+    """Formats a job_table.Job for printing."""
+
+    def __init__(self, job):
+        self.id = job.id
+        self.state = job.state
+        self.elapsed_secs = "%.1f" % job.elapsed_secs
+        self.output_lines = job.num_output_lines
+        self.command = job.command
@@ -0,0 +1,63 @@
+#
+# Copyright (C) 2018 The Android Open Source Project
+#
+# Licensed under the Apache License, Version 2.0 (the 'License');
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an 'AS IS' BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+from host_controller.command_processor import base_command_processor
+
+
+class CommandPrestage(base_command_processor.BaseCommandProcessor):
+    """Command processor for prestage command.
+
+    Attributes:
+        arg_parser: ConsoleArgumentParser object, argument parser.
+        console: cmd.Cmd console object.
+        command: string, command name which this processor will handle.
+        command_detail: string, detailed explanation for the command.
+    """
+
+    command = "prestage"
+    command_detail = ("Reboot device(s) into bootloader in background so "
+                      "that the following flash command skips the reboot.")
+
+    # @Override
+    def SetUp(self):
+        """Initializes the parser for prestage command."""
+        self.arg_parser.add_argument(
+            "--serial",
+            default=None,
+            help="The serial numbers of the devices to be flashed. "
+            "A comma-separated list. Default is the console's serials.")
+        self.arg_parser.add_argument(
+            "--wait",
+            action="store_true",
+            help="Wait until the devices enter bootloader mode.")
+
+    # @Override
+    def Run(self, arg_line):
+        """Starts rebooting the devices into bootloader."""
+        args = self.arg_parser.ParseLine(arg_line)
+        if args.serial:
+            serials = args.serial.split(",")
+        else:
+            serials = self.console.GetSerials()
+        if not serials:
+            print("No serial is given to prestage.")
+            return False
+
+        threads = self.console.device_prestager.Prestage(
+            serials, self.console.device_status)
+        if args.wait:
+            for thread in threads:
+                thread.join()
@@ -0,0 +1,131 @@
+#
+# Copyright (C) 2018 The Android Open Source Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+
+import cProfile
+import os
+import pstats
+import re
+import StringIO
+import time
+
+from host_controller.command_processor import base_command_processor
+from host_controller.utils.trace import stack_sampler
+
+# The orders of the cProfile summary.
+_SORT_KEYS = ("cumulative", "tottime", "calls")
+
+
+class CommandProfile(base_command_processor.BaseCommandProcessor):
+    """Command processor for profile command.
+
+    Attributes:
+        arg_parser: ConsoleArgumentParser object, argument parser.
+        console: cmd.Cmd console object.
+        command: string, command name which this processor will handle.
+        command_detail: string, detailed explanation for the command.
+    """
+
+    command = "profile"
+    command_detail = ("Run a console command with cProfile and show the "
+                      "functions taking the most time.")
+
+    # @Override
+    def SetUp(self):
+        """Initializes the parser for profile command."""
+        self.arg_parser.add_argument(
+            "--top",
+            type=int,
+            default=20,
+            help="The number of functions shown in the summary.")
+        self.arg_parser.add_argument(
+            "--sort",
+            choices=_SORT_KEYS,
+            default="cumulative",
+            help="The order of the cProfile summary.")
+        self.arg_parser.add_argument(
+            "--output",
+            default=None,
+            help="The pstats file. Default: a new file in the current "
+            "directory.")
+        self.arg_parser.add_argument(
+            "--sample-interval",
+            type=float,
+            default=0,
+            help="The interval in seconds of sampling the stacks of all "
+            "threads, which cProfile doesn't record. 0 disables sampling.")
+        self.arg_parser.add_argument(
+            "line",
+            nargs="+",
+            help="The command and its arguments, after the options.")
+
+    # @Override
+    def Run(self, arg_line):
+        """Profiles a command and prints the summary."""
+        tokens = arg_line.split()
+        # Only the options are parsed so that the quotes in the command are
+        # preserved.
+        num_options = 0
+        while (num_options < len(tokens) and
+               tokens[num_options].startswith("-")):
+            option = tokens[num_options]
+            num_options += (1 if "=" in option or option in ("-h", "--help")
+                            else 2)
+        num_options = min(num_options, len(tokens))
+        args = self.arg_parser.ParseLine(
+            " ".join(tokens[:num_options + 1]))
+        line = re.sub(r"^\s*(\S+\s+){%d}" % num_options, "", arg_line,
+                      count=1).strip()
+        if args.sample_interval < 0:
+            print("--sample-interval must not be negative.")
+            return False
+
+        profiler = cProfile.Profile()
+        sampler = (stack_sampler.StackSampler(args.sample_interval)
+                   if args.sample_interval else None)
+        if sampler:
+            sampler.Start()
+        start_time = time.time()
+        try:
+            ret = profiler.runcall(self.console.onecmd, line)
+        finally:
+            elapsed_secs = time.time() - start_time
+            if sampler:
+                sampler.Stop()
+
+        path = args.output or os.path.join(
+            os.getcwd(), "profile-%s.pstats" % time.strftime("%Y%m%d-%H%M%S"))
+        try:
+            profiler.dump_stats(path)
+        except (IOError, OSError) as e:
+            print("Failed to write profile: %s" % e)
+            path = None
+
+        summary = StringIO.StringIO()
+        stats = pstats.Stats(profiler, stream=summary)
+        stats.sort_stats(args.sort).print_stats(args.top)
+        self.console._Print(summary.getvalue().strip("\n"))
+        if sampler:
+            self.console._Print("Stack samples of all threads: %d" %
+                                sampler.num_samples)
+            self.console._PrintObjects(
+                sampler.GetTopFunctions(args.top),
+                ["total_samples", "self_samples", "function"])
+        self.console._Print("Elapsed: %.3f seconds" % elapsed_secs)
+        if path:
+            self.console._Print("Profile: %s" % path)
+        if ret == False or path is None:
+            return False
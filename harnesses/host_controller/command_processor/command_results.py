@@ -0,0 +1,112 @@
+#
+# Copyright (C) 2018 The Android Open Source Project
+#
+# Licensed under the Apache License, Version 2.0 (the 'License');
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an 'AS IS' BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import sqlite3
+import time
+
+from host_controller.command_processor import base_command_processor
+from host_controller.utils.result import result_db
+
+
+class CommandResults(base_command_processor.BaseCommandProcessor):
+    """Command processor for results command.
+
+    Attributes:
+        arg_parser: ConsoleArgumentParser object, argument parser.
+        console: cmd.Cmd console object.
+        command: string, command name which this processor will handle.
+        command_detail: string, detailed explanation for the command.
+    """
+
+    command = "results"
+    command_detail = "Query the local database of test results."
+
+    # @Override
+    def SetUp(self):
+        """Initializes the parser for results command."""
+        self.arg_parser.add_argument(
+            "type",
+            choices=("runs", "flaky", "durations"),
+            help="The type of the query.")
+        self.arg_parser.add_argument(
+            "--runs",
+            type=int,
+            default=10,
+            help="The number of recent runs to look at.")
+        self.arg_parser.add_argument(
+            "--plan",
+            default=None,
+            help="Look at the runs of the test plan only, e.g., vts.")
+        self.arg_parser.add_argument(
+            "--module",
+            default=None,
+            help="Show the durations of the module only.")
+        self.arg_parser.add_argument(
+            "--limit",
+            type=int,
+            default=50,
+            help="The maximum number of rows to show.")
+
+    # @Override
+    def Run(self, arg_line):
+        """Queries the result database."""
+        args = self.arg_parser.ParseLine(arg_line)
+        db = result_db.ResultDb()
+        try:
+            if args.type == "runs":
+                rows = [_FormattedRun(row) for row in db.GetRuns(args.runs)]
+                attr_names = ("id", "start_time", "suite_plan", "build_id",
+                              "target", "serials", "passed", "failed")
+            elif args.type == "flaky":
+                rows = db.GetFlakyTests(args.plan, args.runs)
+                attr_names = ("module", "test_case", "test", "fails", "runs")
+            else:
+                rows = [
+                    _FormattedDuration(row) for row in db.GetModuleDurations(
+                        args.plan, args.runs, args.module)
+                ]
+                attr_names = ("module", "runs", "p50_secs", "p90_secs",
+                              "max_secs")
+        except sqlite3.Error as e:
+            print("Failed to query the result database: %s" % e)
+            return False
+        self.console._PrintObjects(rows[:args.limit], attr_names)
+
+
+class _FormattedRun(object):
+    """Formats a result_db.RunRow for printing."""
+
+    def __init__(self, row):
+        self.id = row.id
+        self.start_time = time.strftime("%Y-%m-%d %H:%M:%S",
+                                        time.localtime(row.start_time))
+        self.suite_plan = row.suite_plan
+        self.build_id = row.build_id
+        self.target = row.target
+        self.serials = row.serials
+        self.passed = row.passed
+        self.failed = row.failed
+
+
+class _FormattedDuration(object):
+    """Rounds the numbers of a result_db.DurationRow for printing."""
+
+    def __init__(self, row):
+        self.module = row.module
+        self.runs = row.runs
+        self.p50_secs = "%.1f" % row.p50_secs
+        self.p90_secs = "%.1f" % row.p90_secs
+        self.max_secs = "%.1f" % row.max_secs
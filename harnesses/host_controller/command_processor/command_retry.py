@@ -14,12 +14,43 @@
 # limitations under the License.
 #
 
+import logging
 import os
 
 from host_controller.command_processor import base_command_processor
+from host_controller.utils.result import result_index
+from host_controller.utils.result import result_parser
+
+# The name of the XML report in a TradeFed session directory.
+_SESSION_RESULT_XML = "test_result.xml"
+
+
+def _GetFailedModules(modules):
+    """Returns the modules which failed or did not complete.
+
+    Args:
+        modules: list of dicts, the "modules" in console.test_result or the
+                 results of ModuleSummary.ToDict.
+
+    Returns:
+        A set of strings, "<abi> <module name>".
+    """
+    return set("%s %s" % (module["abi"], module["name"])
+               for module in modules
+               if module["failed"] or not module["done"])
 
 
 class CommandRetry(base_command_processor.BaseCommandProcessor):
+    """Command processor for retry command.
+
+    Attributes:
+        arg_parser: ConsoleArgumentParser object, argument parser.
+        console: cmd.Cmd console object.
+        command: string, command name which this processor will handle.
+        command_detail: string, detailed explanation for the command.
+        _results_indexes: dict of {results path: ResultIndex}, the indexes
+                          of the session directories.
+    """
 
     command = "retry"
     command_detail = "Retry last run test plan for certain times."
@@ -27,11 +58,151 @@ class CommandRetry(base_command_processor.BaseCommandProcessor):
     # @Override
     def SetUp(self):
         """Initializes the parser for retry command."""
+        self._results_indexes = {}
         self.arg_parser.add_argument(
             "--count",
             type=int,
             default=30,
             help="Retry count. Default retry count is 30.")
+        self.arg_parser.add_argument(
+            "--failed-only",
+            action="store_true",
+            help="Retry while the set of failed modules shrinks, and shard "
+            "each retry across all serials.")
+        self.arg_parser.add_argument(
+            "--serial",
+            "-s",
+            default=None,
+            help="The serials of the devices to shard the failed-only "
+            "retries on, or to retry the sessions of a balanced-shards test "
+            "on. A comma-separated list. Default: the console's serials.")
+        self.arg_parser.add_argument(
+            "--test-exec-mode",
+            default="subprocess",
+            choices=("subprocess", "remote"),
+            help="The exec mode of the retried test commands.")
+
+    def _ListSessionDirs(self, results_path):
+        """Lists the session directories of vts-tradefed.
+
+        The directory listing is cached and refreshed only when the results
+        directory changes.
+
+        Args:
+            results_path: string, the results directory of vts-tradefed.
+
+        Returns:
+            A sorted list of strings, the names of the session directories
+            excluding symbolic links.
+        """
+        index = self._results_indexes.get(results_path)
+        if index is None:
+            index = result_index.ResultIndex(results_path, max_depth=0)
+            self._results_indexes[results_path] = index
+        index.Refresh()
+        return index.GetSubdirs()
+
+    def _LoadSessionFailures(self, results_path):
+        """Loads the failed modules of the latest session from its report.
+
+        Args:
+            results_path: string, the results directory of vts-tradefed.
+
+        Returns:
+            A set of strings, "<abi> <module name>". None if the report is
+            not found.
+        """
+        session_dirs = self._ListSessionDirs(results_path)
+        if not session_dirs:
+            return None
+        report_path = os.path.join(results_path, session_dirs[-1],
+                                   _SESSION_RESULT_XML)
+        if not os.path.isfile(report_path):
+            logging.warning("%s is not found.", report_path)
+            return None
+        summary = result_parser.ParseResult(report_path)
+        if summary.attributes.get("suite_plan"):
+            self.console.test_result["suite_plan"] = (
+                summary.attributes["suite_plan"])
+        return _GetFailedModules(
+            [module.ToDict() for module in summary.modules])
+
+    def _GetLastFailures(self):
+        """Returns the failed modules of the last test command.
+
+        Returns:
+            A set of strings, "<abi> <module name>". None if the last test
+            command didn't keep the result.
+        """
+        if "modules" not in self.console.test_result:
+            return None
+        return _GetFailedModules(self.console.test_result["modules"])
+
+    def _GetUploadOption(self):
+        """Returns the test option which uploads to the last destination.
+
+        A retry streams its result to the destination of the test which it
+        retries.
+
+        Returns:
+            A string ending with a space, or an empty string if the last
+            test command didn't upload.
+        """
+        upload_dest = self.console.test_result.get("upload_dest")
+        if not upload_dest:
+            return ""
+        return "--upload-dest %s " % upload_dest
+
+    def _RetryFailedOnly(self, args, former_result_count, results_path):
+        """Retries the failed modules until none or no fewer fail.
+
+        Args:
+            args: the parsed arguments.
+            former_result_count: integer, the number of sessions before
+                                 retrying.
+            results_path: string, the results directory of vts-tradefed.
+
+        Returns:
+            False if the results cannot be loaded; None otherwise.
+        """
+        if args.serial:
+            serials = args.serial.split(",")
+        else:
+            serials = self.console.GetSerials()
+
+        failures = self._GetLastFailures()
+        if failures is None:
+            failures = self._LoadSessionFailures(results_path)
+        if failures is None:
+            print("Failed to load the result of the last session.")
+            return False
+
+        for retry_index in range(args.count):
+            if not failures:
+                print("No failed module left.")
+                return
+            print("Retrying %d failed modules on %s" %
+                  (len(failures), serials))
+            session_id = former_result_count - 1 + retry_index
+            retry_test_command = (
+                "test --keep-result --test-exec-mode %s %s%s-- %s --retry %d" %
+                (args.test_exec_mode,
+                 ("--serial %s " % ",".join(serials)) if serials else "",
+                 self._GetUploadOption(),
+                 self.console.test_result["suite_plan"], session_id))
+            if len(serials) > 1:
+                retry_test_command += " --shards %d" % len(serials)
+            self.console.onecmd(retry_test_command)
+
+            last_failures = failures
+            failures = self._GetLastFailures()
+            if failures is None:
+                print("Failed to load the result of the retry.")
+                return False
+            if len(failures) >= len(last_failures):
+                print("Stop retrying as the failed modules don't decrease: "
+                      "%s" % sorted(failures))
+                return
 
     # @Override
     def Run(self, arg_line):
@@ -48,19 +219,44 @@ class CommandRetry(base_command_processor.BaseCommandProcessor):
         vts_root_path = os.path.dirname(tools_path)
         results_path = os.path.join(vts_root_path, "results")
 
-        former_result_count = len([
-            dir for dir in os.listdir(results_path)
-            if os.path.isdir(os.path.join(results_path, dir))
-            and not os.path.islink(os.path.join(results_path, dir))
-        ])
+        former_result_count = len(self._ListSessionDirs(results_path))
 
         if former_result_count < 1:
             print("No test plan has been run yet, former results count is %d" %
                   former_result_count)
             return False
 
-        for result_index in range(retry_count):
-            session_id = former_result_count - 1 + result_index
-            retry_test_command = "test --keep-result -- %s --retry %d" % (
-                self.console.test_result["suite_plan"], session_id)
+        if args.failed_only:
+            return self._RetryFailedOnly(args, former_result_count,
+                                         results_path)
+
+        # A balanced-shards test creates a session per device. They are
+        # retried together, so each retry creates as many sessions.
+        invocations = self.console.test_result.get("invocations", 1)
+        serials = (args.serial.split(",")
+                   if args.serial else self.console.GetSerials())
+        if invocations > 1 and len(serials) < invocations:
+            print("Retrying the last session only, as %d sessions need as "
+                  "many serials: %s" % (invocations, serials))
+            invocations = 1
+
+        for retry_index in range(retry_count):
+            if invocations > 1:
+                first_session_id = (former_result_count - invocations +
+                                    retry_index * invocations)
+                retry_test_command = (
+                    "test --keep-result --test-exec-mode %s --serial %s "
+                    "--retry-sessions %s %s-- %s" %
+                    (args.test_exec_mode, ",".join(serials),
+                     ",".join(str(session_id) for session_id in range(
+                         first_session_id, first_session_id + invocations)),
+                     self._GetUploadOption(),
+                     self.console.test_result["suite_plan"]))
+            else:
+                session_id = former_result_count - 1 + retry_index
+                retry_test_command = (
+                    "test --keep-result --test-exec-mode %s %s-- %s "
+                    "--retry %d" %
+                    (args.test_exec_mode, self._GetUploadOption(),
+                     self.console.test_result["suite_plan"], session_id))
             self.console.onecmd(retry_test_command)
@@ -0,0 +1,170 @@
+#!/usr/bin/env python
+#
+# Copyright (C) 2018 The Android Open Source Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from host_controller.command_processor import command_retry
+
+_RESULT_XML = """<?xml version='1.0' encoding='UTF-8' standalone='no' ?>
+<Result suite_plan="vts" suite_name="VTS">
+  <Module name="VtsHalBase" abi="arm64-v8a" runtime="500" done="true">
+    <TestCase name="Base">
+      <Test result="fail" name="test1" />
+    </TestCase>
+  </Module>
+  <Module name="VtsKernelLtp" abi="arm64-v8a" runtime="500" done="true">
+    <TestCase name="Syscalls">
+      <Test result="pass" name="open01" />
+    </TestCase>
+  </Module>
+</Result>
+"""
+
+
+def _Module(name, failed):
+    """Returns a module in the format of console.test_result["modules"]."""
+    return {"abi": "arm64-v8a", "name": name, "failed": failed,
+            "done": True}
+
+
+class FakeConsole(object):
+    """A console which records the commands.
+
+    Attributes:
+        commands: list of strings, the executed commands.
+        test_result: dict, the result of the last test command.
+        test_suite_info: dict, the paths to the test suites.
+        _results: list of lists of modules, the results of the next test
+                  commands.
+        _serials: list of strings, the serials returned by GetSerials.
+    """
+
+    def __init__(self, vts_path, results, serials):
+        self.commands = []
+        self.test_result = {}
+        self.test_suite_info = {"vts": vts_path}
+        self._results = list(results)
+        self._serials = serials
+
+    def GetSerials(self):
+        """Returns the serials of the console."""
+        return list(self._serials)
+
+    def onecmd(self, line):
+        """Records a command and sets the next result."""
+        self.commands.append(line)
+        self.test_result.clear()
+        self.test_result.update(suite_plan="vts",
+                                modules=self._results.pop(0))
+
+
+class CommandRetryTest(unittest.TestCase):
+    """Tests for the failed-only retries of CommandRetry.
+
+    Attributes:
+        _temp_dir: string, the temporary directory.
+        _vts_path: string, the path to the fake vts-tradefed.
+        _results_path: string, the results directory of vts-tradefed.
+    """
+
+    def setUp(self):
+        """Creates the results directory with three sessions."""
+        self._temp_dir = tempfile.mkdtemp()
+        tools_path = os.path.join(self._temp_dir, "android-vts", "tools")
+        self._vts_path = os.path.join(tools_path, "vts-tradefed")
+        self._results_path = os.path.join(self._temp_dir, "android-vts",
+                                          "results")
+        for session_dir in ("2018.01.01_00.00.00", "2018.01.02_00.00.00",
+                            "2018.01.03_00.00.00"):
+            os.makedirs(os.path.join(self._results_path, session_dir))
+
+    def tearDown(self):
+        """Deletes the temporary directory."""
+        shutil.rmtree(self._temp_dir)
+
+    def _CreateProcessor(self, results, serials=("s1", "s2")):
+        """Returns a CommandRetry with a FakeConsole."""
+        console = FakeConsole(self._vts_path, results, serials)
+        processor = command_retry.CommandRetry()
+        processor._SetUp(console)
+        return processor
+
+    def testFailedOnlyUntilNoFailure(self):
+        """Tests that the retries stop when no module fails."""
+        processor = self._CreateProcessor(
+            [[_Module("A", 0), _Module("B", 1)],
+             [_Module("B", 0)]])
+        processor.console.test_result.update(
+            suite_plan="vts", modules=[_Module("A", 1), _Module("B", 2)])
+        self.assertIsNone(processor.Run("--count 5 --failed-only"))
+        self.assertEqual([
+            "test --keep-result --test-exec-mode subprocess "
+            "--serial s1,s2 -- vts --retry 2 --shards 2",
+            "test --keep-result --test-exec-mode subprocess "
+            "--serial s1,s2 -- vts --retry 3 --shards 2",
+        ], processor.console.commands)
+
+    def testFailedOnlyUntilNoDecrease(self):
+        """Tests that the retries stop when the failures don't decrease."""
+        processor = self._CreateProcessor(
+            [[_Module("A", 1), _Module("B", 1)]], serials=["s1"])
+        processor.console.test_result.update(
+            suite_plan="vts", modules=[_Module("A", 1), _Module("B", 2)])
+        self.assertIsNone(processor.Run("--count 5 --failed-only"))
+        self.assertEqual([
+            "test --keep-result --test-exec-mode subprocess "
+            "--serial s1 -- vts --retry 2",
+        ], processor.console.commands)
+
+    def testFailedOnlyFromLatestSession(self):
+        """Tests loading the failures from the latest session report."""
+        with open(os.path.join(self._results_path, "2018.01.03_00.00.00",
+                               "test_result.xml"), "w") as result_file:
+            result_file.write(_RESULT_XML)
+        processor = self._CreateProcessor([[]], serials=["s1"])
+        self.assertIsNone(
+            processor.Run("--count 5 --failed-only --serial s2"))
+        self.assertEqual([
+            "test --keep-result --test-exec-mode subprocess "
+            "--serial s2 -- vts --retry 2",
+        ], processor.console.commands)
+
+    def testFailedOnlyKeepsUploadDest(self):
+        """Tests that the retries upload to the destination of the test."""
+        processor = self._CreateProcessor([[]], serials=["s1"])
+        processor.console.test_result.update(
+            suite_plan="vts", modules=[_Module("A", 1)],
+            upload_dest="gs://vts-report/vts/run")
+        self.assertIsNone(processor.Run("--count 5 --failed-only"))
+        self.assertEqual([
+            "test --keep-result --test-exec-mode subprocess --serial s1 "
+            "--upload-dest gs://vts-report/vts/run -- vts --retry 2",
+        ], processor.console.commands)
+
+    def testFailedOnlyWithoutResult(self):
+        """Tests that the retry fails if no result can be loaded."""
+        processor = self._CreateProcessor([])
+        self.assertFalse(processor.Run("--failed-only"))
+        self.assertEqual([], processor.console.commands)
+
+
+if __name__ == "__main__":
+    unittest.main()
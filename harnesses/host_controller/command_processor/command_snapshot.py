@@ -0,0 +1,73 @@
+#
+# Copyright (C) 2018 The Android Open Source Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+
+from host_controller import common
+from host_controller.command_processor import base_command_processor
+
+
+class CommandSnapshot(base_command_processor.BaseCommandProcessor):
+    """Command processor for snapshot command.
+
+    Attributes:
+        arg_parser: ConsoleArgumentParser object, argument parser.
+        console: cmd.Cmd console object.
+        command: string, command name which this processor will handle.
+        command_detail: string, detailed explanation for the command.
+    """
+
+    command = "snapshot"
+    command_detail = ("Save or load the fetched artifacts and the console "
+                      "state for a warm restart.")
+
+    # @Override
+    def SetUp(self):
+        """Initializes the parser for snapshot command."""
+        self.arg_parser.add_argument(
+            "action",
+            choices=("save", "load"),
+            help="save writes the state and keeps the downloaded files; "
+            "load restores the entries whose files are unchanged.")
+        self.arg_parser.add_argument(
+            "--path",
+            default=common._STATE_SNAPSHOT_FILE,
+            help="The snapshot file.")
+        self.arg_parser.add_argument(
+            "--digest",
+            action="store_true",
+            help="Store the MD5 digests of the files when saving, so that "
+            "loading verifies the contents instead of the timestamps.")
+
+    # @Override
+    def Run(self, arg_line):
+        """Saves or loads the console state."""
+        args = self.arg_parser.ParseLine(arg_line)
+        if args.action == "save":
+            try:
+                count = self.console.SaveState(args.path, args.digest)
+            except (IOError, OSError) as e:
+                print("Failed to save state: %s" % e)
+                return False
+            self.console._Print("Saved state with %d files to %s" %
+                                (count, args.path))
+        else:
+            dropped = self.console.LoadState(args.path)
+            if dropped is None:
+                print("Failed to load state from %s" % args.path)
+                return False
+            for name in dropped:
+                self.console._Print("Dropped %s" % name)
+            self.console._Print("Loaded state from %s" % args.path)
@@ -0,0 +1,113 @@
+#
+# Copyright (C) 2018 The Android Open Source Project
+#
+# Licensed under the Apache License, Version 2.0 (the 'License');
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an 'AS IS' BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+from host_controller.build import flash_stats
+from host_controller.command_processor import base_command_processor
+from host_controller.utils.cmd import cmd_watchdog
+
+
+class CommandStats(base_command_processor.BaseCommandProcessor):
+    """Command processor for stats command.
+
+    Attributes:
+        arg_parser: ConsoleArgumentParser object, argument parser.
+        console: cmd.Cmd console object.
+        command: string, command name which this processor will handle.
+        command_detail: string, detailed explanation for the command.
+    """
+
+    command = "stats"
+    command_detail = "Show statistics collected by the host controller."
+
+    def _PrintFlashStats(self, group_by, serial):
+        """Shows the flash step durations and throughput histograms.
+
+        Args:
+            group_by: string, "serial", "partition", or "step".
+            serial: string, the device serial to filter the records.
+        """
+        summaries = self.console.flash_stats.Summarize(group_by, serial)
+        self.console._Print("throughput buckets (MB/s): %s" % " ".join(
+            flash_stats.GetHistogramHeader()))
+        rows = [_FormattedSummary(summary) for summary in summaries]
+        self.console._PrintObjects(
+            rows, ("name", "count", "failures", "total_secs", "max_secs",
+                   "total_mb", "avg_mbps", "min_mbps", "max_mbps",
+                   "histogram"))
+
+    def _PrintHungCommandStats(self, serial):
+        """Shows the number of adb and fastboot commands killed per device.
+
+        Args:
+            serial: string, the device serial to filter the records.
+        """
+        records = [
+            record for record in cmd_watchdog.GetStats().GetRecords()
+            if serial is None or record.serial == serial
+        ]
+        for record in records:
+            record.hung_secs = "%.1f" % record.hung_secs
+        self.console._PrintObjects(
+            records, ("serial", "commands", "timeouts", "hung_secs",
+                      "last_command"))
+
+    # @Override
+    def SetUp(self):
+        """Initializes the parser for stats command."""
+        self.arg_parser.add_argument(
+            "type",
+            choices=("flash", "hung"),
+            help="The type of the shown statistics.")
+        self.arg_parser.add_argument(
+            "--by",
+            choices=("serial", "partition", "step"),
+            default="serial",
+            help="The key to aggregate the flash records by.")
+        self.arg_parser.add_argument(
+            "--serial",
+            default=None,
+            help="Show only the records of the device.")
+        self.arg_parser.add_argument(
+            "--clear",
+            action="store_true",
+            help="Delete the records after showing them.")
+
+    # @Override
+    def Run(self, arg_line):
+        """Shows the statistics."""
+        args = self.arg_parser.ParseLine(arg_line)
+        if args.type == "flash":
+            self._PrintFlashStats(args.by, args.serial)
+            if args.clear:
+                self.console.flash_stats.Clear()
+        elif args.type == "hung":
+            self._PrintHungCommandStats(args.serial)
+
+
+class _FormattedSummary(object):
+    """Rounds the numbers of a FlashStepSummary for printing."""
+
+    def __init__(self, summary):
+        self.name = summary.name
+        self.count = summary.count
+        self.failures = summary.failures
+        self.total_secs = "%.1f" % summary.total_secs
+        self.max_secs = "%.1f" % summary.max_secs
+        self.total_mb = "%.1f" % summary.total_mb
+        self.avg_mbps = "%.2f" % summary.avg_mbps
+        self.min_mbps = "%.2f" % summary.min_mbps
+        self.max_mbps = "%.2f" % summary.max_mbps
+        self.histogram = "|".join(str(x) for x in summary.histogram)
@@ -17,15 +17,49 @@
 import logging
 import os
 import shutil
+import socket
+import sqlite3
 import subprocess
 import tempfile
 import threading
-import zipfile
-
-from xml.etree import ElementTree
 
+from host_controller.build import build_provider_gcs
 from host_controller.command_processor import base_command_processor
-from vts.runners.host import utils
+from host_controller.tradefed import module_scheduler
+from host_controller.tradefed import remote_operation
+from host_controller.tradefed import tradefed_instance
+from host_controller.utils.cmd import cmd_watchdog
+from host_controller.utils.cmd import job_table
+from host_controller.utils.cmd import output_capture
+from host_controller.utils.result import result_db
+from host_controller.utils.result import result_index
+from host_controller.utils.result import result_parser
+from host_controller.utils.result import shard_planner
+from host_controller.utils.upload import gcs_uploader
+
+# The number of recent output lines logged when a command fails.
+_FAILURE_TAIL_LINES = 50
+
+
+def _GetModuleDurations(suite_plan):
+    """Returns the median durations of the modules in the recent runs.
+
+    The durations are recorded in the result database by every reported
+    test run.
+
+    Args:
+        suite_plan: string, the test plan name, e.g., "vts".
+
+    Returns:
+        A dict of {module name: seconds}. Empty if the result database
+        cannot be read.
+    """
+    try:
+        rows = result_db.ResultDb().GetModuleDurations(suite_plan)
+    except (sqlite3.Error, OSError, IOError) as e:
+        logging.error("Failed to load module durations: %s", e)
+        return {}
+    return dict((row.module, row.p50_secs) for row in rows)
 
 
 class CommandTest(base_command_processor.BaseCommandProcessor):
@@ -35,7 +69,11 @@ class CommandTest(base_command_processor.BaseCommandProcessor):
         _RESULT_ATTRIBUTES: The attributes of <Result> in the XML report.
                             After test execution, the attributes are loaded
                             from report to console's dictionary.
-        _result_dir: the path to the temporary result directory.
+        _result_dirs: dict of {(pid, thread ID): path}, the temporary result
+                      directories. Each process or thread running
+                      sub-commands in parallel has its own directory.
+        _capture_dirs: list of (pid, path), the temporary output capture
+                       directories of the runs without result directories.
     """
 
     command = "test"
@@ -45,7 +83,8 @@ class CommandTest(base_command_processor.BaseCommandProcessor):
     # @Override
     def SetUp(self):
         """Initializes the parser for test command."""
-        self._result_dir = None
+        self._result_dirs = {}
+        self._capture_dirs = []
         self.arg_parser.add_argument(
             "--serial",
             "-s",
@@ -55,11 +94,46 @@ class CommandTest(base_command_processor.BaseCommandProcessor):
         self.arg_parser.add_argument(
             "--test-exec-mode",
             default="subprocess",
-            help="The target exec model.")
+            choices=("subprocess", "remote"),
+            help="The target exec model. subprocess runs vts-tradefed for "
+            "the command. remote submits the command to a vts-tradefed "
+            "console which is kept running, and supports one serial per "
+            "command.")
         self.arg_parser.add_argument(
             "--keep-result",
             action="store_true",
             help="Keep the path to the result in the console instance.")
+        self.arg_parser.add_argument(
+            "--output-capture",
+            default="false",
+            help="true to write the output of vts-tradefed to compressed "
+            "files instead of logging every line. Only a periodic summary "
+            "and, on failure, the last lines are logged.")
+        self.arg_parser.add_argument(
+            "--module-queue",
+            default=None,
+            help="A comma-separated list of modules. Each module is run by "
+            "a separate vts-tradefed invocation on the first idle device "
+            "among the serials, and the results are merged.")
+        self.arg_parser.add_argument(
+            "--balanced-shards",
+            action="store_true",
+            help="Run one shard per serial concurrently, with the modules "
+            "assigned by their past durations in the result database, and "
+            "merge the results. Without duration history, the command runs "
+            "with --shards.")
+        self.arg_parser.add_argument(
+            "--retry-sessions",
+            default=None,
+            help="A comma-separated list of session IDs. Each session is "
+            "retried on one of the serials concurrently, and the results "
+            "are merged.")
+        self.arg_parser.add_argument(
+            "--upload-dest",
+            default=None,
+            help="The Google Cloud Storage URL to which the result directory "
+            "is uploaded while the test is running. Variables enclosed in {} "
+            "are replaced. Requires --keep-result.")
         self.arg_parser.add_argument(
             "command",
             metavar="COMMAND",
@@ -69,13 +143,39 @@ class CommandTest(base_command_processor.BaseCommandProcessor):
             "\"--\" at end of line. format: plan -m module -t testcase")
 
     def _ClearResultDir(self):
-        """Deletes all files in the result directory."""
-        if self._result_dir is None:
-            self._result_dir = tempfile.mkdtemp()
-            return
+        """Deletes all files in the result directory of the current thread.
+
+        Returns:
+            The path to the empty result directory.
+        """
+        key = (os.getpid(), threading.current_thread().ident)
+        result_dir = self._result_dirs.get(key)
+        if result_dir is None:
+            result_dir = tempfile.mkdtemp()
+            self._result_dirs[key] = result_dir
+            return result_dir
 
-        for file_name in os.listdir(self._result_dir):
-            shutil.rmtree(os.path.join(self._result_dir, file_name))
+        for file_name in os.listdir(result_dir):
+            shutil.rmtree(os.path.join(result_dir, file_name))
+        return result_dir
+
+    def _CreateOutputCapture(self, result_dir):
+        """Creates an OutputCapture in the result directory of a run.
+
+        Args:
+            result_dir: string, the path to the result directory. None to
+                        capture in a temporary directory which is deleted
+                        on TearDown.
+
+        Returns:
+            An OutputCapture object.
+        """
+        if result_dir:
+            return output_capture.OutputCapture(
+                os.path.join(result_dir, "output"))
+        capture = output_capture.OutputCapture()
+        self._capture_dirs.append((os.getpid(), capture.output_dir))
+        return capture
 
     @staticmethod
     def _GenerateVtsCommand(bin_path, command, serials, result_dir=None):
@@ -103,11 +203,16 @@ class CommandTest(base_command_processor.BaseCommandProcessor):
         return cmd
 
     @staticmethod
-    def _ExecuteCommand(cmd):
+    def _ExecuteCommand(cmd, capture=None):
         """Executes a command and logs output in real time.
 
         Args:
             cmd: a list of strings, the command to execute.
+            capture: OutputCapture object. If not None, the output is
+                     written to files instead of the log.
+
+        Returns:
+            integer, the return code of the command.
         """
 
         def LogOutputStream(log_level, stream):
@@ -120,11 +225,28 @@ class CommandTest(base_command_processor.BaseCommandProcessor):
             finally:
                 stream.close()
 
+        # vts-tradefed runs in its own process group, which is killed with
+        # the console job.
         proc = subprocess.Popen(
             cmd,
             stdin=subprocess.PIPE,
             stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE)
+            stderr=subprocess.PIPE,
+            preexec_fn=os.setsid)
+
+        if capture:
+            capture.Start(proc)
+            with cmd_watchdog.TrackProcessGroup(proc.pid):
+                proc.wait()
+            logging.info("Return code: %d", proc.returncode)
+            proc.stdin.close()
+            capture.Join()
+            if proc.returncode != 0:
+                for name in ("stdout", "stderr"):
+                    lines = capture.GetRecentLines(name)
+                    logging.error("Last %s lines:\n%s", name,
+                                  "\n".join(lines[-_FAILURE_TAIL_LINES:]))
+            return proc.returncode
 
         out_thread = threading.Thread(
             target=LogOutputStream, args=(logging.INFO, proc.stdout))
@@ -134,37 +256,387 @@ class CommandTest(base_command_processor.BaseCommandProcessor):
         err_thread.daemon = True
         out_thread.start()
         err_thread.start()
-        proc.wait()
+        with cmd_watchdog.TrackProcessGroup(proc.pid):
+            proc.wait()
         logging.info("Return code: %d", proc.returncode)
         proc.stdin.close()
         out_thread.join()
         err_thread.join()
+        return proc.returncode
 
-    def _LoadReport(self, report_file):
-        """Loads information from a report.
+    def _ExecuteRemoteCommand(self, command, serial, result_dir=None):
+        """Executes a command on the persistent vts-tradefed console.
 
         Args:
-            report_file: The file object of the XML report.
+            command: a list of strings, the command arguments.
+            serial: string, the serial number of the device.
+            result_dir: the path to the directory where the result is saved.
 
         Returns:
-            A dict containing the attributes loaded from the report.
+            integer, 0 if the invocation succeeds; 1 otherwise.
         """
-        result = {}
-        for event, elem in ElementTree.iterparse(report_file, ("start", )):
-            if elem.tag == "Result":
-                result = {
-                    key: elem.attrib[key]
-                    for key in self._RESULT_ATTRIBUTES if key in elem.attrib
-                }
-                if len(result) != len(self._RESULT_ATTRIBUTES):
-                    logging.warning("Incomplete <Result>: %s", elem.attrib)
-                break
-
-        if not result:
+        command_args = [str(c) for c in command]
+        if result_dir:
+            command_args.extend(
+                ["--log-file-path", result_dir, "--use-log-saver"])
+        print("Remote command on %s: %s" % (serial, command_args))
+        try:
+            instance = tradefed_instance.GetInstance(
+                self.console.test_suite_info["vts"])
+            result = instance.ExecuteCommand(serial, command_args)
+        except (socket.error, remote_operation.RemoteOperationException) as e:
+            logging.error("Failed to execute remote command: %s", e)
+            return 1
+        logging.info("Remote command result: %s", result)
+        if result and result.get("status") == "INVOCATION_SUCCESS":
+            return 0
+        return 1
+
+    def _LoadReport(self, result_zip_paths, serials=None):
+        """Loads information from reports and stores them in the result
+        database.
+
+        Args:
+            result_zip_paths: The paths to the zips containing the XML
+                              reports. The reports of multiple runs are
+                              merged.
+            serials: list of strings, the serials of the tested devices.
+
+        Returns:
+            A dict containing the attributes and the per-module test counts
+            loaded from the reports.
+        """
+        summaries = []
+        for result_zip_path in result_zip_paths:
+            try:
+                _, summary = result_db.ResultDb().AddResultZip(
+                    result_zip_path, self.console.fetch_info, serials)
+            except (sqlite3.Error, OSError, IOError) as e:
+                logging.error("Failed to store %s: %s", result_zip_path, e)
+                summary = result_parser.ParseResultZip(result_zip_path)
+            if summary is not None and summary.attributes:
+                summaries.append(summary)
+        if not summaries:
             logging.warning("Nothing loaded from report.")
+            return {}
+        summary = result_parser.MergeSummaries(summaries)
+
+        result = {
+            key: summary.attributes[key]
+            for key in self._RESULT_ATTRIBUTES if key in summary.attributes
+        }
+        if len(result) != len(self._RESULT_ATTRIBUTES):
+            logging.warning("Incomplete <Result>: %s", summary.attributes)
+        result.update(summary.ToDict())
+        logging.info("%d modules, %d passed, %d failed",
+                     len(summary.modules), summary.passed, summary.failed)
+        return result
+
+    def _CollectResults(self, result_dir, expected_count, serials=None):
+        """Loads the reports in the result directory.
+
+        Args:
+            result_dir: string, the path to the result directory.
+            expected_count: integer, the expected number of reports. If more
+                            than one report is expected, all of them are
+                            merged; otherwise, only the first one is loaded.
+            serials: list of strings, the serials of the tested devices.
+
+        Returns:
+            A dict to be stored in console.test_result.
+        """
+        index = result_index.ResultIndex(result_dir)
+        index.Refresh()
+        result_paths = index.GetFiles(prefix="log-result", suffix=".zip")
+
+        if len(result_paths) != expected_count:
+            logging.warning("Unexpected number of results: %s",
+                            result_paths)
 
+        self.console.test_result.clear()
+        result = {}
+        if len(result_paths) > 0:
+            if expected_count > 1:
+                result = self._LoadReport(result_paths, serials)
+            else:
+                result = self._LoadReport(result_paths[:1], serials)
+            result["result_zip"] = result_paths[0]
+
+        result["result_full"] = " ".join(index.GetFiles(suffix=".zip"))
         return result
 
+    def _RunOnDevice(self, args, exec_mode, serial, command, result_dir,
+                     run_name):
+        """Runs one vts-tradefed invocation on a device.
+
+        Args:
+            args: the parsed arguments.
+            exec_mode: string, "subprocess" or "remote".
+            serial: string, the device serial.
+            command: list of strings, the command arguments.
+            result_dir: string, the path to the result directory. None if
+                        the result is not kept.
+            run_name: string, the name of the sub-directory of result_dir
+                      where the invocation saves its result.
+
+        Returns:
+            integer, the return code of the invocation.
+        """
+        run_dir = None
+        if result_dir:
+            run_dir = os.path.join(result_dir, run_name)
+            os.makedirs(run_dir)
+        if exec_mode == "remote":
+            return self._ExecuteRemoteCommand(command, serial, run_dir)
+        cmd = self._GenerateVtsCommand(self.console.test_suite_info["vts"],
+                                       command, [serial], run_dir)
+        print("Command: %s" % cmd)
+        capture = None
+        if args.output_capture == "true":
+            capture = self._CreateOutputCapture(run_dir)
+        return self._ExecuteCommand(cmd, capture)
+
+    def _RunInvocations(self, args, exec_mode, invocations, result_dir):
+        """Runs vts-tradefed invocations on different devices concurrently.
+
+        Args:
+            args: the parsed arguments.
+            exec_mode: string, "subprocess" or "remote".
+            invocations: list of (serial, command arguments), one
+                         invocation per device.
+            result_dir: string, the path to the result directory. None if
+                        the result is not kept.
+        """
+        job = job_table.GetCurrentJob()
+
+        def RunInvocation(index, serial, command):
+            """Runs an invocation as part of the caller's job."""
+            with job_table.AttachJob(job):
+                self._RunOnDevice(args, exec_mode, serial, command,
+                                  result_dir, "%03d_%s" % (index, serial))
+
+        threads = []
+        for index, (serial, command) in enumerate(invocations):
+            thread = threading.Thread(
+                target=RunInvocation, args=(index, serial, command))
+            thread.daemon = True
+            thread.start()
+            threads.append(thread)
+        for thread in threads:
+            thread.join()
+
+        if result_dir:
+            serials = [serial for serial, _ in invocations]
+            result = self._CollectResults(result_dir, len(invocations),
+                                          serials)
+            # The number of sessions which retry command retries together.
+            result["invocations"] = len(invocations)
+            logging.debug(result)
+            self.console.test_result.update(result)
+
+    def _RunBalancedShards(self, args, exec_mode, serials, result_dir):
+        """Runs the modules in shards balanced by their past durations.
+
+        The shard with the least estimated duration excludes the modules of
+        the other shards instead of including its own, so it also runs the
+        modules without history.
+
+        Args:
+            args: the parsed arguments.
+            exec_mode: string, "subprocess" or "remote".
+            serials: list of strings, one serial per shard.
+            result_dir: string, the path to the result directory. None if
+                        the result is not kept.
+
+        Returns:
+            False if the shards cannot be planned; None otherwise.
+        """
+        durations = _GetModuleDurations(args.command[0])
+        if len(serials) < 2 or not durations:
+            logging.info("No duration history of %s. Sharding by TradeFed.",
+                         args.command[0])
+            args.command = list(args.command) + ["--shards", str(len(serials))]
+            args.balanced_shards = False
+            return self._RunCommand(args, serials, result_dir)
+
+        # Besides a shard per module, one shard runs the modules without
+        # history. A shard without include filters would run the whole plan.
+        num_shards = min(len(serials), len(durations) + 1)
+        shards = shard_planner.PlanShards(durations, num_shards)
+        lightest_index = shard_planner.GetLightestShardIndex(shards)
+        invocations = []
+        for shard_index, shard in enumerate(shards):
+            filters = []
+            if shard_index == lightest_index:
+                for other_index, other in enumerate(shards):
+                    if other_index != shard_index:
+                        for module in other.modules:
+                            filters.extend(["--exclude-filter", module])
+            elif not shard.modules:
+                continue
+            else:
+                for module in shard.modules:
+                    filters.extend(["--include-filter", module])
+            print("Shard %d on %s: %d modules, %.0f seconds estimated" %
+                  (shard_index, serials[shard_index], len(shard.modules),
+                   shard.total_secs))
+            invocations.append((serials[shard_index],
+                                list(args.command) + filters))
+        self._RunInvocations(args, exec_mode, invocations, result_dir)
+
+    def _RunRetrySessions(self, args, exec_mode, serials, result_dir):
+        """Retries sessions on different devices concurrently.
+
+        Args:
+            args: the parsed arguments.
+            exec_mode: string, "subprocess" or "remote".
+            serials: list of strings, the device serials.
+            result_dir: string, the path to the result directory. None if
+                        the result is not kept.
+
+        Returns:
+            False if there are fewer serials than sessions; None otherwise.
+        """
+        session_ids = args.retry_sessions.split(",")
+        if len(serials) < len(session_ids):
+            print("--retry-sessions requires a serial per session.")
+            return False
+        self._RunInvocations(
+            args, exec_mode,
+            [(serial, list(args.command) + ["--retry", session_id])
+             for serial, session_id in zip(serials, session_ids)],
+            result_dir)
+
+    def _RunModuleQueue(self, args, exec_mode, serials, result_dir):
+        """Runs modules one by one on whichever device is idle.
+
+        The modules are run longest first according to the recorded
+        durations. The modules without history are run first.
+
+        Args:
+            args: the parsed arguments.
+            exec_mode: string, "subprocess" or "remote".
+            serials: list of strings, the device serials.
+            result_dir: string, the path to the result directory. None if
+                        the result is not kept.
+
+        Returns:
+            False if any module could not be run on any device; None
+            otherwise.
+        """
+        if not serials:
+            print("--module-queue requires at least one serial.")
+            return False
+
+        modules = [module for module in args.module_queue.split(",") if module]
+        durations = _GetModuleDurations(args.command[0])
+        modules.sort(key=lambda module: (module in durations,
+                                         -durations.get(module, 0)))
+
+        job = job_table.GetCurrentJob()
+
+        def RunModule(serial, module, index):
+            """Runs a module on a device in its own result directory."""
+            with job_table.AttachJob(job):
+                return self._RunOnDevice(
+                    args, exec_mode, serial,
+                    list(args.command) + ["-m", module], result_dir,
+                    "%03d_%s" % (index, module))
+
+        scheduler = module_scheduler.ModuleScheduler(serials, modules,
+                                                     RunModule)
+        runs = scheduler.Run()
+        for run in runs:
+            print("%s on %s: return code %s, %s seconds" %
+                  (run.module, run.serial, run.return_code,
+                   "%.1f" % run.duration_secs
+                   if run.duration_secs is not None else "-"))
+
+        if result_dir:
+            result = self._CollectResults(result_dir, len(modules), serials)
+            logging.debug(result)
+            self.console.test_result.update(result)
+        if any(run.return_code is None for run in runs):
+            return False
+
+    def _RunCommand(self, args, serials, result_dir):
+        """Executes the test command and stores the result in the console.
+
+        Args:
+            args: the parsed arguments.
+            serials: list of strings, the device serials.
+            result_dir: string, the path to the result directory. None if
+                        the result is not kept.
+
+        Returns:
+            False if the command cannot be executed; None otherwise.
+        """
+        exec_mode = args.test_exec_mode
+        if args.module_queue:
+            return self._RunModuleQueue(args, exec_mode, serials, result_dir)
+        if args.balanced_shards:
+            return self._RunBalancedShards(args, exec_mode, serials,
+                                           result_dir)
+        if args.retry_sessions:
+            return self._RunRetrySessions(args, exec_mode, serials,
+                                          result_dir)
+
+        if exec_mode == "remote" and len(serials) != 1:
+            print("remote exec mode requires exactly one serial. "
+                  "Falling back to subprocess.")
+            exec_mode = "subprocess"
+
+        capture = None
+        if exec_mode == "remote":
+            self._ExecuteRemoteCommand(args.command, serials[0], result_dir)
+        else:
+            cmd = self._GenerateVtsCommand(self.console.test_suite_info["vts"],
+                                           args.command, serials, result_dir)
+
+            print("Command: %s" % cmd)
+            if args.output_capture == "true":
+                capture = self._CreateOutputCapture(result_dir)
+                print("Output: %s" % capture.output_dir)
+            self._ExecuteCommand(cmd, capture)
+
+        if result_dir:
+            result = self._CollectResults(result_dir, 1, serials)
+            if capture:
+                result["stdout_log"] = capture.GetPath("stdout")
+                result["stderr_log"] = capture.GetPath("stderr")
+
+            logging.debug(result)
+            self.console.test_result.update(result)
+
+    def _CreateUploader(self, upload_dest, result_dir):
+        """Creates an uploader which streams the result directory to GCS.
+
+        Args:
+            upload_dest: string, the destination URL which may contain
+                         variables enclosed in {}.
+            result_dir: string, the path to the result directory.
+
+        Returns:
+            An IncrementalUploader object. None if the arguments are invalid.
+        """
+        if not result_dir:
+            print("--upload-dest requires --keep-result.")
+            return None
+        try:
+            dest_url = self.console.FormatString(upload_dest)
+        except KeyError as e:
+            print("Unknown or uninitialized variable in upload dest: %s" % e)
+            return None
+        if not dest_url.startswith("gs://"):
+            print("%s is not correct GCS url." % dest_url)
+            return None
+        gsutil_path = build_provider_gcs.BuildProviderGCS.GetGsutilPath()
+        if not gsutil_path:
+            print("Please check gsutil is installed and on your PATH")
+            return None
+        return gcs_uploader.IncrementalUploader(gsutil_path, result_dir,
+                                                dest_url)
+
     # @Override
     def Run(self, arg_line):
         """Executes a command using a VTS-TF instance.
@@ -180,59 +652,46 @@ class CommandTest(base_command_processor.BaseCommandProcessor):
         else:
             serials = []
 
-        if args.test_exec_mode == "subprocess":
+        if args.test_exec_mode in ("subprocess", "remote"):
             if "vts" not in self.console.test_suite_info:
                 print("test_suite_info doesn't have 'vts': %s" %
                       self.console.test_suite_info)
                 return
 
             if args.keep_result:
-                self._ClearResultDir()
-                result_dir = self._result_dir
+                result_dir = self._ClearResultDir()
             else:
                 result_dir = None
 
-            cmd = self._GenerateVtsCommand(self.console.test_suite_info["vts"],
-                                           args.command, serials, result_dir)
+            if not args.upload_dest:
+                return self._RunCommand(args, serials, result_dir)
 
-            print("Command: %s" % cmd)
-            self._ExecuteCommand(cmd)
-
-            if result_dir:
-                result_paths = [
-                    os.path.join(dir_name, file_name) for
-                    dir_name, file_name in utils.iterate_files(result_dir) if
-                    file_name.startswith("log-result") and
-                    file_name.endswith(".zip")
-                ]
-
-                if len(result_paths) != 1:
-                    logging.warning("Unexpected number of results: %s",
-                                    result_paths)
-
-                self.console.test_result.clear()
-                if len(result_paths) > 0:
-                    with zipfile.ZipFile(
-                            result_paths[0], mode="r") as result_zip:
-                        with result_zip.open(
-                                "log-result.xml", mode="rU") as result_xml:
-                            result = self._LoadReport(result_xml)
-                    result["result_zip"] = result_paths[0]
-
-                result_paths_full = [
-                    os.path.join(dir_name, file_name) for
-                    dir_name, file_name in utils.iterate_files(result_dir) if
-                    file_name.endswith(".zip")]
-                result["result_full"] = " ".join(result_paths_full)
-
-                logging.debug(result)
-                self.console.test_result.update(result)
+            uploader = self._CreateUploader(args.upload_dest, result_dir)
+            if not uploader:
+                return False
+            uploader.Start()
+            try:
+                ret = self._RunCommand(args, serials, result_dir)
+            finally:
+                failed_files = uploader.Stop()
+            self.console.test_result["upload_dest"] = uploader.dest_url
+            if failed_files:
+                print("Failed to upload: %s" % failed_files)
+                return False
+            return ret
         else:
             print("unsupported exec mode: %s", args.test_exec_mode)
             return False
 
     # @Override
     def TearDown(self):
-        """Deletes the result directory."""
-        if self._result_dir:
-            shutil.rmtree(self._result_dir, ignore_errors=True)
+        """Deletes the temporary directories and stops vts-tradefed consoles."""
+        tradefed_instance.StopAll()
+        for (pid, _), result_dir in self._result_dirs.items():
+            if pid == os.getpid():
+                shutil.rmtree(result_dir, ignore_errors=True)
+        self._result_dirs.clear()
+        for pid, capture_dir in self._capture_dirs:
+            if pid == os.getpid():
+                shutil.rmtree(capture_dir, ignore_errors=True)
+        del self._capture_dirs[:]
@@ -0,0 +1,148 @@
+#!/usr/bin/env python
+#
+# Copyright (C) 2018 The Android Open Source Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+
+import os
+import shutil
+import tempfile
+import unittest
+import zipfile
+
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+
+from host_controller.command_processor import command_test
+from host_controller.utils.result import result_db
+
+_RESULT_XML = """<?xml version='1.0' encoding='UTF-8' standalone='no' ?>
+<Result suite_plan="vts" suite_name="VTS">
+  <Module name="%s" abi="arm64-v8a" runtime="%d" done="true">
+    <TestCase name="Case">
+      <Test result="pass" name="test1" />
+      <Test result="%s" name="test2" />
+    </TestCase>
+  </Module>
+</Result>
+"""
+
+
+class FakeConsole(object):
+    """The console attributes used by CommandTest."""
+
+    def __init__(self):
+        self.test_result = {}
+        self.test_suite_info = {"vts": "vts-tradefed"}
+        self.fetch_info = {}
+
+
+class CommandTestTest(unittest.TestCase):
+    """Tests for the sharding and scheduling of CommandTest.
+
+    Attributes:
+        _temp_dir: string, the temporary directory.
+        _console: FakeConsole object.
+        _processor: CommandTest object.
+    """
+
+    def setUp(self):
+        """Creates the processor and the temporary directory."""
+        self._temp_dir = tempfile.mkdtemp()
+        self._console = FakeConsole()
+        self._processor = command_test.CommandTest()
+        self._processor._SetUp(self._console)
+
+    def tearDown(self):
+        """Deletes the temporary directory."""
+        shutil.rmtree(self._temp_dir)
+
+    @mock.patch.object(command_test.CommandTest, "_RunInvocations")
+    @mock.patch.object(command_test, "_GetModuleDurations")
+    def testBalancedShardsMoreSerialsThanModules(self, mock_durations,
+                                                 mock_run):
+        """Tests that no shard runs the whole plan besides the lightest."""
+        mock_durations.return_value = {"A": 100, "B": 50}
+        args = self._processor.arg_parser.ParseLine("--balanced-shards -- vts")
+        self._processor._RunBalancedShards(args, "subprocess",
+                                           ["s1", "s2", "s3", "s4"], None)
+        invocations = mock_run.call_args[0][2]
+        self.assertEqual([
+            ("s1", ["vts", "--include-filter", "A"]),
+            ("s2", ["vts", "--include-filter", "B"]),
+            ("s3", ["vts", "--exclude-filter", "A", "--exclude-filter", "B"]),
+        ], invocations)
+
+    @mock.patch.object(command_test.CommandTest, "_RunCommand")
+    @mock.patch.object(command_test, "_GetModuleDurations")
+    def testBalancedShardsWithoutHistory(self, mock_durations, mock_run):
+        """Tests that TradeFed shards the plan without duration history."""
+        mock_durations.return_value = {}
+        args = self._processor.arg_parser.ParseLine("--balanced-shards -- vts")
+        self._processor._RunBalancedShards(args, "subprocess", ["s1", "s2"],
+                                           None)
+        self.assertEqual(["vts", "--shards", "2"], args.command)
+        self.assertFalse(args.balanced_shards)
+        mock_run.assert_called_once_with(args, ["s1", "s2"], None)
+
+    def testModuleQueue(self):
+        """Tests that the module results are merged into the console."""
+        runs = []
+
+        def RunOnDevice(args, exec_mode, serial, command, result_dir,
+                        run_name):
+            module = command[command.index("-m") + 1]
+            runs.append((serial, module))
+            run_dir = os.path.join(result_dir, run_name)
+            os.makedirs(run_dir)
+            with zipfile.ZipFile(os.path.join(run_dir, "log-result.zip"),
+                                 "w") as result_zip:
+                result_zip.writestr(
+                    "log-result.xml",
+                    _RESULT_XML % (module, 1000,
+                                   "fail" if module == "B" else "pass"))
+            return 0
+
+        db_path = os.path.join(self._temp_dir, "result.db")
+        result_db_class = result_db.ResultDb
+        result_dir = os.path.join(self._temp_dir, "result")
+        os.makedirs(result_dir)
+        args = self._processor.arg_parser.ParseLine(
+            "--module-queue A,B,C -- vts")
+        with mock.patch.object(self._processor, "_RunOnDevice",
+                               side_effect=RunOnDevice), \
+                mock.patch.object(command_test.result_db, "ResultDb",
+                                  lambda: result_db_class(db_path)):
+            ret = self._processor._RunModuleQueue(args, "subprocess",
+                                                  ["s1", "s2"], result_dir)
+
+        self.assertIsNone(ret)
+        self.assertEqual(["A", "B", "C"],
+                         sorted(module for _, module in runs))
+        self.assertTrue(set(serial for serial, _ in runs) <= {"s1", "s2"})
+        result = self._console.test_result
+        self.assertEqual("vts", result["suite_plan"])
+        self.assertEqual(["A", "B", "C"],
+                         sorted(module["name"] for module in result["modules"]))
+        self.assertEqual(5, result["total_pass"])
+        self.assertEqual(1, result["total_fail"])
+        self.assertEqual(["B#Case#test2"], result["failed_tests"])
+        self.assertEqual(3, len(result["result_full"].split()))
+
+
+if __name__ == "__main__":
+    unittest.main()
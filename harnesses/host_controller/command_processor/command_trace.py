@@ -0,0 +1,76 @@
+#
+# Copyright (C) 2018 The Android Open Source Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import os
+import time
+
+from host_controller.command_processor import base_command_processor
+from host_controller.utils.trace import tracer
+
+
+class CommandTrace(base_command_processor.BaseCommandProcessor):
+    """Command processor for trace command.
+
+    Attributes:
+        arg_parser: ConsoleArgumentParser object, argument parser.
+        console: cmd.Cmd console object.
+        command: string, command name which this processor will handle.
+        command_detail: string, detailed explanation for the command.
+    """
+
+    command = "trace"
+    command_detail = ("Export the spans of the commands, downloads and flash "
+                      "steps as Chrome trace-event JSON.")
+
+    # @Override
+    def SetUp(self):
+        """Initializes the parser for trace command."""
+        self.arg_parser.add_argument(
+            "action",
+            choices=("export", "clear", "on", "off", "status"),
+            help="export writes a file; clear drops the recorded spans; "
+            "on and off enable and disable recording.")
+        self.arg_parser.add_argument(
+            "--path",
+            default=None,
+            help="The output file of export. Default: a new file in the "
+            "current directory.")
+        self.arg_parser.add_argument(
+            "--job",
+            type=int,
+            default=None,
+            help="Export the spans of a background job only.")
+
+    # @Override
+    def Run(self, arg_line):
+        """Exports or controls the trace."""
+        args = self.arg_parser.ParseLine(arg_line)
+        if args.action == "export":
+            path = args.path or os.path.join(
+                os.getcwd(), "trace-%s.json" % time.strftime("%Y%m%d-%H%M%S"))
+            try:
+                count = tracer.ExportChromeTrace(path, args.job)
+            except (IOError, OSError) as e:
+                print("Failed to export trace: %s" % e)
+                return False
+            self.console._Print("Exported %d spans to %s" % (count, path))
+        elif args.action == "clear":
+            tracer.Clear()
+        elif args.action in ("on", "off"):
+            tracer.SetEnabled(args.action == "on")
+        else:
+            self.console._Print("Recording: %s, spans: %d" %
+                                (tracer.IsEnabled(), len(tracer.GetEvents())))
@@ -20,8 +20,7 @@ import re
 
 from host_controller.build import build_provider_gcs
 from host_controller.command_processor import base_command_processor
-
-from vts.utils.python.common import cmd_utils
+from host_controller.utils.upload import gcs_uploader
 
 
 class CommandUpload(base_command_processor.BaseCommandProcessor):
@@ -85,6 +84,16 @@ class CommandUpload(base_command_processor.BaseCommandProcessor):
             "--dest",
             required=True,
             help="Google Cloud Storage URL to which the file is uploaded.")
+        self.arg_parser.add_argument(
+            "--workers",
+            type=int,
+            default=gcs_uploader.DEFAULT_NUM_WORKERS,
+            help="The number of files uploaded concurrently.")
+        self.arg_parser.add_argument(
+            "--attempts",
+            type=int,
+            default=gcs_uploader.DEFAULT_MAX_ATTEMPTS,
+            help="The number of attempts to upload each file.")
 
     # @Override
     def Run(self, arg_line):
@@ -99,7 +108,7 @@ class CommandUpload(base_command_processor.BaseCommandProcessor):
         if args.src.startswith("latest-"):
             src_name = args.src[7:]
             if src_name in self.console.device_image_info:
-                src_path = self.console.device_image_info[src_name]
+                src_paths = self.console.device_image_info[src_name]
             else:
                 print(
                     "Unable to find {} in device_image_info".format(src_name))
@@ -111,9 +120,9 @@ class CommandUpload(base_command_processor.BaseCommandProcessor):
                 print("Unknown or uninitialized variable in src: %s" % e)
                 return False
 
-        src_path_list = src_paths.split(" ")
-        for path in src_path_list:
-            src_path = path.strip()
+        src_path_list = [path.strip() for path in src_paths.split(" ")
+                         if path.strip()]
+        for src_path in src_path_list:
             if not os.path.isfile(src_path):
                 print("Cannot find a file: {}".format(src_path))
                 return False
@@ -129,8 +138,12 @@ class CommandUpload(base_command_processor.BaseCommandProcessor):
             return False
         """ TODO(jongmok) : Before upload, login status, authorization,
                             and dest check are required. """
-        copy_command = "{} cp {} {}".format(gsutil_path, src_paths, dest_path)
-        _, stderr, err_code = cmd_utils.ExecuteOneShellCommand(copy_command)
-
-        if err_code:
-            print stderr
+        uploader = gcs_uploader.ParallelUploader(gsutil_path, args.workers,
+                                                 args.attempts)
+        report = uploader.Upload(src_path_list, dest_path)
+        print(report)
+
+        if report.failed or report.missing:
+            print("Failed to upload: {}".format(
+                " ".join(report.failed + report.missing)))
+            return False
@@ -14,6 +14,8 @@
 # limitations under the License.
 #
 
+import os
+
 # The default Partner Android Build (PAB) public account.
 # To obtain access permission, please reach out to Android partner engineering
 # department of Google LLC.
@@ -47,10 +49,30 @@ _DEVICE_STATUS_DICT = {
     "online": 2,
     "ready": 3,
     "use": 4,
-    "error": 5}
+    "error": 5,
+    "staged": 6}
 
 # Default SPL date, used for gsispl command
 _SPL_DEFAULT_DAY = 5
 
 # Maximum number of leased jobs per host.
 _MAX_LEASED_JOBS = 14
+
+# Maximum number of background console jobs running at once.
+_MAX_BACKGROUND_JOBS = 4
+
+# The estimated USB bandwidth (Mbps) consumed by flashing one device. Used to
+# limit the concurrent flashes on a USB bus. 0 disables the limit.
+_USB_FLASH_BANDWIDTH_MBPS = 300
+
+# The directory where the host controller keeps data across runs.
+_DATA_DIR = os.path.join(os.path.expanduser("~"), ".vtslab")
+
+# The SQLite database of the test results on the host.
+_RESULT_DB_FILE = os.path.join(_DATA_DIR, "results.db")
+
+# The directory of the Chrome trace files of the leased jobs.
+_TRACE_DIR = os.path.join(_DATA_DIR, "traces")
+
+# The snapshot of the console state for warm restarts.
+_STATE_SNAPSHOT_FILE = os.path.join(_DATA_DIR, "console_state.json")
@@ -15,8 +15,8 @@
 #
 
 import cmd
+import collections
 import datetime
-import imp  # Python v2 compatibility
 import multiprocessing
 import multiprocessing.pool
 import os
@@ -29,45 +29,95 @@ import time
 import urlparse
 
 from host_controller import common
-from host_controller.command_processor import command_build
-from host_controller.command_processor import command_config
-from host_controller.command_processor import command_copy
-from host_controller.command_processor import command_device
-from host_controller.command_processor import command_exit
-from host_controller.command_processor import command_fetch
-from host_controller.command_processor import command_flash
-from host_controller.command_processor import command_gsispl
-from host_controller.command_processor import command_info
-from host_controller.command_processor import command_lease
-from host_controller.command_processor import command_list
-from host_controller.command_processor import command_retry
-from host_controller.command_processor import command_request
-from host_controller.command_processor import command_test
-from host_controller.command_processor import command_upload
-from host_controller.build import build_provider_ab
-from host_controller.build import build_provider_gcs
-from host_controller.build import build_provider_local_fs
-from host_controller.build import build_provider_pab
+from host_controller.build import build_provider
+from host_controller.build import device_prestager
+from host_controller.build import flash_stats
+from host_controller.utils.cmd import command_graph
+from host_controller.utils.cmd import job_table
+from host_controller.utils.cmd import sub_command_pool
 from host_controller.utils.ipc import shared_dict
+from host_controller.utils.metrics import metrics
+from host_controller.utils.metrics import metrics_server
+from host_controller.utils.script import script_loader
+from host_controller.utils.state import state_snapshot
+from host_controller.utils.trace import tracer
 from host_controller.vti_interface import vti_endpoint_client
 
-COMMAND_PROCESSORS = [
-    command_build.CommandBuild,
-    command_config.CommandConfig,
-    command_copy.CommandCopy,
-    command_device.CommandDevice,
-    command_exit.CommandExit,
-    command_fetch.CommandFetch,
-    command_flash.CommandFlash,
-    command_gsispl.CommandGsispl,
-    command_info.CommandInfo,
-    command_lease.CommandLease,
-    command_list.CommandList,
-    command_retry.CommandRetry,
-    command_request.CommandRequest,
-    command_test.CommandTest,
-    command_upload.CommandUpload,
-]
+# The command processors by command name. A processor is imported and set up
+# when its command is used for the first time.
+COMMAND_PROCESSORS = {
+    "bg": ("command_job", "CommandBackground"),
+    "build": ("command_build", "CommandBuild"),
+    "config": ("command_config", "CommandConfig"),
+    "copy": ("command_copy", "CommandCopy"),
+    "device": ("command_device", "CommandDevice"),
+    "exit": ("command_exit", "CommandExit"),
+    "fetch": ("command_fetch", "CommandFetch"),
+    "flash": ("command_flash", "CommandFlash"),
+    "gsispl": ("command_gsispl", "CommandGsispl"),
+    "info": ("command_info", "CommandInfo"),
+    "jobs": ("command_job", "CommandJobs"),
+    "kill": ("command_job", "CommandKill"),
+    "lease": ("command_lease", "CommandLease"),
+    "list": ("command_list", "CommandList"),
+    "output": ("command_job", "CommandOutput"),
+    "prestage": ("command_prestage", "CommandPrestage"),
+    "profile": ("command_profile", "CommandProfile"),
+    "retry": ("command_retry", "CommandRetry"),
+    "request": ("command_request", "CommandRequest"),
+    "results": ("command_results", "CommandResults"),
+    "snapshot": ("command_snapshot", "CommandSnapshot"),
+    "stats": ("command_stats", "CommandStats"),
+    "test": ("command_test", "CommandTest"),
+    "trace": ("command_trace", "CommandTrace"),
+    "upload": ("command_upload", "CommandUpload"),
+    "wait": ("command_job", "CommandWait"),
+}
+
+_COMMAND_PROCESSOR_PACKAGE = "host_controller.command_processor"
+
+# The build providers by fetch type. A provider is created when it is used
+# for the first time.
+_BUILD_PROVIDERS = {
+    "pab": ("host_controller.build.build_provider_pab", "BuildProviderPAB"),
+    "local_fs": ("host_controller.build.build_provider_local_fs",
+                 "BuildProviderLocalFS"),
+    "gcs": ("host_controller.build.build_provider_gcs", "BuildProviderGCS"),
+    "ab": ("host_controller.build.build_provider_ab", "BuildProviderAB"),
+}
+
+
+def _ImportClass(module_name, class_name):
+    """Imports a module and returns a class in it."""
+    return getattr(__import__(module_name, fromlist=[class_name]), class_name)
+
+
+class _BuildProviderDict(dict):
+    """The build providers of a console, created on first access.
+
+    The dict contains the created providers only, while "in" and item
+    access accept every available type.
+
+    Attributes:
+        _types: set of strings, the available fetch types.
+        _lock: threading.Lock, prevents creating a provider twice.
+    """
+
+    def __init__(self, types):
+        dict.__init__(self)
+        self._types = set(types)
+        self._lock = threading.Lock()
+
+    def __contains__(self, key):
+        return key in self._types or dict.__contains__(self, key)
+
+    def __missing__(self, key):
+        if key not in self._types:
+            raise KeyError(key)
+        with self._lock:
+            if not dict.__contains__(self, key):
+                self[key] = _ImportClass(*_BUILD_PROVIDERS[key])()
+            return dict.__getitem__(self, key)
 
 
 class NonDaemonizedProcess(multiprocessing.Process):
@@ -88,7 +138,9 @@ class NonDaemonizedPool(multiprocessing.pool.Pool):
     Process = NonDaemonizedProcess
 
 
-def JobMain(vti_address, in_queue, out_queue, device_status):
+def JobMain(vti_address, in_queue, out_queue, device_status,
+            metrics_store=None, sub_command_backend=sub_command_pool.PROCESS,
+            flash_records=None):
     """Main() for a child process that executes a leased job.
 
     Currently, lease jobs must use VTI (not TFC).
@@ -99,6 +151,13 @@ def JobMain(vti_address, in_queue, out_queue, device_status):
         out_queue: Queue to put execution results.
         device_status: SharedDict, contains device status information.
                        shared between processes.
+        metrics_store: dict shared with the main process, where the metric
+                       values of this process are published.
+        sub_command_backend: string, how the sub-command lists of a
+                             parallel command are executed. One of
+                             sub_command_pool.BACKENDS.
+        flash_records: list shared with the main process, where the flash
+                       steps of the leased jobs are recorded.
     """
     if not vti_address:
         print("vti address is not set. example : $ run --vti=<url>")
@@ -114,14 +173,14 @@ def JobMain(vti_address, in_queue, out_queue, device_status):
     signal.signal(signal.SIGTERM, SigTermHandler)
 
     vti_client = vti_endpoint_client.VtiEndpointClient(vti_address)
-    console = Console(
-        vti_client,
-        None,
-        build_provider_pab.BuildProviderPAB(),
-        None,
-        job_pool=True)
+    console = Console(vti_client, None, None, None, job_pool=True)
     console.device_status = device_status
+    console.sub_command_backend = sub_command_backend
+    if flash_records is not None:
+        console.flash_stats.SetSharedRecords(flash_records)
     multiprocessing.util.Finalize(console, console.__exit__, exitpriority=0)
+    if metrics_store is not None:
+        metrics.StartPublisher(metrics_store)
 
     while True:
         command = in_queue.get()
@@ -142,9 +201,11 @@ def JobMain(vti_address, in_queue, out_queue, device_status):
                     sys.stdout = out
                     sys.stderr = err
 
-                ret = console.ProcessConfigurableScript(
-                    os.path.join(os.getcwd(), "host_controller", "campaigns",
-                                 filepath), **kwargs)
+                with tracer.Span("leased job", "job", script=filepath,
+                                 serial=",".join(kwargs["serial"])):
+                    ret = console.ProcessConfigurableScript(
+                        os.path.join(os.getcwd(), "host_controller",
+                                     "campaigns", filepath), **kwargs)
                 if ret:
                     job_status = "complete"
                 else:
@@ -154,6 +215,19 @@ def JobMain(vti_address, in_queue, out_queue, device_status):
                 print("Job execution complete. "
                       "Setting job status to {}".format(job_status))
 
+                trace_path = os.path.join(
+                    common._TRACE_DIR, "%s-%d-%s.json" %
+                    (os.path.splitext(os.path.basename(filepath))[0],
+                     os.getpid(), time.strftime("%Y%m%d-%H%M%S")))
+                try:
+                    tracer.ExportChromeTrace(trace_path)
+                    print("Trace: %s" % trace_path)
+                except (IOError, OSError) as e:
+                    print("Failed to export trace: %s" % e)
+                tracer.Clear()
+                if metrics_store is not None:
+                    metrics.Publish(metrics_store)
+
                 if not print_to_console:
                     sys.stdout = sys.__stdout__
                     sys.stderr = sys.__stderr__
@@ -165,20 +239,85 @@ def JobMain(vti_address, in_queue, out_queue, device_status):
             print("Unknown job command %s" % command)
 
 
+# The console dicts which a sub-command list running in parallel reads and
+# writes privately. The changes are merged into the console afterwards.
+_SUB_COMMAND_STATE_ATTRS = ("device_image_info", "test_result",
+                            "test_suite_info", "tools_info", "fetch_info")
+
+# The option of a fetch command which selects the build provider.
+_FETCH_TYPE_PATTERN = re.compile(r"--type[= ](\S+)")
+
+
+def _AddImplicitOutputs(node):
+    """Declares the shared state which a graph node writes implicitly.
+
+    A fetch command writes the temp dir of its build provider and the
+    console's fetch_info, so the fetch commands are not run concurrently.
+
+    Args:
+        node: dict created by command_graph.Node.
+
+    Returns:
+        A dict created by command_graph.Node.
+    """
+    command = node["command"]
+    if not isinstance(command, str) or command.split(" ", 1)[0] != "fetch":
+        return node
+    match = _FETCH_TYPE_PATTERN.search(command)
+    fetch_type = match.group(1) if match else "pab"
+    return command_graph.Node(
+        command, node["inputs"],
+        node["outputs"] + ["build_provider:%s" % fetch_type, "fetch_info"])
+
+
+def _SubCommandState(name):
+    """Returns a property of a console dict.
+
+    In a thread running a sub-command list, the property refers to the
+    thread's private copy of the dict.
+
+    Args:
+        name: string, the attribute name.
+    """
+
+    def Get(self):
+        local_state = getattr(self._thread_state, "state", None)
+        if local_state is not None:
+            return local_state[name]
+        return self._state[name]
+
+    return property(Get)
+
+
 class Console(cmd.Cmd):
     """The console for host controllers.
 
     Attributes:
         command_processors: dict of string:BaseCommandProcessor,
-                            map between command string and command processors.
+                            map between command string and the command
+                            processors which have been set up. A processor
+                            is set up when its command is used first.
         device_image_info: dict containing info about device image files.
+        device_prestager: DevicePrestager, reboots devices into bootloader
+                          ahead of flashing.
+        flash_stats: FlashStats, the timing records of flash steps,
+                     including those of the sub-command processes and the
+                     leased jobs.
+        jobs: JobTable, the commands running in background.
         prompt: The prompt string at the beginning of each command line.
         test_result: dict containing info about the last test result.
         test_suite_info: dict containing info about test suite package files.
         tools_info: dict containing info about custom tool files.
         scheduler_thread: dict containing threading.Thread instances(s) that
                           update configs regularly.
-        _build_provider_pab: The BuildProviderPAB used to download artifacts.
+        sub_command_backend: string, how the sub-command lists of a parallel
+                             command are executed. One of
+                             sub_command_pool.BACKENDS.
+        sub_command_results: list of SubCommandResult, the results of the
+                             last parallel command.
+        _build_provider: dict of {fetch type: BuildProvider}, the providers
+                         used to download artifacts. They are created on
+                         first access.
         _vti_address: string, VTI service URI.
         _vti_client: VtiEndpoewrClient, used to upload data to a test
                      scheduling infrastructure.
@@ -191,8 +330,27 @@ class Console(cmd.Cmd):
                         contains status data on each devices.
         _job_pool: bool, True if Console is created from job pool process
                    context.
+        _job_in_queue: multiprocessing.Queue, the commands to the job pool.
+                       None if the pool is not started.
+        _metrics_store: dict shared with the job pool, where the pool
+                        processes publish their metric values. None if the
+                        pool is not started.
+        _metrics_server: MetricsServer, None if not started.
+        _state: dict of {attribute name: dict}, the console dicts listed in
+                _SUB_COMMAND_STATE_ATTRS.
+        _thread_state: threading.local, contains the private copies of the
+                       console dicts in a sub-command thread.
+        _thread_pool: sub_command_pool.ThreadPool, created on first use.
+        _command_processor_lock: threading.RLock, prevents setting up a
+                                 command processor twice.
     """
 
+    device_image_info = _SubCommandState("device_image_info")
+    test_result = _SubCommandState("test_result")
+    test_suite_info = _SubCommandState("test_suite_info")
+    tools_info = _SubCommandState("tools_info")
+    fetch_info = _SubCommandState("fetch_info")
+
     def __init__(self,
                  vti_endpoint_client,
                  tfc,
@@ -205,14 +363,13 @@ class Console(cmd.Cmd):
         """Initializes the attributes and the parsers."""
         # cmd.Cmd is old-style class.
         cmd.Cmd.__init__(self, stdin=in_file, stdout=out_file)
-        self._build_provider = {}
-        self._build_provider["pab"] = pab
         self._job_pool = job_pool
-        if not self._job_pool:
-            self._build_provider[
-                "local_fs"] = build_provider_local_fs.BuildProviderLocalFS()
-            self._build_provider["gcs"] = build_provider_gcs.BuildProviderGCS()
-            self._build_provider["ab"] = build_provider_ab.BuildProviderAB()
+        if self._job_pool:
+            self._build_provider = _BuildProviderDict(["pab"])
+        else:
+            self._build_provider = _BuildProviderDict(_BUILD_PROVIDERS)
+        if pab is not None:
+            self._build_provider["pab"] = pab
         self._vti_endpoint_client = vti_endpoint_client
         self._vti_address = vti_address
         self._tfc_client = tfc
@@ -221,12 +378,19 @@ class Console(cmd.Cmd):
         self._out_file = out_file
         self.prompt = "> "
         self.command_processors = {}
-        self.device_image_info = {}
-        self.test_result = {}
-        self.test_suite_info = {}
-        self.tools_info = {}
-        self.fetch_info = {}
+        self._command_processor_lock = threading.RLock()
+        self._state = dict((name, {}) for name in _SUB_COMMAND_STATE_ATTRS)
+        self._thread_state = threading.local()
+        self._thread_pool = None
+        self.sub_command_backend = sub_command_pool.PROCESS
+        self.sub_command_results = []
+        self.jobs = job_table.JobTable(common._MAX_BACKGROUND_JOBS)
+        self._job_in_queue = None
+        self._metrics_store = None
+        self._metrics_server = None
         self.test_results = {}
+        self.flash_stats = flash_stats.FlashStats()
+        self.device_prestager = device_prestager.DevicePrestager()
         self._device_status = shared_dict.SharedDict()
 
         if common._ANDROID_SERIAL in os.environ:
@@ -235,7 +399,6 @@ class Console(cmd.Cmd):
             self._serials = []
 
         self.InitCommandModuleParsers()
-        self.SetUpCommandProcessors()
 
     def __exit__(self):
         """Finalizes the build provider attributes explicitly when exited."""
@@ -260,22 +423,66 @@ class Console(cmd.Cmd):
                 if hasattr(attr_func, '__call__'):
                     attr_func()
 
-    def SetUpCommandProcessors(self):
-        """Sets up all command processors."""
-        for command_processor in COMMAND_PROCESSORS:
-            cp = command_processor()
+    def __getattr__(self, name):
+        """Sets up the command processor of a do_ or help_ attribute.
+
+        Raises:
+            AttributeError if the attribute is not a command.
+        """
+        for prefix in ("do_", "help_"):
+            if (name.startswith(prefix) and
+                    name[len(prefix):] in COMMAND_PROCESSORS):
+                self.SetUpCommandProcessor(name[len(prefix):])
+                return self.__dict__[name]
+        raise AttributeError(name)
+
+    # @Override
+    def get_names(self):
+        """Returns the attribute names including the unloaded commands."""
+        names = cmd.Cmd.get_names(self)
+        for command in COMMAND_PROCESSORS:
+            names.extend(("do_" + command, "help_" + command))
+        return names
+
+    def SetUpCommandProcessor(self, command):
+        """Imports and sets up a command processor if it is not yet.
+
+        Args:
+            command: string, the command name in COMMAND_PROCESSORS.
+
+        Returns:
+            The BaseCommandProcessor object.
+        """
+        with self._command_processor_lock:
+            cp = self.command_processors.get(command)
+            if cp:
+                return cp
+            module_name, class_name = COMMAND_PROCESSORS[command]
+            cp = _ImportClass(
+                "%s.%s" % (_COMMAND_PROCESSOR_PACKAGE, module_name),
+                class_name)()
             cp._SetUp(self)
-            do_text = "do_%s" % cp.command
-            help_text = "help_%s" % cp.command
-            setattr(self, do_text, cp._Run)
-            setattr(self, help_text, cp._Help)
-            self.command_processors[cp.command] = cp
+            setattr(self, "do_%s" % command, cp._Run)
+            setattr(self, "help_%s" % command, cp._Help)
+            self.command_processors[command] = cp
+            return cp
 
     def TearDown(self):
         """Removes all command processors."""
-        for command_processor in self.command_processors.itervalues():
+        for command, command_processor in self.command_processors.items():
             command_processor._TearDown()
+            self.__dict__.pop("do_%s" % command, None)
+            self.__dict__.pop("help_%s" % command, None)
         self.command_processors.clear()
+        if self._thread_pool:
+            self._thread_pool.Shutdown()
+            self._thread_pool = None
+        self.jobs.Shutdown()
+        self.jobs = job_table.JobTable(self.jobs.max_workers)
+        if self._metrics_server:
+            self._metrics_server.Stop()
+            self._metrics_server = None
+            metrics.GetRegistry().RemoveCollector(self._CollectMetrics)
 
     def FormatString(self, format_string):
         """Replaces variables with the values in the console's dictionaries.
@@ -309,6 +516,43 @@ class Console(cmd.Cmd):
 
         return re.sub("{([^}]+)}", ReplaceVariable, format_string)
 
+    def _ProcessCommands(self, commands):
+        """Executes the commands emitted by a script.
+
+        If the script emits any command_graph.Node, the commands run
+        concurrently by their declared dependencies; otherwise, they run
+        in order.
+
+        Args:
+            commands: list of strings, lists, or dicts created by
+                      command_graph.Node.
+
+        Returns:
+            True if successful; False otherwise.
+        """
+        if any(command_graph.IsNode(command) for command in commands):
+            commands = [
+                _AddImplicitOutputs(command)
+                if command_graph.IsNode(command) else command
+                for command in commands
+            ]
+            job = job_table.GetCurrentJob()
+            state_lock = threading.Lock()
+
+            def RunGraphCommand(command):
+                with job_table.AttachJob(job):
+                    return self._RunGraphCommand(command, state_lock)
+
+            success, _ = command_graph.RunGraph(
+                command_graph.BuildGraph(commands), RunGraphCommand)
+            return success
+
+        for command in commands:
+            ret = self.onecmd(command)
+            if ret == False:
+                return False
+        return True
+
     def ProcessScript(self, script_file_path):
         """Processes a .py script file.
 
@@ -326,14 +570,11 @@ class Console(cmd.Cmd):
             print("Script file is not .py file: %s" % script_file_path)
             return False
 
-        script_module = imp.load_source('script_module', script_file_path)
+        script_module = script_loader.LoadScript(script_file_path)
 
         commands = script_module.EmitConsoleCommands()
         if commands:
-            for command in commands:
-                ret = self.onecmd(command)
-                if ret == False:
-                    return False
+            return self._ProcessCommands(commands)
         return True
 
     def ProcessConfigurableScript(self, script_file_path, **kwargs):
@@ -358,17 +599,12 @@ class Console(cmd.Cmd):
             print("Script file is not .py file: %s" % script_file_path)
             return False
 
-        script_module = imp.load_source('script_module', script_file_path)
+        script_module = script_loader.LoadScript(script_file_path)
 
         commands = script_module.EmitConsoleCommands(**kwargs)
         if commands:
-            for command in commands:
-                ret = self.onecmd(command)
-                if ret == False:
-                    return False
-        else:
-            return False
-        return True
+            return self._ProcessCommands(commands)
+        return False
 
     def _Print(self, string):
         """Prints a string and a new line character.
@@ -480,13 +716,21 @@ class Console(cmd.Cmd):
             self._job_pool.join()
 
     def StartJobThreadAndProcessPool(self):
-        """Starts a background thread to control leased jobs."""
+        """Starts a background thread to control leased jobs.
+
+        The job consoles use the sub_command_backend of this console.
+        """
         self._job_in_queue = multiprocessing.Queue()
         self._job_out_queue = multiprocessing.Queue()
+        self._metrics_manager = multiprocessing.Manager()
+        self._metrics_store = self._metrics_manager.dict()
+        flash_records = self._metrics_manager.list()
+        self.flash_stats.SetSharedRecords(flash_records)
         self._job_pool = NonDaemonizedPool(
             common._MAX_LEASED_JOBS, JobMain,
             (self._vti_address, self._job_in_queue, self._job_out_queue,
-             self._device_status))
+             self._device_status, self._metrics_store,
+             self.sub_command_backend, flash_records))
 
         self._job_thread = threading.Thread(target=self.JobThread)
         self._job_thread.daemon = True
@@ -498,59 +742,277 @@ class Console(cmd.Cmd):
             self._job_thread.keep_running = False
             self._job_thread.join()
 
+    def RunInBackground(self, line):
+        """Starts a command in a background job.
+
+        The output of the job is kept in the job instead of being printed.
+
+        Args:
+            line: string, the command.
+
+        Returns:
+            The job_table.Job object.
+        """
+        self._out_file = job_table.RouteOutput(self._out_file)
+        self.stdout = job_table.RouteOutput(self.stdout)
+        job_table.RouteStdout()
+        return self.jobs.Submit(line, self.onecmd)
+
+    def StartMetricsServer(self, address, port):
+        """Serves the metrics of this process and the job pool over HTTP.
+
+        Args:
+            address: string, the address to listen to.
+            port: integer, the port. 0 to choose a free port.
+
+        Returns:
+            The MetricsServer object.
+        """
+        registry = metrics.GetRegistry()
+        registry.AddCollector(self._CollectMetrics)
+
+        def Render():
+            snapshots = (self._metrics_store.values()
+                         if self._metrics_store is not None else [])
+            return registry.Render(snapshots)
+
+        self._metrics_server = metrics_server.MetricsServer(
+            address, port, Render)
+        self._metrics_server.Start()
+        return self._metrics_server
+
+    def _CollectMetrics(self):
+        """Returns the gauge values of the jobs and the devices."""
+        values = []
+        states = collections.Counter(job.state for job in self.jobs.GetJobs())
+        for state in (job_table.QUEUED, job_table.RUNNING):
+            values.append((metrics.JOBS, {
+                "type": "background",
+                "state": state
+            }, states[state]))
+        if self._job_in_queue is not None:
+            values.append((metrics.JOBS, {
+                "type": "lease",
+                "state": job_table.QUEUED
+            }, self._job_in_queue.qsize()))
+        status_names = dict((value, name) for name, value in
+                            common._DEVICE_STATUS_DICT.iteritems())
+        devices = collections.Counter(
+            status_names.get(status, "unknown")
+            for _, status in self._device_status.items())
+        for name in sorted(common._DEVICE_STATUS_DICT):
+            values.append((metrics.DEVICES, {"status": name}, devices[name]))
+        return values
+
+    def SaveState(self, path, digest=False):
+        """Saves the console dicts and the fetched artifacts to a file.
+
+        The temp dirs of the build providers are kept after the console
+        exits, so that the next console can load the state by LoadState.
+        The providers which are not BuildProvider objects are not saved.
+
+        Args:
+            path: string, the path to the snapshot file.
+            digest: boolean, whether to store the digests of the files.
+
+        Returns:
+            integer, the number of files recorded in the snapshot.
+        """
+        providers = {}
+        for fetch_type in self._build_provider:
+            provider = self._build_provider[fetch_type]
+            if not isinstance(provider, build_provider.BuildProvider):
+                continue
+            providers[fetch_type] = provider.GetState()
+            provider.KeepTmpDir()
+        return state_snapshot.SaveSnapshot(path, self._state, providers,
+                                           digest)
+
+    def LoadState(self, path):
+        """Loads the state saved by SaveState.
+
+        The entries whose files are missing or modified are not loaded.
+
+        Args:
+            path: string, the path to the snapshot file.
+
+        Returns:
+            A list of strings, the names of the dropped entries. None if
+            the file cannot be loaded.
+        """
+        state, providers, dropped = state_snapshot.LoadSnapshot(path)
+        if state is None:
+            return None
+        for fetch_type, provider_state in providers.iteritems():
+            if fetch_type not in self._build_provider:
+                dropped.append("provider:%s" % fetch_type)
+                continue
+            self._build_provider[fetch_type].RestoreState(provider_state)
+        for name in _SUB_COMMAND_STATE_ATTRS:
+            self._state[name].update(state.get(name, {}))
+        return dropped
+
+    def _GetStateCopy(self):
+        """Returns a copy of the console dicts of the current thread."""
+        return dict((name, dict(getattr(self, name)))
+                    for name in _SUB_COMMAND_STATE_ATTRS)
+
+    def _RunGraphCommand(self, command, state_lock):
+        """Executes a command of a dependency graph.
+
+        Like a sub-command list in the thread backend, the command works on
+        private copies of the console dicts. The changes are merged into the
+        console when the command finishes.
+
+        Args:
+            command: string or list, the console command.
+            state_lock: threading.Lock, serializes the accesses to the
+                        console dicts among the graph commands.
+
+        Returns:
+            The return value of onecmd.
+        """
+        if isinstance(command, list):
+            # A command list is a barrier and merges its own states.
+            return self.onecmd(command)
+        with state_lock:
+            before = self._GetStateCopy()
+            self._thread_state.state = self._GetStateCopy()
+        try:
+            ret = self.onecmd(command)
+            with state_lock:
+                sub_command_pool.ApplyStateChanges(
+                    self._state,
+                    sub_command_pool.DiffState(before, self._GetStateCopy()))
+        finally:
+            self._thread_state.state = None
+        return ret
+
+    def _RunSubCommand(self, index, sub_command):
+        """Executes a sub-command list of a parallel command.
+
+        In the thread backend, the sub-command list works on private copies
+        of the console dicts.
+
+        Args:
+            index: integer, the position of the sub-command list.
+            sub_command: string or list of strings, the sub-command list.
+
+        Returns:
+            A SubCommandResult object.
+        """
+        result = sub_command_pool.SubCommandResult(index, sub_command)
+        before = self._GetStateCopy()
+        in_thread = self.sub_command_backend == sub_command_pool.THREAD
+        if in_thread:
+            self._thread_state.state = self._GetStateCopy()
+        else:
+            # The records of the forked process are returned to the parent.
+            self.flash_stats = flash_stats.FlashStats()
+            tracer.Clear()
+            metrics.GetRegistry().Clear()
+        self._thread_state.exception = None
+        start_time = time.time()
+        try:
+            result.return_value = self.onecmd(sub_command, depth=2)
+            result.exception = self._thread_state.exception
+            result.state_changes = sub_command_pool.DiffState(
+                before, self._GetStateCopy())
+        except Exception as e:
+            result.return_value = False
+            result.exception = "%s: %s" % (type(e).__name__, e)
+        finally:
+            if in_thread:
+                self._thread_state.state = None
+            else:
+                result.flash_records = self.flash_stats.GetRecords()
+                result.spans = tracer.GetEvents()
+                result.metrics_snapshot = metrics.GetRegistry().Snapshot()
+        result.elapsed_secs = time.time() - start_time
+        return result
+
+    def _RunParallelCommand(self, sub_commands):
+        """Executes sub-command lists in parallel and merges their states.
+
+        Args:
+            sub_commands: list of strings or lists, the sub-command lists.
+
+        Returns:
+            False if any sub-command list fails; None otherwise.
+        """
+        # The threads are part of the caller's background job. The output
+        # of the processes cannot be kept in the job, so they print it.
+        in_thread = self.sub_command_backend == sub_command_pool.THREAD
+        job = job_table.GetCurrentJob() if in_thread else None
+
+        def RunSubCommand(index, sub_command):
+            with job_table.AttachJob(job):
+                return self._RunSubCommand(index, sub_command)
+
+        if in_thread:
+            if self._thread_pool is None:
+                self._thread_pool = sub_command_pool.ThreadPool()
+            results = self._thread_pool.Map(RunSubCommand, sub_commands)
+        else:
+            results = sub_command_pool.MapInProcesses(RunSubCommand,
+                                                      sub_commands)
+
+        for index, result in enumerate(results):
+            if result is None:
+                result = sub_command_pool.SubCommandResult(
+                    index, sub_commands[index])
+                result.return_value = False
+                result.exception = "Exited without result."
+                results[index] = result
+            sub_command_pool.ApplyStateChanges(self._state,
+                                               result.state_changes)
+            self.flash_stats.AddRecords(result.flash_records)
+            tracer.AddEvents(result.spans, tracer.GetJobId())
+            metrics.GetRegistry().Merge(result.metrics_snapshot)
+        self.sub_command_results = results
+
+        rows = [_FormattedSubCommandResult(result) for result in results]
+        self._PrintObjects(rows, ("index", "success", "elapsed_secs",
+                                  "exception", "command"))
+        if not all(result.success for result in results):
+            return False
+
     # @Override
-    def onecmd(self, line, depth=1, ret_out_queue=None):
+    def onecmd(self, line, depth=1):
         """Executes command(s) and prints any exception.
 
         Parallel execution only for 2nd-level list element.
 
         Args:
             line: a list of string or string which keeps the command to run.
+            depth: integer, 1 for the top-level command. The elements of a
+                   top-level list are executed in parallel.
+
+        Returns:
+            False if the command fails; the return value of the command
+            otherwise.
         """
         if not line:
             return
 
         if type(line) == list:
-            if depth == 1:  # 1 to use multi-threading
-                jobs = []
-                ret_queue = multiprocessing.Queue()
-                for sub_command in line:
-                    p = multiprocessing.Process(
-                        target=self.onecmd,
-                        args=(
-                            sub_command,
-                            depth + 1,
-                            ret_queue,
-                        ))
-                    jobs.append(p)
-                    p.start()
-                for job in jobs:
-                    job.join()
-
-                ret_cmd_list = True
-                while not ret_queue.empty():
-                    ret_from_subprocess = ret_queue.get()
-                    ret_cmd_list = ret_cmd_list and ret_from_subprocess
-                if ret_cmd_list == False:
+            if depth == 1:
+                with tracer.Span("parallel", "command"):
+                    return self._RunParallelCommand(line)
+            for sub_command in line:
+                if self.onecmd(sub_command, depth + 1) == False:
                     return False
-            else:
-                for sub_command in line:
-                    ret_cmd_list = self.onecmd(sub_command, depth + 1)
-                    if ret_cmd_list == False and ret_out_queue:
-                        ret_out_queue.put(False)
-                        return False
             return
 
         print("Command: %s" % line)
         try:
-            ret_cmd = cmd.Cmd.onecmd(self, line)
-            if ret_cmd == False and ret_out_queue:
-                ret_out_queue.put(ret_cmd)
-            return ret_cmd
+            job_table.CheckCurrentJob()
+            with tracer.Span(line.strip().split(" ", 1)[0], "command",
+                             line=line):
+                return cmd.Cmd.onecmd(self, line)
         except Exception as e:
             self._Print("%s: %s" % (type(e).__name__, e))
-            if ret_out_queue:
-                ret_out_queue.put(False)
+            self._thread_state.exception = "%s: %s" % (type(e).__name__, e)
             return False
 
     # @Override
@@ -570,6 +1032,18 @@ class Console(cmd.Cmd):
         return cmd.Cmd.default(self, line)
 
 
+class _FormattedSubCommandResult(object):
+    """Formats a SubCommandResult for printing."""
+
+    def __init__(self, result):
+        self.index = result.index
+        self.success = result.success
+        self.elapsed_secs = "%.1f" % result.elapsed_secs
+        self.exception = result.exception or ""
+        self.command = (" ; ".join(result.command) if isinstance(
+            result.command, list) else result.command)
+
+
 def _ToPrintString(obj):
     """Converts an object to printable string on console.
 
@@ -16,6 +16,8 @@
 #
 
 import os
+import threading
+import time
 import unittest
 
 try:
@@ -32,6 +34,11 @@ from host_controller.build import build_flasher
 from host_controller.tfc import command_task
 from host_controller.tfc import device_info
 from host_controller import console
+from host_controller.utils.cmd import command_graph
+from host_controller.utils.cmd import job_table
+from host_controller.utils.cmd import sub_command_pool
+from host_controller.utils.metrics import metrics
+from host_controller.utils.trace import tracer
 
 
 class ConsoleTest(unittest.TestCase):
@@ -243,5 +250,141 @@ class ConsoleTest(unittest.TestCase):
         flasher.WaitForDevice.assert_called_with()
 
 
+    def testParallelCommandWithThreadBackend(self):
+        """Tests that the sub-command states are private and merged."""
+        seen_keys = []
+
+        def SetResult(arg):
+            seen_keys.append(sorted(self._console.test_result))
+            if arg == "error":
+                raise IOError("test")
+            self._console.test_result[arg] = True
+
+        self._console.do_set_result = SetResult
+        self._console.sub_command_backend = sub_command_pool.THREAD
+        self._console.test_result["old"] = True
+        ret = self._console.onecmd([["set_result a"], ["set_result b"]])
+        self.assertIsNone(ret)
+        self.assertEqual([["old"], ["old"]], seen_keys)
+        self.assertEqual({"old": True, "a": True, "b": True},
+                         self._console.test_result)
+
+        ret = self._console.onecmd([["set_result c"], ["set_result error"]])
+        self.assertFalse(ret)
+        results = self._console.sub_command_results
+        self.assertEqual([True, False], [r.success for r in results])
+        self.assertEqual("IOError: test", results[1].exception)
+        self.assertTrue(self._console.test_result["c"])
+
+    def testParallelCommandWithProcessBackend(self):
+        """Tests that the records of the sub-command processes are merged."""
+
+        def RecordFlash(serial):
+            self._console.flash_stats.AddRecord(serial, "flash", "system",
+                                                100, 0, 1, True)
+            metrics.FLASH_STEP_SECONDS.Observe(1, serial=serial,
+                                               step="console_test")
+
+        self._console.do_record_flash = RecordFlash
+        self._console.sub_command_backend = sub_command_pool.PROCESS
+        ret = self._console.onecmd([["record_flash ABC001"],
+                                    ["record_flash ABC002"]])
+        self.assertIsNone(ret)
+        self.assertEqual(["ABC001", "ABC002"], sorted(
+            record.serial
+            for record in self._console.flash_stats.GetRecords()))
+        child_spans = [event for event in tracer.GetEvents()
+                       if event[0] == "record_flash"]
+        self.assertEqual(2, len(child_spans))
+        self.assertTrue(all(event[4] != os.getpid() for event in child_spans))
+        snapshot = metrics.GetRegistry().Snapshot()
+        for serial in ("ABC001", "ABC002"):
+            self.assertEqual(1, snapshot[("host_controller_flash_step_seconds",
+                                          (serial, "console_test"))][-1])
+
+    def testProcessCommandsWithGraph(self):
+        """Tests that the fetch nodes run one at a time on private states."""
+        lock = threading.Lock()
+        running = []
+        max_running = []
+        seen_images = []
+
+        def Fetch(arg):
+            with lock:
+                running.append(arg)
+                max_running.append(len(running))
+            seen_images.append(sorted(self._console.device_image_info))
+            time.sleep(0.1)
+            self._console.device_image_info[arg.split()[-1]] = arg
+            with lock:
+                running.remove(arg)
+
+        def SetResult(arg):
+            self._console.test_result[arg] = True
+
+        self._console.do_fetch = Fetch
+        self._console.do_set_result = SetResult
+        ret = self._console._ProcessCommands([
+            command_graph.Node("fetch --type=pab a.img"),
+            command_graph.Node("fetch --type=gcs b.img"),
+            command_graph.Node("set_result c"),
+        ])
+        self.assertTrue(ret)
+        self.assertEqual([1, 1], max_running)
+        self.assertEqual([[], ["a.img"]], seen_images)
+        self.assertEqual(["a.img", "b.img"],
+                         sorted(self._console.device_image_info))
+        self.assertTrue(self._console.test_result["c"])
+
+    def testBackgroundJobs(self):
+        """Tests the bg, wait and kill commands."""
+        release = threading.Event()
+
+        def Block(arg):
+            print("output %s" % arg)
+            release.wait(10)
+            if arg == "fail":
+                return False
+
+        def Chain(arg):
+            return self._console.onecmd(["block %s" % arg, "block end"],
+                                        depth=2)
+
+        self._console.do_block = Block
+        self._console.do_chain = Chain
+        self._console.onecmd("bg block a")
+        self._console.onecmd("bg block fail")
+        jobs = self._console.jobs.GetJobs()
+        self.assertEqual(["block a", "block fail"],
+                         [job.command for job in jobs])
+        self.assertFalse(self._console.onecmd("wait 1 --timeout 0.1"))
+        self.assertFalse(jobs[0].finished)
+
+        release.set()
+        self.assertIsNone(self._console.onecmd("wait 1"))
+        self.assertFalse(self._console.onecmd("wait"))
+        self.assertEqual([job_table.DONE, job_table.FAILED],
+                         [job.state for job in jobs])
+        self.assertIn("output a", jobs[0].GetOutput())
+
+        release.clear()
+        self._console.onecmd("bg chain b")
+        self._console.onecmd("kill 3")
+        release.set()
+        self.assertFalse(self._console.onecmd("wait 3"))
+        job = self._console.jobs.GetJob(3)
+        self.assertEqual(job_table.KILLED, job.state)
+        self.assertNotIn("output end", job.GetOutput())
+        self.assertFalse(self._console.onecmd("kill 4"))
+
+        self._console.onecmd("bg wait --timeout 10")
+        job = self._console.jobs.GetJob(4)
+        self.assertTrue(job.Wait(5))
+        self.assertFalse(self._console.onecmd("bg wait 5"))
+        self.assertTrue(self._console.jobs.GetJob(5).Wait(5))
+        self.assertEqual(job_table.FAILED,
+                         self._console.jobs.GetJob(5).state)
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -18,6 +18,7 @@
 import argparse
 import json
 import logging
+import os
 import socket
 import time
 import threading
@@ -25,10 +26,10 @@ import sys
 
 from host_controller import console
 from host_controller import tfc_host_controller
-from host_controller.build import build_provider_pab
 from host_controller.tfc import tfc_client
 from host_controller.vti_interface import vti_endpoint_client
 from host_controller.tradefed import remote_client
+from host_controller.utils.cmd import sub_command_pool
 from vts.utils.python.os import env_utils
 
 _ANDROID_BUILD_TOP = "ANDROID_BUILD_TOP"
@@ -125,6 +126,32 @@ def main():
     parser.add_argument("--console", action="store_true",
                         help="Whether to start a console after processing "
                              "a script.")
+    parser.add_argument("--sub-command-backend",
+                        default=sub_command_pool.PROCESS,
+                        choices=sub_command_pool.BACKENDS,
+                        help="How the sub-command lists of a parallel "
+                             "command are executed in the console and the "
+                             "leased jobs. 'thread' reuses a pool "
+                             "of threads and merges the console state of "
+                             "the sub-commands; 'process' forks a process "
+                             "per list.")
+    parser.add_argument("--metrics-port",
+                        default=None,
+                        type=int,
+                        help="The port of the HTTP endpoint serving the "
+                             "metrics in the Prometheus text format at "
+                             "/metrics. Disabled if unspecified.")
+    parser.add_argument("--metrics-address",
+                        default="localhost",
+                        help="The address which the metrics endpoint "
+                             "listens to. Set to 0.0.0.0 to be scraped "
+                             "from other hosts.")
+    parser.add_argument("--state-file",
+                        default=None,
+                        help="The file where the console state and the "
+                             "fetched artifacts are saved on exit and "
+                             "loaded on start, so that a restarted host "
+                             "controller needn't refetch them.")
     args = parser.parse_args()
     if args.config_file:
         config_json = json.load(args.config_file)
@@ -161,8 +188,6 @@ def main():
             print("WARN: If --use_tfc is set, --config_file argument value "
                   "must be provided. Starting without TFC.")
 
-    pab = build_provider_pab.BuildProviderPAB()
-
     hosts = []
     for host_config in config_json["hosts"]:
         cluster_ids = host_config["cluster_ids"]
@@ -185,9 +210,19 @@ def main():
         while True:
             sys.stdin.readline()
     else:
-        main_console = console.Console(vti_endpoint, tfc, pab, hosts,
+        main_console = console.Console(vti_endpoint, tfc, None, hosts,
                                        vti_address=args.vti)
+        main_console.sub_command_backend = args.sub_command_backend
         main_console.StartJobThreadAndProcessPool()
+        if args.metrics_port is not None:
+            server = main_console.StartMetricsServer(args.metrics_address,
+                                                     args.metrics_port)
+            print("Metrics: http://%s:%d/metrics" %
+                  (args.metrics_address, server.port))
+        if args.state_file and os.path.exists(args.state_file):
+            dropped = main_console.LoadState(args.state_file)
+            if dropped:
+                print("Dropped stale state: %s" % ", ".join(dropped))
         try:
             if args.serial:
                 main_console.SetSerials(args.serial.split(","))
@@ -202,6 +237,8 @@ def main():
             else:  # if not script, the default is console mode.
                 main_console.cmdloop()
         finally:
+            if args.state_file:
+                main_console.SaveState(args.state_file)
             main_console.TearDown()
 
     env_utils.RestoreEnvVars(env_vars)
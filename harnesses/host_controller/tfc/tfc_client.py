@@ -24,6 +24,7 @@ from googleapiclient import http
 from oauth2client.service_account import ServiceAccountCredentials
 
 from host_controller.tfc import command_task
+from host_controller.utils.metrics import metrics
 
 API_NAME = "tradefed_cluster"
 API_VERSION = "v1"
@@ -40,6 +41,7 @@ class TfcClient(object):
     def __init__(self, service):
         self._service = service
 
+    @metrics.TimedRequest("tfc")
     def LeaseHostTasks(self, cluster_id, next_cluster_ids, hostname, device_infos):
         """Calls leasehosttasks.
 
@@ -66,6 +68,7 @@ class TfcClient(object):
             return []
         return [command_task.CommandTask(**task) for task in tasks["tasks"]]
 
+    @metrics.TimedRequest("tfc")
     def TestResourceList(self, request_id):
         """Calls testResource.list.
 
@@ -103,6 +106,7 @@ class TfcClient(object):
                "device_infos": [x.ToDeviceSnapshotJson() for x in dev_infos]}
         return obj
 
+    @metrics.TimedRequest("tfc")
     def SubmitHostEvents(self, host_events):
         """Calls host_events.submit.
 
@@ -114,6 +118,7 @@ class TfcClient(object):
         logging.info("host_events.submit body=%s", json_obj)
         self._service.host_events().submit(body=json_obj).execute()
 
+    @metrics.TimedRequest("tfc")
     def SubmitCommandEvents(self, command_events):
         """Calls command_events.submit.
 
@@ -124,6 +129,7 @@ class TfcClient(object):
         logging.info("command_events.submit body=%s", json_obj)
         self._service.command_events().submit(body=json_obj).execute()
 
+    @metrics.TimedRequest("tfc")
     def NewRequest(self, request):
         """Calls requests.new.
 
@@ -0,0 +1,172 @@
+#
+# Copyright (C) 2018 The Android Open Source Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""Module to distribute test modules to devices from a shared queue."""
+
+import collections
+import logging
+import threading
+import time
+
+
+class ModuleRun(object):
+    """The result of running one module on one device.
+
+    Attributes:
+        module: string, the module name.
+        serial: string, the device serial.
+        return_code: integer, the return code of the run. None if the run
+                     raised an exception.
+        duration_secs: float, the duration of the run.
+    """
+
+    def __init__(self, module, serial, return_code, duration_secs):
+        self.module = module
+        self.serial = serial
+        self.return_code = return_code
+        self.duration_secs = duration_secs
+
+
+class ModuleScheduler(object):
+    """Runs modules on whichever device becomes idle first.
+
+    Each device has a thread which takes the next module from the queue
+    when its previous run finishes, so a slow device runs fewer modules
+    instead of holding up the job. If a run raises an exception, the module
+    is put back into the queue for the other devices and the device stops
+    taking modules. An idle device waits while other devices are running
+    modules, as the modules may be put back into the queue.
+
+    Attributes:
+        _serials: list of strings, the device serials.
+        _run_module: the function which runs a module. It takes the serial,
+                     the module name, and the index of the run, and returns
+                     the return code.
+        _queue: collections.deque of strings, the modules to run.
+        _condition: threading.Condition, protects the other attributes and
+                    notifies the idle devices of the changes to _queue and
+                    _running_devices.
+        _runs: list of ModuleRun, the finished runs.
+        _active_devices: integer, the number of devices taking modules.
+        _running_devices: integer, the number of devices running modules.
+        _next_index: integer, the index of the next run.
+    """
+
+    def __init__(self, serials, modules, run_module):
+        """Initializes the scheduler.
+
+        Args:
+            serials: list of strings, the device serials.
+            modules: list of strings, the modules in the order to run.
+            run_module: the function which runs a module.
+        """
+        self._serials = list(serials)
+        self._run_module = run_module
+        self._queue = collections.deque(modules)
+        self._condition = threading.Condition()
+        self._runs = []
+        self._active_devices = 0
+        self._running_devices = 0
+        self._next_index = 0
+
+    def _GetNextModule(self):
+        """Waits for the next module to run.
+
+        Returns:
+            A tuple of (module name, index of the run). None if the queue is
+            empty and no device is running a module.
+        """
+        with self._condition:
+            while not self._queue:
+                if self._running_devices == 0:
+                    return None
+                self._condition.wait()
+            module = self._queue.popleft()
+            index = self._next_index
+            self._next_index += 1
+            self._running_devices += 1
+            return module, index
+
+    def _DeviceLoop(self, serial):
+        """Runs modules on a device until all modules are finished.
+
+        Args:
+            serial: string, the device serial.
+        """
+        while True:
+            next_module = self._GetNextModule()
+            if next_module is None:
+                break
+            module, index = next_module
+            logging.info("Running %s on %s", module, serial)
+            start_time = time.time()
+            try:
+                return_code = self._run_module(serial, module, index)
+            except Exception as e:
+                logging.exception("%s failed to run %s: %s", serial, module,
+                                  e)
+                with self._condition:
+                    self._active_devices -= 1
+                    if self._active_devices > 0:
+                        self._queue.append(module)
+                        self._FinishRun()
+                        return
+                self._AddRun(module, serial, None, time.time() - start_time)
+                return
+            self._AddRun(module, serial, return_code,
+                         time.time() - start_time)
+        with self._condition:
+            self._active_devices -= 1
+
+    def _FinishRun(self):
+        """Wakes up the idle devices after a device finishes a module.
+
+        The caller must hold _condition.
+        """
+        self._running_devices -= 1
+        self._condition.notify_all()
+
+    def _AddRun(self, module, serial, return_code, duration_secs):
+        """Records a finished run."""
+        run = ModuleRun(module, serial, return_code, duration_secs)
+        logging.info("%s finished on %s in %.1f seconds, return code: %s",
+                     module, serial, duration_secs, return_code)
+        with self._condition:
+            self._runs.append(run)
+            self._FinishRun()
+
+    def Run(self):
+        """Runs all modules and waits for the devices.
+
+        Returns:
+            A list of ModuleRun in the order of completion. The modules
+            left in the queue because all devices failed are returned with
+            return_code and duration_secs set to None.
+        """
+        self._active_devices = len(self._serials)
+        threads = []
+        for serial in self._serials:
+            thread = threading.Thread(target=self._DeviceLoop,
+                                      args=(serial, ))
+            thread.daemon = True
+            thread.start()
+            threads.append(thread)
+        for thread in threads:
+            thread.join()
+
+        runs = list(self._runs)
+        runs.extend(ModuleRun(module, None, None, None)
+                    for module in self._queue)
+        return runs
@@ -0,0 +1,93 @@
+#!/usr/bin/env python
+#
+# Copyright (C) 2018 The Android Open Source Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import threading
+import time
+import unittest
+
+from host_controller.tradefed import module_scheduler
+
+
+class ModuleSchedulerTest(unittest.TestCase):
+    """Tests for ModuleScheduler."""
+
+    def testRun(self):
+        """Tests that a slow device runs fewer modules."""
+
+        def RunModule(serial, module, index):
+            time.sleep(0.3 if serial == "slow" else 0.01)
+            return 0
+
+        scheduler = module_scheduler.ModuleScheduler(
+            ["slow", "fast"], ["m%d" % x for x in range(10)], RunModule)
+        runs = scheduler.Run()
+        self.assertEqual(set("m%d" % x for x in range(10)),
+                         set(run.module for run in runs))
+        self.assertEqual(1, len([run for run in runs if run.serial == "slow"]))
+        self.assertTrue(all(run.return_code == 0 for run in runs))
+
+    def testRunDeviceFailure(self):
+        """Tests that the module of a broken device is run by another."""
+        def RunModule(serial, module, index):
+            if serial == "broken":
+                raise IOError("device offline")
+            time.sleep(0.2)
+            return 1 if module == "bad" else 0
+
+        scheduler = module_scheduler.ModuleScheduler(
+            ["good", "broken"], ["bad", "ok"], RunModule)
+        runs = scheduler.Run()
+        self.assertEqual({"bad": 1, "ok": 0},
+                         dict((run.module, run.return_code) for run in runs))
+        self.assertTrue(all(run.serial == "good" for run in runs))
+
+    def testRunDeviceFailureAfterQueueEmpty(self):
+        """Tests that an idle device runs a module put back after it waits."""
+        finished_quick = threading.Event()
+
+        def RunModule(serial, module, index):
+            if serial == "broken":
+                finished_quick.wait(5)
+                # Lets the good device find the queue empty.
+                time.sleep(0.1)
+                raise IOError("device offline")
+            if module == "quick":
+                finished_quick.set()
+            return 0
+
+        scheduler = module_scheduler.ModuleScheduler(
+            ["broken", "good"], ["slow", "quick"], RunModule)
+        runs = scheduler.Run()
+        self.assertEqual({"slow": ("good", 0), "quick": ("good", 0)},
+                         dict((run.module, (run.serial, run.return_code))
+                              for run in runs))
+
+    def testRunAllDevicesFail(self):
+        """Tests that the modules are reported when no device can run."""
+
+        def RunModule(serial, module, index):
+            raise IOError("device offline")
+
+        scheduler = module_scheduler.ModuleScheduler(["a"], ["m1", "m2"],
+                                                     RunModule)
+        runs = scheduler.Run()
+        self.assertEqual(["m1", "m2"], [run.module for run in runs])
+        self.assertEqual([None, None], [run.return_code for run in runs])
+
+
+if __name__ == "__main__":
+    unittest.main()
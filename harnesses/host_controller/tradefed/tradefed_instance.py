@@ -0,0 +1,222 @@
+#
+# Copyright (C) 2018 The Android Open Source Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""Module to keep vts-tradefed running and submit commands to it."""
+
+import logging
+import os
+import shutil
+import socket
+import subprocess
+import tempfile
+import threading
+import time
+
+from host_controller.tradefed import remote_client
+from host_controller.tradefed import remote_operation
+
+# The global configuration which starts the remote manager on a given port.
+_GLOBAL_CONFIG_TEMPLATE = """<?xml version="1.0" encoding="utf-8"?>
+<configuration description="Host controller global configuration">
+    <remote_manager class="com.android.tradefed.command.remote.RemoteManager">
+        <option name="start-remote-mgr-on-boot" value="true" />
+        <option name="remote-mgr-port" value="%d" />
+    </remote_manager>
+</configuration>
+"""
+
+# The environment variable pointing TradeFed to the global configuration.
+_GLOBAL_CONFIG_ENV = "TF_GLOBAL_CONFIG"
+
+# The time to wait for the remote manager to accept connections.
+_START_TIMEOUT_SECS = 300
+
+# The time to wait for the console to exit before killing it.
+_STOP_TIMEOUT_SECS = 30
+
+# The interval between the attempts to connect to the remote manager.
+_POLL_INTERVAL_SECS = 1
+
+# The maximum time to wait for a test command.
+DEFAULT_COMMAND_TIMEOUT_SECS = 24 * 60 * 60
+
+
+def _GetFreePort():
+    """Returns a TCP port which is not in use on localhost."""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    try:
+        sock.bind((remote_client.LOCALHOST, 0))
+        return sock.getsockname()[1]
+    finally:
+        sock.close()
+
+
+class TradefedInstance(object):
+    """A long-lived vts-tradefed console controlled by the remote manager.
+
+    The console is started once and keeps its JVM, configurations and
+    device monitor, so a command starts without the start-up cost of
+    "run commandAndExit".
+
+    Attributes:
+        bin_path: string, the path to vts-tradefed.
+        port: integer, the port of the remote manager.
+        _work_dir: string, the directory of the global configuration and
+                   the console output.
+        _proc: subprocess.Popen object, the console process.
+        _client: remote_client.RemoteClient connected to the console.
+    """
+
+    def __init__(self, bin_path, port=None):
+        self.bin_path = bin_path
+        self.port = port
+        self._work_dir = None
+        self._proc = None
+        self._client = None
+
+    def IsRunning(self):
+        """Returns whether the console process is alive."""
+        return self._proc is not None and self._proc.poll() is None
+
+    def Start(self, timeout_secs=_START_TIMEOUT_SECS):
+        """Starts the console and waits for the remote manager.
+
+        Args:
+            timeout_secs: float, the time to wait for the remote manager.
+
+        Raises:
+            remote_operation.RemoteOperationException if the remote manager
+            doesn't start.
+        """
+        if self.port is None:
+            self.port = _GetFreePort()
+        self._work_dir = tempfile.mkdtemp(prefix="vts_hc_tradefed_")
+        config_path = os.path.join(self._work_dir, "global_config.xml")
+        with open(config_path, "w") as config_file:
+            config_file.write(_GLOBAL_CONFIG_TEMPLATE % self.port)
+
+        env = dict(os.environ)
+        env[_GLOBAL_CONFIG_ENV] = config_path
+        with open(os.path.join(self._work_dir, "console.log"),
+                  "w") as log_file:
+            # stdin is kept open because the console exits at EOF.
+            self._proc = subprocess.Popen(
+                [self.bin_path],
+                stdin=subprocess.PIPE,
+                stdout=log_file,
+                stderr=subprocess.STDOUT,
+                env=env)
+        logging.info("Started %s (pid %d) with remote manager port %d",
+                     self.bin_path, self._proc.pid, self.port)
+
+        self._client = remote_client.RemoteClient(port=self.port)
+        deadline = time.time() + timeout_secs
+        while True:
+            if not self.IsRunning():
+                raise remote_operation.RemoteOperationException(
+                    "vts-tradefed exited with %s. See %s" %
+                    (self._proc.returncode, self._work_dir))
+            try:
+                self._client.ListDevices()
+                return
+            except (socket.error,
+                    remote_operation.RemoteOperationException) as e:
+                if time.time() > deadline:
+                    self.Stop()
+                    raise remote_operation.RemoteOperationException(
+                        "Remote manager is not ready: %s" % e)
+            time.sleep(_POLL_INTERVAL_SECS)
+
+    def ExecuteCommand(self, serial, command_args,
+                       timeout_secs=DEFAULT_COMMAND_TIMEOUT_SECS):
+        """Runs a command on a device and waits for the result.
+
+        Args:
+            serial: string, the device serial.
+            command_args: list of strings, the command and its arguments,
+                          e.g., ["vts", "-m", "VtsKernelLtp"].
+            timeout_secs: float, the time to wait for the command.
+
+        Returns:
+            A JSON object, the result from the remote manager. None if
+            timeout.
+
+        Raises:
+            socket.error if fails to communicate with remote manager.
+            remote_operation.RemoteOperationException if any operation fails.
+        """
+        self._client.SendOperation(remote_operation.AllocateDevice(serial))
+        try:
+            self._client.SendOperation(
+                remote_operation.ExecuteCommand(serial, *command_args))
+            return self._client.WaitForCommandResult(serial, timeout_secs)
+        finally:
+            try:
+                self._client.SendOperation(
+                    remote_operation.FreeDevice(serial))
+            except (socket.error,
+                    remote_operation.RemoteOperationException) as e:
+                logging.error("Failed to free %s: %s", serial, e)
+
+    def Stop(self):
+        """Exits the console and deletes its working directory."""
+        if self.IsRunning():
+            try:
+                self._proc.stdin.write("exit\n")
+                self._proc.stdin.close()
+            except IOError as e:
+                logging.warning("Cannot write to vts-tradefed: %s", e)
+            deadline = time.time() + _STOP_TIMEOUT_SECS
+            while self.IsRunning() and time.time() < deadline:
+                time.sleep(_POLL_INTERVAL_SECS)
+            if self.IsRunning():
+                logging.warning("Killing vts-tradefed (pid %d)",
+                                self._proc.pid)
+                self._proc.kill()
+                self._proc.wait()
+        self._proc = None
+        if self._work_dir:
+            shutil.rmtree(self._work_dir, ignore_errors=True)
+            self._work_dir = None
+
+
+_instances = {}
+_instances_lock = threading.Lock()
+
+
+def GetInstance(bin_path):
+    """Returns the running instance of a test suite, starting one if needed.
+
+    Args:
+        bin_path: string, the path to vts-tradefed.
+
+    Returns:
+        A TradefedInstance object.
+    """
+    with _instances_lock:
+        instance = _instances.get(bin_path)
+        if instance is None or not instance.IsRunning():
+            instance = TradefedInstance(bin_path)
+            instance.Start()
+            _instances[bin_path] = instance
+        return instance
+
+
+def StopAll():
+    """Stops all instances started by GetInstance."""
+    with _instances_lock:
+        for instance in _instances.values():
+            instance.Stop()
+        _instances.clear()
@@ -0,0 +1,96 @@
+#!/usr/bin/env python
+#
+# Copyright (C) 2018 The Android Open Source Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import os
+import shutil
+import socket
+import tempfile
+import unittest
+
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+
+from host_controller.tradefed import remote_operation
+from host_controller.tradefed import tradefed_instance
+
+
+class TradefedInstanceTest(unittest.TestCase):
+    """A test for tradefed_instance.TradefedInstance.
+
+    Attributes:
+        _instance: The TradefedInstance being tested.
+        _remote_client: A mock remote_client.RemoteClient.
+    """
+
+    def setUp(self):
+        """Creates the instance with a mock client."""
+        self._instance = tradefed_instance.TradefedInstance("vts-tradefed")
+        self._remote_client = mock.Mock()
+        self._instance._client = self._remote_client
+
+    def _GetOperationTypes(self):
+        """Gets the types of the operations sent by the mock RemoteClient.
+
+        Returns:
+            A list of strings, the operation types.
+        """
+        return [args[0].type for args, kwargs in
+                self._remote_client.SendOperation.call_args_list]
+
+    def testExecuteCommand(self):
+        """Tests allocating, executing and freeing a device."""
+        self._remote_client.WaitForCommandResult.return_value = {
+            "status": "INVOCATION_SUCCESS"}
+        result = self._instance.ExecuteCommand("serial123",
+                                               ["vts", "-m", "Sample"])
+        self.assertEqual("INVOCATION_SUCCESS", result["status"])
+        self.assertEqual(["ALLOCATE_DEVICE", "EXEC_COMMAND", "FREE_DEVICE"],
+                         self._GetOperationTypes())
+
+    def testExecuteCommandError(self):
+        """Tests that the device is freed when the command fails."""
+        self._remote_client.SendOperation.side_effect = [
+            None, socket.error("closed"), None]
+        with self.assertRaises(socket.error):
+            self._instance.ExecuteCommand("serial123", ["vts"])
+        self.assertEqual(["ALLOCATE_DEVICE", "EXEC_COMMAND", "FREE_DEVICE"],
+                         self._GetOperationTypes())
+
+    def testStartExited(self):
+        """Tests starting a console which exits immediately."""
+        temp_dir = tempfile.mkdtemp()
+        try:
+            bin_path = os.path.join(temp_dir, "vts-tradefed")
+            with open(bin_path, "w") as bin_file:
+                bin_file.write("#!/bin/sh\n"
+                               "grep -q start-remote-mgr-on-boot "
+                               "\"$TF_GLOBAL_CONFIG\" && exit 3\n")
+            os.chmod(bin_path, 0755)
+            instance = tradefed_instance.TradefedInstance(bin_path)
+            with self.assertRaises(
+                    remote_operation.RemoteOperationException) as context:
+                instance.Start(timeout_secs=10)
+            self.assertIn("exited with 3", str(context.exception))
+            instance.Stop()
+        finally:
+            shutil.rmtree(temp_dir)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,454 @@
+#
+# Copyright (C) 2018 The Android Open Source Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""Module to execute adb, fastboot and shell commands with deadlines."""
+
+import collections
+import errno
+import logging
+import os
+import signal
+import subprocess
+import threading
+import time
+
+# The default deadline of a shell command.
+DEFAULT_TIMEOUT_SECS = 600
+
+# The return code of a command killed by the watchdog.
+TIMEOUT_RETURN_CODE = -signal.SIGKILL
+
+_PROC_DIR = "/proc"
+
+
+class CommandTimeoutError(Exception):
+    """Raised when a command is killed because it passes its deadline."""
+    pass
+
+
+class CommandKilledError(Exception):
+    """Raised when a command is killed with the job which started it."""
+    pass
+
+
+class HungCommandRecord(object):
+    """The hung commands of a device.
+
+    Attributes:
+        serial: string, the device serial. Empty if the commands are not
+                specific to a device.
+        commands: integer, the number of commands executed.
+        timeouts: integer, the number of commands killed.
+        hung_secs: float, the time spent in the killed commands.
+        last_command: string, the last killed command.
+        last_time: float, the time when the last command was killed.
+    """
+
+    def __init__(self, serial):
+        self.serial = serial
+        self.commands = 0
+        self.timeouts = 0
+        self.hung_secs = 0.0
+        self.last_command = ""
+        self.last_time = 0.0
+
+
+class HungCommandStats(object):
+    """Thread-safe statistics of the commands killed by the watchdog.
+
+    Attributes:
+        _lock: threading.Lock, protects _records.
+        _records: dict of {serial: HungCommandRecord}.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._records = {}
+
+    def _GetRecord(self, serial):
+        """Returns the record of a device. Must be called with _lock."""
+        serial = serial or ""
+        if serial not in self._records:
+            self._records[serial] = HungCommandRecord(serial)
+        return self._records[serial]
+
+    def AddCommand(self, serial):
+        """Counts an executed command.
+
+        Args:
+            serial: string, the device serial.
+        """
+        with self._lock:
+            self._GetRecord(serial).commands += 1
+
+    def AddTimeout(self, serial, command, hung_secs):
+        """Counts a killed command.
+
+        Args:
+            serial: string, the device serial.
+            command: string, the command or the name of the operation.
+            hung_secs: float, the time between the start and the kill.
+        """
+        with self._lock:
+            record = self._GetRecord(serial)
+            record.timeouts += 1
+            record.hung_secs += hung_secs
+            record.last_command = command
+            record.last_time = time.time()
+
+    def GetRecords(self):
+        """Returns copies of the records sorted by serial.
+
+        Returns:
+            A list of HungCommandRecord.
+        """
+        records = []
+        with self._lock:
+            for serial in sorted(self._records):
+                copy = HungCommandRecord(serial)
+                copy.__dict__.update(self._records[serial].__dict__)
+                records.append(copy)
+        return records
+
+
+_stats = HungCommandStats()
+
+
+def GetStats():
+    """Returns the HungCommandStats of this process."""
+    return _stats
+
+
+# The ProcessGroupTracker of the current thread.
+_thread_local = threading.local()
+
+
+class ProcessGroupTracker(object):
+    """Records the shell commands started by a thread so they can be killed.
+
+    Attributes:
+        _lock: threading.Lock, protects _pids, _kill_funcs and _killed.
+        _pids: set of integers, the process groups of the running commands.
+        _kill_funcs: set of functions which kill the commands started
+                     indirectly, e.g., by Deadline blocks.
+        _killed: boolean, whether KillAll has been called.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pids = set()
+        self._kill_funcs = set()
+        self._killed = False
+
+    def Add(self, pid):
+        """Records a process group. It is killed at once after KillAll."""
+        with self._lock:
+            self._pids.add(pid)
+            killed = self._killed
+        if killed:
+            _KillProcessGroup(pid)
+
+    def Remove(self, pid):
+        """Forgets a process group which has exited."""
+        with self._lock:
+            self._pids.discard(pid)
+
+    def AddKillFunc(self, func):
+        """Records a function called by KillAll. It is called at once after
+        KillAll."""
+        with self._lock:
+            self._kill_funcs.add(func)
+            killed = self._killed
+        if killed:
+            func()
+
+    def RemoveKillFunc(self, func):
+        """Forgets a function recorded by AddKillFunc."""
+        with self._lock:
+            self._kill_funcs.discard(func)
+
+    def KillAll(self):
+        """Kills the recorded and the following process groups."""
+        with self._lock:
+            self._killed = True
+            pids = list(self._pids)
+            kill_funcs = list(self._kill_funcs)
+        for pid in pids:
+            _KillProcessGroup(pid)
+        for func in kill_funcs:
+            func()
+
+
+def SetProcessGroupTracker(tracker):
+    """Sets the ProcessGroupTracker of the current thread.
+
+    Args:
+        tracker: ProcessGroupTracker, or None to stop tracking.
+    """
+    _thread_local.tracker = tracker
+
+
+def GetProcessGroupTracker():
+    """Returns the ProcessGroupTracker of the current thread, or None."""
+    return getattr(_thread_local, "tracker", None)
+
+
+class TrackProcessGroup(object):
+    """Context manager which kills a process group with the current job.
+
+    The process should be started with preexec_fn=os.setsid so that its
+    children are in the same group.
+
+    Attributes:
+        _pid: integer, the process group ID.
+        _tracker: the ProcessGroupTracker of the current thread, or None.
+    """
+
+    def __init__(self, pid):
+        self._pid = pid
+        self._tracker = GetProcessGroupTracker()
+
+    def __enter__(self):
+        if self._tracker:
+            self._tracker.Add(self._pid)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self._tracker:
+            self._tracker.Remove(self._pid)
+
+
+def _KillProcessGroup(pid):
+    """Kills a process group.
+
+    Args:
+        pid: integer, the process group ID.
+    """
+    try:
+        os.killpg(pid, signal.SIGKILL)
+    except OSError as e:
+        if e.errno != errno.ESRCH:
+            raise
+
+
+def ExecuteOneShellCommand(cmd, timeout_secs=DEFAULT_TIMEOUT_SECS,
+                           serial=None, env=None):
+    """Executes a shell command in a new process group with a deadline.
+
+    The whole process group is killed when the deadline passes, so the
+    children of the shell, e.g., adb or fastboot, do not outlive it.
+
+    Args:
+        cmd: string, the command to execute.
+        timeout_secs: float, the deadline in seconds. None for no deadline.
+        serial: string, the device serial that the command works on. Used
+                for the statistics.
+        env: dict of strings, the environment variables set for the
+             command in addition to the ones of this process.
+
+    Returns:
+        A tuple of (stdout, stderr, return code). The return code is
+        TIMEOUT_RETURN_CODE if the command is killed.
+    """
+    _stats.AddCommand(serial)
+    proc_env = None
+    if env:
+        proc_env = dict(os.environ)
+        proc_env.update(env)
+    start_time = time.time()
+    proc = subprocess.Popen(
+        cmd,
+        shell=True,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        close_fds=True,
+        preexec_fn=os.setsid,
+        env=proc_env)
+    killed = threading.Event()
+
+    def Kill():
+        killed.set()
+        _KillProcessGroup(proc.pid)
+
+    timer = None
+    if timeout_secs is not None:
+        timer = threading.Timer(timeout_secs, Kill)
+        timer.daemon = True
+        timer.start()
+    try:
+        with TrackProcessGroup(proc.pid):
+            stdout, stderr = proc.communicate()
+    finally:
+        if timer:
+            timer.cancel()
+
+    if killed.is_set():
+        hung_secs = time.time() - start_time
+        _stats.AddTimeout(serial, cmd, hung_secs)
+        logging.error("Killed after %.1f seconds: %s", hung_secs, cmd)
+        return stdout, stderr, TIMEOUT_RETURN_CODE
+    return stdout, stderr, proc.returncode
+
+
+def _ListParentProcessIds():
+    """Lists the processes on the host and their parents.
+
+    Returns:
+        A dict of {pid: parent pid}. Empty if /proc is not available.
+    """
+    parents = {}
+    try:
+        pids = [int(name) for name in os.listdir(_PROC_DIR) if name.isdigit()]
+    except OSError:
+        return parents
+    for pid in pids:
+        try:
+            with open(os.path.join(_PROC_DIR, str(pid), "stat"), "r") as f:
+                stat = f.read()
+        except IOError:
+            continue
+        # The command name in parentheses may contain spaces.
+        fields = stat[stat.rfind(")") + 2:].split()
+        parents[pid] = int(fields[1])
+    return parents
+
+
+def _ReadCommandLine(pid):
+    """Returns the arguments of a process as a list of strings."""
+    try:
+        with open(os.path.join(_PROC_DIR, str(pid), "cmdline"), "r") as f:
+            return f.read().rstrip("\0").split("\0")
+    except IOError:
+        return []
+
+
+def _HasArgument(args, argument):
+    """Returns whether a command line contains an argument.
+
+    The argument of a shell, e.g., "sh -c 'fastboot -s SERIAL reboot'", is
+    split by whitespace so that the words in it match.
+
+    Args:
+        args: list of strings, the command line.
+        argument: string, the argument to find.
+    """
+    return any(arg == argument or argument in arg.split() for arg in args)
+
+
+def KillDescendants(argument):
+    """Kills the descendant processes having an argument.
+
+    Args:
+        argument: string, e.g., a device serial. It matches a whole argument
+                  or a whole word in an argument, so "ABC1" doesn't match
+                  "-s ABC12".
+
+    Returns:
+        A list of integers, the killed process IDs.
+    """
+    parents = _ListParentProcessIds()
+    children = collections.defaultdict(list)
+    for pid, parent_pid in parents.items():
+        children[parent_pid].append(pid)
+
+    killed = []
+    stack = list(children[os.getpid()])
+    while stack:
+        pid = stack.pop()
+        stack.extend(children[pid])
+        if not _HasArgument(_ReadCommandLine(pid), argument):
+            continue
+        try:
+            os.kill(pid, signal.SIGKILL)
+            killed.append(pid)
+        except OSError as e:
+            if e.errno != errno.ESRCH:
+                raise
+    return killed
+
+
+class Deadline(object):
+    """Context manager which kills the device's commands after a deadline.
+
+    It is used for the operations that spawn adb or fastboot indirectly,
+    e.g., through AndroidDevice. When the deadline passes, the descendant
+    processes containing the serial in their command lines are killed so
+    that the blocked call returns, and CommandTimeoutError is raised when
+    the block exits. The processes are also killed when the job of the
+    current thread is killed, and CommandKilledError is raised.
+
+    Attributes:
+        _name: string, the name of the operation.
+        _serial: string, the device serial.
+        _timeout_secs: float, the deadline in seconds. None for no deadline.
+        _start_time: float, the time when the block is entered.
+        _timer: threading.Timer which fires the kill.
+        _expired: threading.Event, set when the deadline passes.
+        _killed: threading.Event, set when the job is killed.
+        _tracker: the ProcessGroupTracker of the thread entering the block.
+    """
+
+    def __init__(self, timeout_secs, serial, name):
+        self._name = name
+        self._serial = serial
+        self._timeout_secs = timeout_secs
+        self._start_time = None
+        self._timer = None
+        self._expired = threading.Event()
+        self._killed = threading.Event()
+        self._tracker = None
+
+    def _Expire(self):
+        """Kills the commands of the device."""
+        self._expired.set()
+        killed = KillDescendants(self._serial) if self._serial else []
+        logging.error("%s on %s passed the deadline of %s seconds. "
+                      "Killed processes: %s", self._name, self._serial,
+                      self._timeout_secs, killed)
+
+    def _Kill(self):
+        """Kills the commands of the device when the job is killed."""
+        self._killed.set()
+        killed = KillDescendants(self._serial) if self._serial else []
+        logging.error("%s on %s is killed with its job. Killed processes: "
+                      "%s", self._name, self._serial, killed)
+
+    def __enter__(self):
+        _stats.AddCommand(self._serial)
+        self._start_time = time.time()
+        self._tracker = GetProcessGroupTracker()
+        if self._tracker:
+            self._tracker.AddKillFunc(self._Kill)
+        if self._timeout_secs is not None:
+            self._timer = threading.Timer(self._timeout_secs, self._Expire)
+            self._timer.daemon = True
+            self._timer.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self._timer:
+            self._timer.cancel()
+        if self._tracker:
+            self._tracker.RemoveKillFunc(self._Kill)
+        if self._killed.is_set():
+            raise CommandKilledError("%s on %s was killed with its job." %
+                                     (self._name, self._serial))
+        if not self._expired.is_set():
+            return False
+        hung_secs = time.time() - self._start_time
+        _stats.AddTimeout(self._serial, self._name, hung_secs)
+        raise CommandTimeoutError(
+            "%s on %s was killed after %.1f seconds." %
+            (self._name, self._serial, hung_secs))
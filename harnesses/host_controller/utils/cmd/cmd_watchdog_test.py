@@ -0,0 +1,152 @@
+#!/usr/bin/env python
+#
+# Copyright (C) 2018 The Android Open Source Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import os
+import subprocess
+import threading
+import time
+import unittest
+
+from host_controller.utils.cmd import cmd_watchdog
+
+
+class CmdWatchdogTest(unittest.TestCase):
+    """Tests for cmd_watchdog."""
+
+    def setUp(self):
+        """Resets the statistics of the module."""
+        cmd_watchdog._stats = cmd_watchdog.HungCommandStats()
+
+    def testExecuteOneShellCommand(self):
+        """Tests a command which finishes before the deadline."""
+        stdout, stderr, return_code = cmd_watchdog.ExecuteOneShellCommand(
+            "echo out; echo err >&2; exit 3", 10, "serial1")
+        self.assertEqual("out\n", stdout)
+        self.assertEqual("err\n", stderr)
+        self.assertEqual(3, return_code)
+        records = cmd_watchdog.GetStats().GetRecords()
+        self.assertEqual(1, len(records))
+        self.assertEqual("serial1", records[0].serial)
+        self.assertEqual(1, records[0].commands)
+        self.assertEqual(0, records[0].timeouts)
+
+    def testExecuteOneShellCommandTimeout(self):
+        """Tests that the process group is killed after the deadline."""
+        start_time = time.time()
+        _, _, return_code = cmd_watchdog.ExecuteOneShellCommand(
+            "sleep 30 | cat", 0.5, "serial1")
+        self.assertLess(time.time() - start_time, 10)
+        self.assertEqual(cmd_watchdog.TIMEOUT_RETURN_CODE, return_code)
+        record = cmd_watchdog.GetStats().GetRecords()[0]
+        self.assertEqual(1, record.timeouts)
+        self.assertEqual("sleep 30 | cat", record.last_command)
+        self.assertGreater(record.hung_secs, 0)
+
+    def testProcessGroupTracker(self):
+        """Tests killing the commands of another thread."""
+        tracker = cmd_watchdog.ProcessGroupTracker()
+        results = []
+
+        def Run():
+            cmd_watchdog.SetProcessGroupTracker(tracker)
+            results.append(
+                cmd_watchdog.ExecuteOneShellCommand("sleep 30 | cat", 60))
+            results.append(
+                cmd_watchdog.ExecuteOneShellCommand("sleep 30", 60))
+
+        start_time = time.time()
+        thread = threading.Thread(target=Run)
+        thread.start()
+        time.sleep(0.5)
+        tracker.KillAll()
+        thread.join(20)
+        self.assertFalse(thread.is_alive())
+        self.assertLess(time.time() - start_time, 20)
+        self.assertEqual([cmd_watchdog.TIMEOUT_RETURN_CODE] * 2,
+                         [return_code for _, _, return_code in results])
+
+    def testDeadline(self):
+        """Tests that Deadline kills the processes of the device."""
+        proc = subprocess.Popen(["sh", "-c", "sleep 30; true", "serial2"])
+        with self.assertRaises(cmd_watchdog.CommandTimeoutError):
+            with cmd_watchdog.Deadline(0.5, "serial2", "wait"):
+                proc.wait()
+        self.assertIsNotNone(proc.returncode)
+        record = cmd_watchdog.GetStats().GetRecords()[0]
+        self.assertEqual("serial2", record.serial)
+        self.assertEqual("wait", record.last_command)
+        self.assertEqual(1, record.timeouts)
+
+    def testDeadlineKilledWithJob(self):
+        """Tests that Deadline kills the processes of a killed job."""
+        tracker = cmd_watchdog.ProcessGroupTracker()
+        cmd_watchdog.SetProcessGroupTracker(tracker)
+        proc = subprocess.Popen(["sh", "-c", "sleep 30; true", "serial4"])
+        timer = threading.Timer(0.5, tracker.KillAll)
+        timer.start()
+        try:
+            with self.assertRaises(cmd_watchdog.CommandKilledError):
+                with cmd_watchdog.Deadline(None, "serial4", "wait"):
+                    proc.wait()
+        finally:
+            timer.cancel()
+            cmd_watchdog.SetProcessGroupTracker(None)
+        self.assertIsNotNone(proc.returncode)
+        self.assertEqual(0, cmd_watchdog.GetStats().GetRecords()[0].timeouts)
+
+    def testTrackProcessGroup(self):
+        """Tests killing a process started outside ExecuteOneShellCommand."""
+        tracker = cmd_watchdog.ProcessGroupTracker()
+        cmd_watchdog.SetProcessGroupTracker(tracker)
+        try:
+            proc = subprocess.Popen(["sh", "-c", "sleep 30 | cat"],
+                                    preexec_fn=os.setsid)
+            with cmd_watchdog.TrackProcessGroup(proc.pid):
+                threading.Timer(0.5, tracker.KillAll).start()
+                proc.wait()
+        finally:
+            cmd_watchdog.SetProcessGroupTracker(None)
+        self.assertEqual(cmd_watchdog.TIMEOUT_RETURN_CODE, proc.returncode)
+
+    def testKillDescendantsByWholeArgument(self):
+        """Tests that the serial doesn't match a longer serial."""
+        other = subprocess.Popen(["sh", "-c", "sleep 30; true", "ABC12"])
+        shell = subprocess.Popen(["sh", "-c", "sleep 30; true # -s ABC1"])
+        target = subprocess.Popen(["sh", "-c", "sleep 30; true", "ABC1"])
+        try:
+            killed = cmd_watchdog.KillDescendants("ABC1")
+            self.assertEqual(sorted([shell.pid, target.pid]), sorted(killed))
+            shell.wait()
+            target.wait()
+            self.assertIsNone(other.poll())
+        finally:
+            for proc in (other, shell, target):
+                if proc.poll() is None:
+                    proc.kill()
+                    proc.wait()
+
+    def testDeadlineNotExpired(self):
+        """Tests that Deadline does not affect a fast block."""
+        with cmd_watchdog.Deadline(10, "serial3", "noop"):
+            pass
+        record = cmd_watchdog.GetStats().GetRecords()[0]
+        self.assertEqual(1, record.commands)
+        self.assertEqual(0, record.timeouts)
+
+
+if __name__ == "__main__":
+    unittest.main()
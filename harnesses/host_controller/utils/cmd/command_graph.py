@@ -0,0 +1,191 @@
+#
+# Copyright (C) 2018 The Android Open Source Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""Module to execute script commands by their data dependencies.
+
+A script may emit dicts created by Node in addition to plain commands:
+
+    Node("fetch --type=pab ... --artifact_name=aosp_arm64_ab-img-...",
+         outputs=["device_image_info:system.img"])
+    Node("gsispl --version_from_path=boot.img",
+         inputs=["device_image_info:boot.img", "device_image_info:system.img"],
+         outputs=["device_image_info:system.img"])
+
+The inputs and outputs are arbitrary strings naming the console state that
+a command reads and writes. A node runs after the preceding nodes which
+write its inputs, and after the preceding nodes which read or write its
+outputs. Independent nodes run concurrently. A plain command or command
+list is a barrier, which runs after all preceding commands and before all
+following ones.
+"""
+
+import collections
+import heapq
+import logging
+import Queue
+import threading
+
+# The default maximum number of commands running at once.
+DEFAULT_MAX_WORKERS = 8
+
+
+def Node(command, inputs=(), outputs=()):
+    """Creates a command with declared dependencies.
+
+    Args:
+        command: string, the console command.
+        inputs: list of strings, the state read by the command.
+        outputs: list of strings, the state written by the command.
+
+    Returns:
+        A dict which can be emitted by EmitConsoleCommands.
+    """
+    return {
+        "command": command,
+        "inputs": list(inputs),
+        "outputs": list(outputs),
+    }
+
+
+def IsNode(command):
+    """Returns whether an emitted command is created by Node."""
+    return isinstance(command, dict)
+
+
+class GraphNode(object):
+    """A command in the dependency graph.
+
+    Attributes:
+        index: integer, the position of the command in the script.
+        command: string or list, the console command.
+        deps: set of integers, the indexes of the commands which must
+              complete before this command.
+    """
+
+    def __init__(self, index, command):
+        self.index = index
+        self.command = command
+        self.deps = set()
+
+
+def BuildGraph(commands):
+    """Derives the dependencies of the commands emitted by a script.
+
+    Args:
+        commands: list of strings, lists, or dicts created by Node.
+
+    Returns:
+        A list of GraphNode in the order of the commands.
+    """
+    nodes = []
+    last_writers = {}
+    readers = collections.defaultdict(list)
+    last_barrier = None
+    since_barrier = []
+    for index, command in enumerate(commands):
+        if not IsNode(command):
+            node = GraphNode(index, command)
+            node.deps.update(since_barrier)
+            if last_barrier is not None:
+                node.deps.add(last_barrier)
+            nodes.append(node)
+            # The barrier orders everything after it, so the earlier
+            # readers and writers need not be tracked.
+            last_barrier = index
+            since_barrier = []
+            last_writers.clear()
+            readers.clear()
+            continue
+
+        node = GraphNode(index, command["command"])
+        if last_barrier is not None:
+            node.deps.add(last_barrier)
+        inputs = command.get("inputs", [])
+        outputs = command.get("outputs", [])
+        for key in inputs:
+            if key in last_writers:
+                node.deps.add(last_writers[key])
+        for key in outputs:
+            if key in last_writers:
+                node.deps.add(last_writers[key])
+            node.deps.update(readers[key])
+        node.deps.discard(index)
+        for key in inputs:
+            readers[key].append(index)
+        for key in outputs:
+            last_writers[key] = index
+            readers[key] = []
+        since_barrier.append(index)
+        nodes.append(node)
+    return nodes
+
+
+def RunGraph(nodes, run_command, max_workers=DEFAULT_MAX_WORKERS):
+    """Executes the commands concurrently in the order of dependencies.
+
+    No command is started after a command fails. The running commands are
+    waited for.
+
+    Args:
+        nodes: list of GraphNode returned by BuildGraph.
+        run_command: the function executing a command. It returns False if
+                     the command fails.
+        max_workers: integer, the maximum number of concurrent commands.
+
+    Returns:
+        A tuple of (success, list of the return values). The return value
+        of a command which is not executed is None.
+    """
+    pending = dict((node.index, set(node.deps)) for node in nodes)
+    dependents = collections.defaultdict(list)
+    for node in nodes:
+        for dep in node.deps:
+            dependents[dep].append(node.index)
+    commands = dict((node.index, node.command) for node in nodes)
+    results = dict((node.index, None) for node in nodes)
+
+    ready = [index for index, deps in pending.iteritems() if not deps]
+    heapq.heapify(ready)
+    done_queue = Queue.Queue()
+
+    def Run(index):
+        try:
+            ret = run_command(commands[index])
+        except Exception:
+            logging.exception("Unexpected exception in %s", commands[index])
+            ret = False
+        done_queue.put((index, ret))
+
+    running = 0
+    failed = False
+    while running or (ready and not failed):
+        while ready and not failed and running < max_workers:
+            index = heapq.heappop(ready)
+            thread = threading.Thread(target=Run, args=(index, ))
+            thread.daemon = True
+            thread.start()
+            running += 1
+        index, ret = done_queue.get()
+        running -= 1
+        results[index] = ret
+        if ret == False:
+            failed = True
+            continue
+        for dependent in dependents[index]:
+            pending[dependent].discard(index)
+            if not pending[dependent]:
+                heapq.heappush(ready, dependent)
+
+    return not failed, [results[node.index] for node in nodes]
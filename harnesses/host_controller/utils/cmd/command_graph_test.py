@@ -0,0 +1,93 @@
+#!/usr/bin/env python
+#
+# Copyright (C) 2018 The Android Open Source Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+
+import threading
+import unittest
+
+from host_controller.utils.cmd import command_graph
+
+
+class CommandGraphTest(unittest.TestCase):
+    """Tests for the dependency graph of script commands."""
+
+    def testBuildGraph(self):
+        """Tests the dependencies derived from inputs and outputs."""
+        nodes = command_graph.BuildGraph([
+            "prestage",
+            command_graph.Node("fetch boot", outputs=["boot.img"]),
+            command_graph.Node("fetch system", outputs=["system.img"]),
+            command_graph.Node("fetch vts", outputs=["vts"]),
+            command_graph.Node(
+                "gsispl",
+                inputs=["boot.img", "system.img"],
+                outputs=["system.img"]),
+            command_graph.Node(
+                "flash", inputs=["boot.img", "system.img"]),
+            command_graph.Node("fetch boot again", outputs=["boot.img"]),
+            "upload",
+        ])
+        self.assertEqual(
+            [set(), {0}, {0}, {0}, {0, 1, 2}, {0, 1, 4}, {0, 1, 4, 5},
+             {0, 1, 2, 3, 4, 5, 6}],
+            [node.deps for node in nodes])
+        self.assertEqual("gsispl", nodes[4].command)
+
+    def testRunGraph(self):
+        """Tests that independent commands run concurrently."""
+        nodes = command_graph.BuildGraph([
+            command_graph.Node("a", outputs=["a"]),
+            command_graph.Node("b", outputs=["b"]),
+            command_graph.Node("c", inputs=["a", "b"]),
+        ])
+        lock = threading.Lock()
+        started = []
+        both_started = threading.Event()
+        finished = []
+
+        def Run(command):
+            if command == "c":
+                finished.append(command)
+                return True
+            with lock:
+                started.append(command)
+                if len(started) == 2:
+                    both_started.set()
+            ret = both_started.wait(5)
+            finished.append(command)
+            return ret
+
+        success, results = command_graph.RunGraph(nodes, Run)
+        self.assertTrue(success)
+        self.assertEqual([True, True, True], results)
+        self.assertEqual("c", finished[-1])
+
+    def testRunGraphFailure(self):
+        """Tests that the dependents of a failed command are not run."""
+        nodes = command_graph.BuildGraph([
+            command_graph.Node("a", outputs=["a"]),
+            command_graph.Node("b", inputs=["a"]),
+            "c",
+        ])
+        success, results = command_graph.RunGraph(
+            nodes, lambda command: command != "a")
+        self.assertFalse(success)
+        self.assertEqual([False, None, None], results)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,397 @@
+#
+# Copyright (C) 2018 The Android Open Source Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""Module to run console commands in background jobs."""
+
+import collections
+import logging
+import Queue
+import sys
+import threading
+import time
+
+from host_controller.utils.cmd import cmd_watchdog
+from host_controller.utils.trace import tracer
+
+# The states of a job.
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+KILLED = "killed"
+
+# The default maximum number of jobs running at once.
+DEFAULT_MAX_WORKERS = 4
+
+# The number of recent output lines kept per job.
+_MAX_OUTPUT_LINES = 10000
+
+# The current job of each thread.
+_thread_local = threading.local()
+
+
+class JobKilledError(Exception):
+    """Raised when a command is started in a killed job."""
+    pass
+
+
+def GetCurrentJob():
+    """Returns the Job running in the current thread. None if not a job."""
+    return getattr(_thread_local, "job", None)
+
+
+class AttachJob(object):
+    """Context manager which runs the current thread as part of a job.
+
+    The output of the thread goes to the job, and the shell commands
+    started by the thread are killed with the job.
+
+    Attributes:
+        _job: the Job object, or None to detach the thread from any job.
+        _previous_job: the Job of the thread before entering the block.
+    """
+
+    def __init__(self, job):
+        self._job = job
+        self._previous_job = None
+
+    def __enter__(self):
+        self._previous_job = GetCurrentJob()
+        _SetCurrentJob(self._job)
+        return self._job
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        _SetCurrentJob(self._previous_job)
+
+
+def _SetCurrentJob(job):
+    """Attaches the current thread to a job. None to detach it."""
+    _thread_local.job = job
+    cmd_watchdog.SetProcessGroupTracker(job._tracker if job else None)
+    tracer.SetJobId(job.id if job else None)
+
+
+def CheckCurrentJob():
+    """Raises JobKilledError if the current thread's job has been killed."""
+    job = GetCurrentJob()
+    if job and job.killed:
+        raise JobKilledError("Job %d has been killed." % job.id)
+
+
+class Job(object):
+    """A console command running in background.
+
+    Attributes:
+        id: integer, the job ID.
+        command: string, the console command.
+        state: string, one of QUEUED, RUNNING, DONE, FAILED and KILLED.
+        return_value: the value returned by the command.
+        exception: string, the exception which stopped the command. None if
+                   no exception is raised.
+        submit_time: float, the time when the job is submitted.
+        start_time: float, the time when the job starts. None if queued.
+        end_time: float, the time when the job ends. None if not finished.
+        num_output_lines: integer, the number of lines printed by the job.
+        _output: collections.deque of strings, the recent output lines.
+        _partial_line: string, the output after the last line break.
+        _lock: threading.Lock, protects the output.
+        _finished: threading.Event, set when the job ends.
+        _tracker: cmd_watchdog.ProcessGroupTracker, the shell commands
+                  started by the job.
+    """
+
+    def __init__(self, job_id, command):
+        self.id = job_id
+        self.command = command
+        self.state = QUEUED
+        self.return_value = None
+        self.exception = None
+        self.submit_time = time.time()
+        self.start_time = None
+        self.end_time = None
+        self.num_output_lines = 0
+        self._output = collections.deque(maxlen=_MAX_OUTPUT_LINES)
+        self._partial_line = ""
+        self._lock = threading.Lock()
+        self._finished = threading.Event()
+        self._tracker = cmd_watchdog.ProcessGroupTracker()
+
+    @property
+    def killed(self):
+        """Whether the job has been killed."""
+        return self.state == KILLED
+
+    @property
+    def finished(self):
+        """Whether the job has ended."""
+        return self._finished.is_set()
+
+    @property
+    def elapsed_secs(self):
+        """The running time of the job."""
+        if self.start_time is None:
+            return 0.0
+        return (self.end_time or time.time()) - self.start_time
+
+    def write(self, data):
+        """Appends printed data to the output."""
+        with self._lock:
+            lines = (self._partial_line + data).split("\n")
+            self._partial_line = lines.pop()
+            self._output.extend(lines)
+            self.num_output_lines += len(lines)
+
+    def flush(self):
+        """Does nothing as the output is kept in memory."""
+        pass
+
+    def GetOutput(self, tail=None):
+        """Returns the recent output.
+
+        Args:
+            tail: integer, the maximum number of lines. None for all lines
+                  kept in memory.
+
+        Returns:
+            A list of strings without line breaks.
+        """
+        with self._lock:
+            lines = list(self._output)
+            if self._partial_line:
+                lines.append(self._partial_line)
+        if tail is not None:
+            lines = lines[-tail:] if tail > 0 else []
+        return lines
+
+    def Wait(self, timeout=None):
+        """Waits for the job to end.
+
+        Args:
+            timeout: float, the maximum seconds to wait. None for no limit.
+
+        Returns:
+            Whether the job has ended.
+        """
+        # Event.wait without timeout cannot be interrupted by Ctrl-C.
+        deadline = None if timeout is None else time.time() + timeout
+        while not self._finished.is_set():
+            wait_secs = 1 if deadline is None else min(
+                1, deadline - time.time())
+            if wait_secs <= 0:
+                break
+            self._finished.wait(wait_secs)
+        return self._finished.is_set()
+
+    def Kill(self):
+        """Stops the job.
+
+        A queued job never starts. A running job raises JobKilledError when
+        it starts its next console command, and the processes it has
+        registered with cmd_watchdog are killed.
+
+        Returns:
+            False if the job has ended; True otherwise.
+        """
+        with self._lock:
+            if self._finished.is_set():
+                return False
+            self.state = KILLED
+        self._tracker.KillAll()
+        return True
+
+    def _Start(self):
+        """Marks the job as running. Returns False if killed."""
+        with self._lock:
+            if self.state == KILLED:
+                return False
+            self.state = RUNNING
+            self.start_time = time.time()
+            return True
+
+    def _Finish(self, return_value, exception):
+        """Records the result and wakes up the waiting threads."""
+        with self._lock:
+            self.return_value = return_value
+            self.exception = exception
+            if self.state != KILLED:
+                self.state = FAILED if (return_value is False or
+                                        exception) else DONE
+            self.end_time = time.time()
+            self._finished.set()
+
+
+class OutputRouter(object):
+    """A file object which writes to the output of the current thread's job.
+
+    The writes from other threads go to the original file.
+
+    Attributes:
+        default_file: the original file object.
+    """
+
+    def __init__(self, default_file):
+        self.default_file = default_file
+
+    def _GetFile(self):
+        """Returns the file object of the current thread."""
+        return GetCurrentJob() or self.default_file
+
+    def write(self, data):
+        self._GetFile().write(data)
+
+    def flush(self):
+        self._GetFile().flush()
+
+    def __getattr__(self, name):
+        return getattr(self.default_file, name)
+
+
+def RouteOutput(out_file):
+    """Wraps a file object with OutputRouter if it is not wrapped.
+
+    Args:
+        out_file: the file object.
+
+    Returns:
+        An OutputRouter object.
+    """
+    if isinstance(out_file, OutputRouter):
+        return out_file
+    return OutputRouter(out_file)
+
+
+def RouteStdout():
+    """Replaces sys.stdout so that the print statements of jobs are kept."""
+    sys.stdout = RouteOutput(sys.stdout)
+
+
+class JobTable(object):
+    """The background jobs of a console, executed by bounded workers.
+
+    Attributes:
+        max_workers: integer, the maximum number of running jobs.
+        _jobs: collections.OrderedDict of {job ID: Job}.
+        _queue: Queue.Queue of (Job, function), the jobs not started.
+        _next_id: integer, the ID of the next job.
+        _num_workers: integer, the number of worker threads.
+        _idle_workers: integer, the number of workers waiting for jobs.
+        _unclaimed: integer, the number of jobs in the queue.
+        _lock: threading.Lock, protects the attributes above.
+    """
+
+    def __init__(self, max_workers=DEFAULT_MAX_WORKERS):
+        self.max_workers = max_workers
+        self._jobs = collections.OrderedDict()
+        self._queue = Queue.Queue()
+        self._next_id = 1
+        self._num_workers = 0
+        self._idle_workers = 0
+        self._unclaimed = 0
+        self._lock = threading.Lock()
+
+    def _Work(self):
+        """Runs the queued jobs until None is received."""
+        while True:
+            task = self._queue.get()
+            with self._lock:
+                self._idle_workers -= 1
+                if task is None:
+                    self._num_workers -= 1
+                    return
+                self._unclaimed -= 1
+            job, func = task
+            self._RunJob(job, func)
+            with self._lock:
+                self._idle_workers += 1
+
+    def _RunJob(self, job, func):
+        """Calls the function of a job in the current thread.
+
+        Args:
+            job: the Job object.
+            func: the function called with the command.
+        """
+        if not job._Start():
+            job._Finish(None, None)
+            return
+        return_value = None
+        exception = None
+        with AttachJob(job):
+            try:
+                return_value = func(job.command)
+            except Exception as e:
+                logging.exception("Job %d failed.", job.id)
+                exception = "%s: %s" % (type(e).__name__, e)
+        job._Finish(return_value, exception)
+
+    def Submit(self, command, func):
+        """Adds a job and starts it if a worker is available.
+
+        Args:
+            command: string, the console command.
+            func: the function executing the command in a worker thread.
+                  It returns False if the command fails.
+
+        Returns:
+            The Job object.
+        """
+        with self._lock:
+            job = Job(self._next_id, command)
+            self._next_id += 1
+            self._jobs[job.id] = job
+            self._unclaimed += 1
+            if (self._unclaimed > self._idle_workers and
+                    self._num_workers < self.max_workers):
+                thread = threading.Thread(target=self._Work)
+                thread.daemon = True
+                thread.start()
+                self._num_workers += 1
+                self._idle_workers += 1
+        self._queue.put((job, func))
+        return job
+
+    def GetJob(self, job_id):
+        """Returns the Job of an ID. None if not found."""
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def GetJobs(self):
+        """Returns a list of Job objects in the order of submission."""
+        with self._lock:
+            return self._jobs.values()
+
+    def RemoveFinishedJobs(self):
+        """Removes the ended jobs from the table.
+
+        Returns:
+            A list of the removed Job objects.
+        """
+        with self._lock:
+            removed = [job for job in self._jobs.values() if job.finished]
+            for job in removed:
+                del self._jobs[job.id]
+        return removed
+
+    def Shutdown(self):
+        """Kills all jobs and stops the workers without waiting for them.
+
+        The table should not be used after shutdown.
+        """
+        for job in self.GetJobs():
+            job.Kill()
+        with self._lock:
+            num_workers = self._num_workers
+        for _ in range(num_workers):
+            self._queue.put(None)
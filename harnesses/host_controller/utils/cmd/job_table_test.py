@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+#
+# Copyright (C) 2018 The Android Open Source Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+
+import threading
+import unittest
+
+from host_controller.utils.cmd import job_table
+
+
+class JobTableTest(unittest.TestCase):
+    """Tests for job_table."""
+
+    def setUp(self):
+        """Creates a table with one worker."""
+        self._table = job_table.JobTable(max_workers=1)
+        self._release = threading.Event()
+
+    def tearDown(self):
+        """Stops the workers."""
+        self._release.set()
+        self._table.Shutdown()
+
+    def _Block(self, command):
+        """Prints the command and waits for the release."""
+        out_file = job_table.OutputRouter(None)
+        out_file.write("start %s\nend" % command)
+        self._release.wait(10)
+        if command == "fail":
+            return False
+
+    def testBoundedWorkers(self):
+        """Tests that the jobs beyond the limit are queued."""
+        first = self._table.Submit("a", self._Block)
+        second = self._table.Submit("b", self._Block)
+        self.assertFalse(second.Wait(0.2))
+        self.assertEqual(job_table.QUEUED, second.state)
+        self.assertEqual(job_table.RUNNING, first.state)
+        self._release.set()
+        self.assertTrue(first.Wait(10))
+        self.assertTrue(second.Wait(10))
+        self.assertEqual(job_table.DONE, second.state)
+        self.assertEqual(["start a", "end"], first.GetOutput())
+        self.assertEqual(["end"], first.GetOutput(tail=1))
+
+    def testFailedJob(self):
+        """Tests the states of the failed jobs."""
+        self._release.set()
+        failed = self._table.Submit("fail", self._Block)
+
+        def Raise(command):
+            raise IOError(command)
+
+        raised = self._table.Submit("error", Raise)
+        self.assertTrue(raised.Wait(10))
+        self.assertEqual(job_table.FAILED, failed.state)
+        self.assertEqual(job_table.FAILED, raised.state)
+        self.assertEqual("IOError: error", raised.exception)
+
+    def testKill(self):
+        """Tests killing a running and a queued job."""
+        running = self._table.Submit("a", self._Block)
+        queued = self._table.Submit("b", self._Block)
+        self.assertTrue(queued.Kill())
+        self.assertTrue(running.Kill())
+        self._release.set()
+        self.assertTrue(queued.Wait(10))
+        self.assertEqual(job_table.KILLED, running.state)
+        self.assertEqual(job_table.KILLED, queued.state)
+        self.assertIsNone(queued.start_time)
+        self.assertFalse(running.Kill())
+        self.assertEqual([running, queued], self._table.RemoveFinishedJobs())
+        self.assertEqual([], self._table.GetJobs())
+
+    def testCheckCurrentJob(self):
+        """Tests that a killed job cannot start commands."""
+        job = job_table.Job(1, "a")
+        job_table.CheckCurrentJob()
+        with job_table.AttachJob(job):
+            job_table.CheckCurrentJob()
+            job.Kill()
+            self.assertRaises(job_table.JobKilledError,
+                              job_table.CheckCurrentJob)
+        job_table.CheckCurrentJob()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,213 @@
+#
+# Copyright (C) 2018 The Android Open Source Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""Module to capture the output streams of long-running subprocesses."""
+
+import collections
+import gzip
+import logging
+import os
+import tempfile
+import threading
+import time
+
+# The default parent directory of the per-run output directories.
+DEFAULT_OUTPUT_DIR = os.path.join(tempfile.gettempdir(), "vts_hc_output")
+
+# The number of recent lines kept in memory per stream.
+_DEFAULT_RING_SIZE = 200
+
+# The minimum interval between two summaries of a stream in the log.
+_DEFAULT_SUMMARY_INTERVAL_SECS = 60
+
+# The maximum number of bytes read from a pipe at once.
+_READ_SIZE = 64 * 1024
+
+# The zlib level of the log files. The fastest level keeps the reader
+# threads from lagging behind the subprocess.
+_COMPRESS_LEVEL = 1
+
+
+class _StreamCapture(object):
+    """Copies one output stream to a compressed file.
+
+    Attributes:
+        name: string, the stream name, e.g., "stdout".
+        path: string, the path to the compressed file.
+        num_lines: integer, the number of lines read from the stream.
+        num_bytes: integer, the number of bytes read from the stream.
+        _log_level: integer, the level of the summaries.
+        _recent_lines: collections.deque of strings, the recent lines.
+        _lock: threading.Lock, protects _recent_lines.
+        _summary_interval_secs: float, the interval between the summaries.
+                                None to disable the summaries.
+        _last_summary_time: float, the time when the last summary is logged.
+        _last_summary_lines: integer, num_lines at the last summary.
+        _thread: threading.Thread, the reader thread.
+    """
+
+    def __init__(self, name, path, log_level, ring_size,
+                 summary_interval_secs):
+        self.name = name
+        self.path = path
+        self.num_lines = 0
+        self.num_bytes = 0
+        self._log_level = log_level
+        self._recent_lines = collections.deque(maxlen=ring_size)
+        self._lock = threading.Lock()
+        self._summary_interval_secs = summary_interval_secs
+        self._last_summary_time = time.time()
+        self._last_summary_lines = 0
+        self._thread = None
+
+    def _AddLines(self, lines):
+        """Appends complete lines to the ring buffer.
+
+        Args:
+            lines: list of strings without line breaks.
+        """
+        if not lines:
+            return
+        self.num_lines += len(lines)
+        with self._lock:
+            self._recent_lines.extend(lines)
+        if self._summary_interval_secs is None:
+            return
+        now = time.time()
+        if now - self._last_summary_time >= self._summary_interval_secs:
+            self._LogSummary(lines[-1])
+            self._last_summary_time = now
+
+    def _LogSummary(self, last_line):
+        """Logs the number of new lines and the last line of the stream."""
+        logging.log(self._log_level, "[%s] %d new lines. Last: %s", self.name,
+                    self.num_lines - self._last_summary_lines, last_line)
+        self._last_summary_lines = self.num_lines
+
+    def _Read(self, stream):
+        """Reads a stream until EOF and closes it.
+
+        Args:
+            stream: the file object of a pipe.
+        """
+        fd = stream.fileno()
+        partial_line = ""
+        out_file = gzip.open(self.path, "wb", _COMPRESS_LEVEL)
+        try:
+            while True:
+                data = os.read(fd, _READ_SIZE)
+                if not data:
+                    break
+                out_file.write(data)
+                self.num_bytes += len(data)
+                lines = (partial_line + data).split("\n")
+                partial_line = lines.pop()
+                self._AddLines(lines)
+            if partial_line:
+                self._AddLines([partial_line])
+        finally:
+            out_file.close()
+            stream.close()
+
+    def Start(self, stream):
+        """Starts reading a stream in a daemon thread."""
+        self._thread = threading.Thread(target=self._Read, args=(stream, ))
+        self._thread.daemon = True
+        self._thread.start()
+
+    def Join(self):
+        """Waits for EOF of the stream."""
+        if self._thread:
+            self._thread.join()
+
+    def GetRecentLines(self):
+        """Returns a list of strings, the recent lines in the ring buffer."""
+        with self._lock:
+            return list(self._recent_lines)
+
+
+class OutputCapture(object):
+    """Captures stdout and stderr of a subprocess to compressed files.
+
+    The raw output is written to <output_dir>/stdout.gz and stderr.gz in
+    large chunks instead of being logged line by line. Only a bounded number
+    of recent lines is kept in memory for error reporting, and a summary of
+    each stream is logged at most once per interval.
+
+    Attributes:
+        output_dir: string, the directory containing the output files.
+        _streams: dict of {name: _StreamCapture}.
+    """
+
+    def __init__(self,
+                 output_dir=None,
+                 ring_size=_DEFAULT_RING_SIZE,
+                 summary_interval_secs=_DEFAULT_SUMMARY_INTERVAL_SECS):
+        """Initializes the capture.
+
+        Args:
+            output_dir: string, the directory of the output files. It is
+                        created if it doesn't exist. None to create a new
+                        directory under DEFAULT_OUTPUT_DIR.
+            ring_size: integer, the number of lines kept per stream.
+            summary_interval_secs: float, the minimum interval between two
+                                   summaries. None to disable logging.
+        """
+        if output_dir is None:
+            if not os.path.exists(DEFAULT_OUTPUT_DIR):
+                os.makedirs(DEFAULT_OUTPUT_DIR)
+            output_dir = tempfile.mkdtemp(
+                prefix=time.strftime("%Y%m%d-%H%M%S-"),
+                dir=DEFAULT_OUTPUT_DIR)
+        elif not os.path.exists(output_dir):
+            os.makedirs(output_dir)
+        self.output_dir = output_dir
+        self._streams = {}
+        for name, log_level in (("stdout", logging.INFO),
+                                ("stderr", logging.ERROR)):
+            self._streams[name] = _StreamCapture(
+                name, os.path.join(output_dir, name + ".gz"), log_level,
+                ring_size, summary_interval_secs)
+
+    def Start(self, proc):
+        """Starts capturing the output of a subprocess.
+
+        Args:
+            proc: subprocess.Popen object created with stdout and stderr
+                  set to subprocess.PIPE.
+        """
+        self._streams["stdout"].Start(proc.stdout)
+        self._streams["stderr"].Start(proc.stderr)
+
+    def Join(self):
+        """Waits for the streams to close and logs their sizes."""
+        for name in sorted(self._streams):
+            stream = self._streams[name]
+            stream.Join()
+            logging.info("Captured %d lines (%d bytes) of %s in %s",
+                         stream.num_lines, stream.num_bytes, name,
+                         stream.path)
+
+    def GetPath(self, name):
+        """Returns the path to the compressed file of "stdout" or "stderr"."""
+        return self._streams[name].path
+
+    def GetRecentLines(self, name):
+        """Returns the recent lines of "stdout" or "stderr".
+
+        Returns:
+            A list of strings, at most ring_size lines.
+        """
+        return self._streams[name].GetRecentLines()
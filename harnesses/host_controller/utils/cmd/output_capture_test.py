@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+#
+# Copyright (C) 2018 The Android Open Source Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import gzip
+import shutil
+import subprocess
+import tempfile
+import unittest
+
+from host_controller.utils.cmd import output_capture
+
+
+class OutputCaptureTest(unittest.TestCase):
+    """Tests for OutputCapture.
+
+    Attributes:
+        _temp_dir: string, the directory of the output files.
+    """
+
+    def setUp(self):
+        """Creates the output directory."""
+        self._temp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        """Deletes the output directory."""
+        shutil.rmtree(self._temp_dir, ignore_errors=True)
+
+    def _Capture(self, script, ring_size):
+        """Runs a shell script and captures its output."""
+        capture = output_capture.OutputCapture(
+            self._temp_dir, ring_size=ring_size, summary_interval_secs=None)
+        proc = subprocess.Popen(
+            script,
+            shell=True,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE)
+        capture.Start(proc)
+        proc.wait()
+        capture.Join()
+        return capture
+
+    def testCapture(self):
+        """Tests that the files keep all output and memory keeps the tail."""
+        capture = self._Capture(
+            "seq 1 1000; echo error >&2; printf no-newline >&2", 3)
+        with gzip.open(capture.GetPath("stdout"), "rb") as stdout_file:
+            self.assertEqual(
+                "".join("%d\n" % x for x in range(1, 1001)),
+                stdout_file.read())
+        with gzip.open(capture.GetPath("stderr"), "rb") as stderr_file:
+            self.assertEqual("error\nno-newline", stderr_file.read())
+        self.assertEqual(["998", "999", "1000"],
+                         capture.GetRecentLines("stdout"))
+        self.assertEqual(["error", "no-newline"],
+                         capture.GetRecentLines("stderr"))
+
+    def testEmptyOutput(self):
+        """Tests a command without output."""
+        capture = self._Capture("true", 3)
+        self.assertEqual([], capture.GetRecentLines("stdout"))
+        with gzip.open(capture.GetPath("stdout"), "rb") as stdout_file:
+            self.assertEqual("", stdout_file.read())
+
+
+if __name__ == "__main__":
+    unittest.main()
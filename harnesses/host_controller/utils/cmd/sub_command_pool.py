@@ -0,0 +1,233 @@
+#
+# Copyright (C) 2018 The Android Open Source Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""Module to execute the parallel sub-command lists of the console."""
+
+import logging
+import multiprocessing
+import Queue
+import threading
+
+# The backend forking one process per sub-command list.
+PROCESS = "process"
+
+# The backend running the sub-command lists in persistent threads.
+THREAD = "thread"
+
+BACKENDS = (PROCESS, THREAD)
+
+# The interval of checking whether the sub-command processes are alive.
+_POLL_INTERVAL_SECS = 1
+
+
+class SubCommandResult(object):
+    """The result of a sub-command list executed in parallel.
+
+    Attributes:
+        index: integer, the position of the list in the parallel command.
+        command: string or list of strings, the sub-command list.
+        return_value: the value returned by the console. False if failed.
+        exception: string, the exception which stopped the sub-command.
+                   None if no exception is raised.
+        elapsed_secs: float, the execution time.
+        state_changes: dict of {attribute name: (dict, list)}, the items
+                       updated and the keys removed from the console
+                       dicts by the sub-command.
+        flash_records: list of FlashStepRecord, the flash steps recorded in
+                       the sub-command process. Empty in the thread backend,
+                       which records them in the console directly.
+        spans: list of the spans returned by tracer.GetEvents in the
+               sub-command process. Empty in the thread backend.
+        metrics_snapshot: dict, the metric values observed in the
+                          sub-command process. See metrics.Registry.Snapshot.
+                          Empty in the thread backend.
+    """
+
+    def __init__(self, index, command):
+        self.index = index
+        self.command = command
+        self.return_value = None
+        self.exception = None
+        self.elapsed_secs = 0.0
+        self.state_changes = {}
+        self.flash_records = []
+        self.spans = []
+        self.metrics_snapshot = {}
+
+    @property
+    def success(self):
+        """Whether the sub-command list succeeded."""
+        return self.return_value is not False and self.exception is None
+
+
+def DiffState(before, after):
+    """Compares the console dicts before and after a sub-command.
+
+    Args:
+        before: dict of {attribute name: dict}, the copies of the dicts
+                before the sub-command.
+        after: dict of {attribute name: dict}, the dicts after the
+               sub-command.
+
+    Returns:
+        A dict of {attribute name: (updated items, removed keys)} which
+        contains the changed attributes only.
+    """
+    changes = {}
+    for name, old_dict in before.iteritems():
+        new_dict = after[name]
+        updated = dict((key, value) for key, value in new_dict.iteritems()
+                       if key not in old_dict or old_dict[key] != value)
+        removed = [key for key in old_dict if key not in new_dict]
+        if updated or removed:
+            changes[name] = (updated, removed)
+    return changes
+
+
+def ApplyStateChanges(state, changes):
+    """Applies the changes returned by DiffState.
+
+    Args:
+        state: dict of {attribute name: dict}, the dicts to be updated.
+        changes: dict of {attribute name: (updated items, removed keys)}.
+    """
+    for name, (updated, removed) in changes.iteritems():
+        for key in removed:
+            state[name].pop(key, None)
+        state[name].update(updated)
+
+
+class ThreadPool(object):
+    """A pool of persistent threads which run all submitted tasks at once.
+
+    A thread is started only if all existing threads are busy, and is
+    reused by the following calls, so repeated parallel commands do not
+    pay the cost of creating workers.
+
+    Attributes:
+        _tasks: Queue.Queue of (function, arguments, result queue).
+        _threads: list of threading.Thread, the worker threads.
+        _busy: integer, the number of submitted tasks not finished yet.
+        _lock: threading.Lock, protects _threads and _busy.
+    """
+
+    def __init__(self):
+        self._tasks = Queue.Queue()
+        self._threads = []
+        self._busy = 0
+        self._lock = threading.Lock()
+
+    def _Work(self):
+        """Runs the tasks in the queue until None is received."""
+        while True:
+            task = self._tasks.get()
+            if task is None:
+                return
+            func, args, result_queue = task
+            try:
+                result = func(*args)
+            except Exception:
+                logging.exception("Unexpected exception in worker thread.")
+                result = None
+            with self._lock:
+                self._busy -= 1
+            result_queue.put((args[0], result))
+
+    def Map(self, func, items):
+        """Calls a function on every item in parallel.
+
+        Args:
+            func: the function called with (index, item). It should not
+                  raise exceptions.
+            items: list of the arguments.
+
+        Returns:
+            A list of the return values in the order of the items.
+        """
+        with self._lock:
+            self._busy += len(items)
+            while len(self._threads) < self._busy:
+                thread = threading.Thread(target=self._Work)
+                thread.daemon = True
+                thread.start()
+                self._threads.append(thread)
+        result_queue = Queue.Queue()
+        for index, item in enumerate(items):
+            self._tasks.put((func, (index, item), result_queue))
+        results = [None] * len(items)
+        for _ in items:
+            index, result = result_queue.get()
+            results[index] = result
+        return results
+
+    def Shutdown(self):
+        """Stops the idle threads after the submitted tasks finish."""
+        with self._lock:
+            threads = self._threads
+            self._threads = []
+        for _ in threads:
+            self._tasks.put(None)
+        for thread in threads:
+            thread.join()
+
+
+def _ProcessMain(func, index, item, result_queue):
+    """The main function of a sub-command process."""
+    result_queue.put((index, func(index, item)))
+
+
+def MapInProcesses(func, items, process_class=multiprocessing.Process):
+    """Calls a function on every item in a forked process.
+
+    Args:
+        func: the function called with (index, item). It should not raise
+              exceptions and should return a picklable object.
+        items: list of the arguments.
+        process_class: the class of the processes.
+
+    Returns:
+        A list of the return values in the order of the items. The value
+        is None if the process exits without returning.
+    """
+    result_queue = multiprocessing.Queue()
+    processes = []
+    for index, item in enumerate(items):
+        process = process_class(
+            target=_ProcessMain, args=(func, index, item, result_queue))
+        process.start()
+        processes.append(process)
+
+    results = [None] * len(items)
+    remaining = len(items)
+    # The results are read before joining, as a process exits only after
+    # its result is consumed.
+    while remaining:
+        try:
+            index, result = result_queue.get(timeout=_POLL_INTERVAL_SECS)
+        except Queue.Empty:
+            if any(process.is_alive() for process in processes):
+                continue
+            try:
+                index, result = result_queue.get(timeout=_POLL_INTERVAL_SECS)
+            except Queue.Empty:
+                logging.error("%d sub-command processes exited without "
+                              "result.", remaining)
+                break
+        results[index] = result
+        remaining -= 1
+
+    for process in processes:
+        process.join()
+    return results
@@ -0,0 +1,93 @@
+#!/usr/bin/env python
+#
+# Copyright (C) 2018 The Android Open Source Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+
+import os
+import threading
+import unittest
+
+from host_controller.utils.cmd import sub_command_pool
+
+
+class SubCommandPoolTest(unittest.TestCase):
+    """Tests for the sub-command execution backends."""
+
+    def testThreadPoolMap(self):
+        """Tests that the items run concurrently in reused threads."""
+        pool = sub_command_pool.ThreadPool()
+        lock = threading.Lock()
+        started = []
+        all_started = threading.Event()
+        thread_names = set()
+
+        def Run(index, item):
+            with lock:
+                thread_names.add(threading.current_thread().name)
+                started.append(item)
+                if len(started) == 3:
+                    all_started.set()
+            # Every task waits for the others, so they must run at once.
+            return item * 2 if all_started.wait(5) else None
+
+        try:
+            self.assertEqual([2, 4, 6], pool.Map(Run, [1, 2, 3]))
+            self.assertEqual([8], pool.Map(Run, [4]))
+            self.assertEqual(3, len(thread_names))
+        finally:
+            pool.Shutdown()
+
+    def testThreadPoolException(self):
+        """Tests that an exception does not block the caller."""
+        pool = sub_command_pool.ThreadPool()
+
+        def Run(index, item):
+            if item:
+                raise ValueError()
+            return index
+
+        try:
+            self.assertEqual([0, None], pool.Map(Run, [False, True]))
+        finally:
+            pool.Shutdown()
+
+    def testMapInProcesses(self):
+        """Tests that the items run in child processes."""
+        results = sub_command_pool.MapInProcesses(
+            lambda index, item: (item, os.getpid()), ["a", "b"])
+        self.assertEqual(["a", "b"], [item for item, _ in results])
+        self.assertNotIn(os.getpid(), [pid for _, pid in results])
+
+    def testMapInProcessesWithoutResult(self):
+        """Tests a process exiting without result."""
+        results = sub_command_pool.MapInProcesses(
+            lambda index, item: os._exit(1) if item else item, [0, 1])
+        self.assertEqual([0, None], results)
+
+    def testStateChanges(self):
+        """Tests comparing and applying the console dicts."""
+        before = {"test_result": {"a": 1, "b": 2}, "fetch_info": {"c": 3}}
+        after = {"test_result": {"a": 1, "d": 4}, "fetch_info": {"c": 3}}
+        changes = sub_command_pool.DiffState(before, after)
+        self.assertEqual({"test_result": ({"d": 4}, ["b"])}, changes)
+
+        state = {"test_result": {"a": 0, "b": 2}, "fetch_info": {}}
+        sub_command_pool.ApplyStateChanges(state, changes)
+        self.assertEqual({"a": 0, "d": 4}, state["test_result"])
+
+
+if __name__ == "__main__":
+    unittest.main()
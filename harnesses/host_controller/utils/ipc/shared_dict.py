@@ -58,4 +58,8 @@ class SharedDict(object):
         if value not in range(len(common._DEVICE_STATUS_DICT)):
             self._dict[key] = common._DEVICE_STATUS_DICT["unknown"]
         else:
-            self._dict[key] = value
\ No newline at end of file
+            self._dict[key] = value
+
+    def items(self):
+        """Returns a list of (serial, status) copied from self._dict."""
+        return self._dict.items()
\ No newline at end of file
@@ -0,0 +1,482 @@
+#
+# Copyright (C) 2018 The Android Open Source Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""Module to collect the counters and histograms of the host controller.
+
+The metrics are rendered in the Prometheus text format by MetricsServer.
+The values are kept per process. A leased job runs in a pool process, so
+the pool processes publish snapshots of their values to a shared store,
+and the main process merges them when it renders the metrics. A forked
+sub-command process returns its snapshot to the parent, which merges it
+into its own registry.
+"""
+
+import collections
+import functools
+import logging
+import os
+import threading
+import time
+
+COUNTER = "counter"
+GAUGE = "gauge"
+HISTOGRAM = "histogram"
+
+# The default interval between two snapshots published by a pool process.
+_PUBLISH_INTERVAL_SECS = 10
+
+
+class _Family(object):
+    """The definition of a metric.
+
+    Attributes:
+        name: string, the metric name.
+        description: string, the help text.
+        type: string, COUNTER, GAUGE or HISTOGRAM.
+        label_names: tuple of strings.
+        buckets: tuple of floats, the upper bounds of the histogram
+                 buckets in ascending order.
+    """
+
+    def __init__(self, name, description, metric_type, label_names,
+                 buckets=()):
+        self.name = name
+        self.description = description
+        self.type = metric_type
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(buckets)
+
+
+class Registry(object):
+    """The metrics of a process.
+
+    Attributes:
+        _families: collections.OrderedDict of {name: _Family}.
+        _samples: dict of {(name, label values): value}. The value of a
+                  counter is a float. The value of a histogram is a list of
+                  the bucket counts followed by the sum and the count.
+        _collectors: list of functions which return the gauge values when
+                     the metrics are rendered.
+        _lock: threading.Lock, protects _samples.
+    """
+
+    def __init__(self):
+        self._families = collections.OrderedDict()
+        self._samples = {}
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def _AddFamily(self, family):
+        """Registers a metric definition."""
+        self._families[family.name] = family
+        return family
+
+    def Counter(self, name, description, label_names=()):
+        """Defines a counter.
+
+        Returns:
+            A Counter object.
+        """
+        return Counter(self, self._AddFamily(
+            _Family(name, description, COUNTER, label_names)))
+
+    def Histogram(self, name, description, label_names=(), buckets=()):
+        """Defines a histogram.
+
+        Returns:
+            A Histogram object.
+        """
+        return Histogram(self, self._AddFamily(
+            _Family(name, description, HISTOGRAM, label_names, buckets)))
+
+    def Gauge(self, name, description, label_names=()):
+        """Defines a gauge whose values are returned by collectors.
+
+        Returns:
+            The name of the gauge.
+        """
+        self._AddFamily(_Family(name, description, GAUGE, label_names))
+        return name
+
+    def AddCollector(self, collector):
+        """Adds a function which returns gauge values.
+
+        Args:
+            collector: the function returning a list of (gauge name, dict of
+                       labels, value). It is called when rendering.
+        """
+        self._collectors.append(collector)
+
+    def RemoveCollector(self, collector):
+        """Removes a function added by AddCollector."""
+        if collector in self._collectors:
+            self._collectors.remove(collector)
+
+    def _Update(self, key, update, initial):
+        """Updates a sample with a function under the lock."""
+        with self._lock:
+            self._samples[key] = update(self._samples.get(key, initial))
+
+    def Snapshot(self):
+        """Returns a picklable copy of the counter and histogram values."""
+        with self._lock:
+            return dict((key, list(value) if isinstance(value, list) else
+                         value) for key, value in self._samples.iteritems())
+
+    def Merge(self, snapshot):
+        """Adds the values of another process to this process.
+
+        Args:
+            snapshot: dict returned by Snapshot in the other process.
+        """
+        with self._lock:
+            self._samples = MergeSnapshots([self._samples, snapshot])
+
+    def Clear(self):
+        """Resets all values."""
+        with self._lock:
+            self._samples.clear()
+
+    def Render(self, snapshots=()):
+        """Renders the metrics in the Prometheus text format.
+
+        Args:
+            snapshots: list of the dicts returned by Snapshot in other
+                       processes. They are added to the values of this
+                       process.
+
+        Returns:
+            A string.
+        """
+        samples = MergeSnapshots([self.Snapshot()] + list(snapshots))
+        gauges = collections.defaultdict(list)
+        for collector in list(self._collectors):
+            try:
+                for name, labels, value in collector():
+                    gauges[name].append((labels, value))
+            except Exception:
+                logging.exception("Failed to collect metrics.")
+
+        by_family = collections.defaultdict(list)
+        for (name, label_values), value in sorted(samples.iteritems()):
+            by_family[name].append((label_values, value))
+
+        lines = []
+        for family in self._families.itervalues():
+            lines.append("# HELP %s %s" % (family.name, family.description))
+            lines.append("# TYPE %s %s" % (family.name, family.type))
+            if family.type == GAUGE:
+                for labels, value in gauges[family.name]:
+                    lines.append("%s%s %s" % (
+                        family.name,
+                        _FormatLabels([(name, labels[name])
+                                       for name in family.label_names
+                                       if name in labels]),
+                        _FormatValue(value)))
+                continue
+            for label_values, value in by_family[family.name]:
+                labels = zip(family.label_names, label_values)
+                if family.type == COUNTER:
+                    lines.append("%s%s %s" % (family.name,
+                                              _FormatLabels(labels),
+                                              _FormatValue(value)))
+                    continue
+                cumulative = 0
+                for bound, count in zip(family.buckets + (float("inf"), ),
+                                        value[:-2]):
+                    cumulative += count
+                    lines.append("%s_bucket%s %s" % (
+                        family.name,
+                        _FormatLabels(labels + [("le", _FormatValue(bound))]),
+                        _FormatValue(cumulative)))
+                lines.append("%s_sum%s %s" % (family.name,
+                                              _FormatLabels(labels),
+                                              _FormatValue(value[-2])))
+                lines.append("%s_count%s %s" % (family.name,
+                                                _FormatLabels(labels),
+                                                _FormatValue(value[-1])))
+        return "\n".join(lines) + "\n"
+
+
+class Counter(object):
+    """A monotonically increasing value per label set.
+
+    Attributes:
+        _registry: the Registry.
+        _family: the _Family.
+    """
+
+    def __init__(self, registry, family):
+        self._registry = registry
+        self._family = family
+
+    def Inc(self, amount=1, **labels):
+        """Adds an amount to the value of the labels."""
+        key = (self._family.name,
+               tuple(str(labels.get(name, ""))
+                     for name in self._family.label_names))
+        self._registry._Update(key, lambda value: value + amount, 0)
+
+
+class Histogram(object):
+    """The distribution of observed values per label set.
+
+    Attributes:
+        _registry: the Registry.
+        _family: the _Family.
+    """
+
+    def __init__(self, registry, family):
+        self._registry = registry
+        self._family = family
+
+    def Observe(self, value, **labels):
+        """Adds a value to the distribution of the labels."""
+        key = (self._family.name,
+               tuple(str(labels.get(name, ""))
+                     for name in self._family.label_names))
+        buckets = self._family.buckets
+        index = len(buckets)
+        for bucket_index, bound in enumerate(buckets):
+            if value <= bound:
+                index = bucket_index
+                break
+
+        def Update(sample):
+            sample = list(sample)
+            sample[index] += 1
+            sample[-2] += value
+            sample[-1] += 1
+            return sample
+
+        self._registry._Update(key, Update, [0] * (len(buckets) + 3))
+
+    def Time(self, **labels):
+        """Returns a context manager which observes the block's duration.
+
+        Args:
+            labels: the label values of the observation.
+        """
+        return _Timer(self, **labels)
+
+
+class _Timer(object):
+    """Context manager which observes the duration of a block.
+
+    Attributes:
+        _histogram: the Histogram.
+        _labels: dict of the labels.
+        _start_time: float, the time when the block is entered.
+    """
+
+    def __init__(self, histogram, **labels):
+        self._histogram = histogram
+        self._labels = labels
+        self._start_time = None
+
+    def __enter__(self):
+        self._start_time = time.time()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._histogram.Observe(time.time() - self._start_time,
+                                **self._labels)
+        return False
+
+
+def MergeSnapshots(snapshots):
+    """Adds up the values of the same metrics and labels.
+
+    Args:
+        snapshots: list of dicts returned by Registry.Snapshot.
+
+    Returns:
+        A dict in the format of Registry.Snapshot.
+    """
+    merged = {}
+    for snapshot in snapshots:
+        for key, value in snapshot.items():
+            if key not in merged:
+                merged[key] = list(value) if isinstance(value,
+                                                        list) else value
+            elif isinstance(value, list):
+                merged[key] = [a + b for a, b in zip(merged[key], value)]
+            else:
+                merged[key] += value
+    return merged
+
+
+def _FormatLabels(labels):
+    """Formats a list of (name, value) as {name="value",...}."""
+    if not labels:
+        return ""
+    return "{%s}" % ",".join(
+        '%s="%s"' % (name, str(value).replace("\\", "\\\\").replace(
+            '"', '\\"').replace("\n", "\\n")) for name, value in labels)
+
+
+def _FormatValue(value):
+    """Formats a number in the Prometheus text format."""
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+class RequestTimer(object):
+    """Context manager which observes the latency of a remote call.
+
+    An exception raised in the block is counted as an error.
+
+    Attributes:
+        _service: string, the remote service, e.g., "vti" or "tfc".
+        _method: string, the name of the call.
+        _start_time: float, the time when the block is entered.
+    """
+
+    def __init__(self, service, method):
+        self._service = service
+        self._method = method
+        self._start_time = None
+
+    def __enter__(self):
+        self._start_time = time.time()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is not None:
+            REQUEST_ERRORS.Inc(service=self._service, method=self._method)
+        REQUEST_SECONDS.Observe(time.time() - self._start_time,
+                                service=self._service, method=self._method)
+        return False
+
+
+def TimedRequest(service):
+    """Returns a decorator which observes the latency of a remote call.
+
+    Args:
+        service: string, the remote service, e.g., "vti" or "tfc".
+    """
+
+    def Decorator(func):
+
+        @functools.wraps(func)
+        def Wrapper(*args, **kwargs):
+            with RequestTimer(service, func.__name__):
+                return func(*args, **kwargs)
+
+        return Wrapper
+
+    return Decorator
+
+
+def Publish(store):
+    """Writes the snapshot of this process to a shared store.
+
+    Args:
+        store: the dict shared with the main process, e.g., a
+               multiprocessing manager dict. The key is the process ID.
+    """
+    try:
+        store[os.getpid()] = _registry.Snapshot()
+    except Exception as e:
+        logging.error("Failed to publish metrics: %s", e)
+
+
+def StartPublisher(store, interval_secs=_PUBLISH_INTERVAL_SECS):
+    """Publishes the snapshot of this process periodically.
+
+    Args:
+        store: the dict shared with the main process.
+        interval_secs: float, the interval between two snapshots.
+
+    Returns:
+        The daemon threading.Thread.
+    """
+
+    def Run():
+        while True:
+            time.sleep(interval_secs)
+            Publish(store)
+
+    thread = threading.Thread(target=Run)
+    thread.daemon = True
+    thread.start()
+    return thread
+
+
+_registry = Registry()
+
+
+def GetRegistry():
+    """Returns the Registry of this process."""
+    return _registry
+
+
+ARTIFACT_BYTES = _registry.Counter(
+    "host_controller_artifact_bytes_total",
+    "The bytes of the downloaded artifacts.", ("provider", ))
+
+ARTIFACT_DOWNLOAD_SECONDS = _registry.Counter(
+    "host_controller_artifact_download_seconds_total",
+    "The time spent in downloading artifacts.", ("provider", ))
+
+ARTIFACT_BYTES_PER_SECOND = _registry.Histogram(
+    "host_controller_artifact_download_bytes_per_second",
+    "The throughput of each artifact download.", ("provider", ),
+    (1e6, 5e6, 1e7, 2.5e7, 5e7, 1e8, 2.5e8, 5e8))
+
+CACHE_REQUESTS = _registry.Counter(
+    "host_controller_cache_requests_total",
+    "The lookups of the in-process caches by result (hit or miss).",
+    ("cache", "result"))
+
+FLASH_STEP_SECONDS = _registry.Histogram(
+    "host_controller_flash_step_seconds",
+    "The duration of the flash and boot steps.", ("serial", "step"),
+    (1, 5, 10, 30, 60, 120, 300, 600, 1200))
+
+REQUEST_SECONDS = _registry.Histogram(
+    "host_controller_request_seconds",
+    "The latency of the VTI and TFC requests.", ("service", "method"),
+    (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30))
+
+REQUEST_ERRORS = _registry.Counter(
+    "host_controller_request_errors_total",
+    "The VTI and TFC requests which raised exceptions.",
+    ("service", "method"))
+
+JOBS = _registry.Gauge("host_controller_jobs",
+                       "The background and leased jobs by state.",
+                       ("type", "state"))
+
+DEVICES = _registry.Gauge("host_controller_devices",
+                          "The devices by status.", ("status", ))
+
+
+def ObserveDownload(provider, num_bytes, elapsed_secs):
+    """Records an artifact download.
+
+    Args:
+        provider: string, the build provider, e.g., "pab".
+        num_bytes: integer, the size of the artifact.
+        elapsed_secs: float, the download time.
+    """
+    ARTIFACT_BYTES.Inc(num_bytes, provider=provider)
+    ARTIFACT_DOWNLOAD_SECONDS.Inc(elapsed_secs, provider=provider)
+    if elapsed_secs > 0:
+        ARTIFACT_BYTES_PER_SECOND.Observe(num_bytes / elapsed_secs,
+                                          provider=provider)
@@ -0,0 +1,92 @@
+#
+# Copyright (C) 2018 The Android Open Source Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""Module to serve the metrics over HTTP in the Prometheus text format."""
+
+import BaseHTTPServer
+import logging
+import SocketServer
+import threading
+
+# The content type of the Prometheus text format.
+_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# The path of the metrics.
+METRICS_PATH = "/metrics"
+
+
+class _MetricsHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """Responds to GET /metrics with the rendered metrics."""
+
+    def do_GET(self):
+        if self.path.split("?", 1)[0] != METRICS_PATH:
+            self.send_error(404)
+            return
+        try:
+            body = self.server.render()
+        except Exception:
+            logging.exception("Failed to render metrics.")
+            self.send_error(500)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", _CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        """Logs the requests at debug level instead of printing them."""
+        logging.debug("metrics %s - %s", self.address_string(), format % args)
+
+
+class MetricsServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    """An HTTP server which renders the metrics on each request.
+
+    Attributes:
+        port: integer, the port which the server listens to.
+        render: the function returning the metrics as a string.
+        _thread: threading.Thread, the serving thread.
+    """
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address, port, render):
+        """Binds the server.
+
+        Args:
+            address: string, the address to listen to, e.g., "localhost".
+            port: integer, the port. 0 to choose a free port.
+            render: the function returning the metrics.
+        """
+        BaseHTTPServer.HTTPServer.__init__(self, (address, port),
+                                           _MetricsHandler)
+        self.port = self.server_address[1]
+        self.render = render
+        self._thread = None
+
+    def Start(self):
+        """Serves in a daemon thread."""
+        self._thread = threading.Thread(target=self.serve_forever)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def Stop(self):
+        """Stops serving and closes the socket."""
+        self.shutdown()
+        self.server_close()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
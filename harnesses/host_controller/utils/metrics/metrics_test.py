@@ -0,0 +1,121 @@
+#!/usr/bin/env python
+#
+# Copyright (C) 2018 The Android Open Source Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+
+import unittest
+import urllib2
+
+from host_controller.utils.metrics import metrics
+from host_controller.utils.metrics import metrics_server
+
+
+class MetricsTest(unittest.TestCase):
+    """Tests for metrics and metrics_server."""
+
+    def setUp(self):
+        """Creates a registry."""
+        self._registry = metrics.Registry()
+        self._counter = self._registry.Counter("test_bytes_total",
+                                               "Test bytes.", ("provider", ))
+        self._histogram = self._registry.Histogram(
+            "test_seconds", "Test durations.", ("serial", ), (1, 10))
+        self._gauge = self._registry.Gauge("test_devices", "Test devices.",
+                                           ("status", ))
+
+    def testRender(self):
+        """Tests the text format of the counters and histograms."""
+        self._counter.Inc(100, provider="pab")
+        self._counter.Inc(50, provider="pab")
+        self._histogram.Observe(0.5, serial="s1")
+        self._histogram.Observe(5, serial="s1")
+        self._histogram.Observe(50, serial="s1")
+        self._registry.AddCollector(
+            lambda: [(self._gauge, {"status": "use"}, 2)])
+        lines = self._registry.Render().splitlines()
+        self.assertEqual([
+            "# HELP test_bytes_total Test bytes.",
+            "# TYPE test_bytes_total counter",
+            'test_bytes_total{provider="pab"} 150',
+            "# HELP test_seconds Test durations.",
+            "# TYPE test_seconds histogram",
+            'test_seconds_bucket{serial="s1",le="1"} 1',
+            'test_seconds_bucket{serial="s1",le="10"} 2',
+            'test_seconds_bucket{serial="s1",le="+Inf"} 3',
+            'test_seconds_sum{serial="s1"} 55.5',
+            'test_seconds_count{serial="s1"} 3',
+            "# HELP test_devices Test devices.",
+            "# TYPE test_devices gauge",
+            'test_devices{status="use"} 2',
+        ], lines)
+
+    def testMergeSnapshots(self):
+        """Tests adding the values of another process."""
+        self._counter.Inc(1, provider="gcs")
+        self._histogram.Observe(2, serial="s1")
+        other = self._registry.Snapshot()
+        self._counter.Inc(1, provider="ab")
+        merged = metrics.MergeSnapshots([self._registry.Snapshot(), other])
+        self.assertEqual(2, merged[("test_bytes_total", ("gcs", ))])
+        self.assertEqual(1, merged[("test_bytes_total", ("ab", ))])
+        self.assertEqual([0, 2, 0, 4, 2], merged[("test_seconds", ("s1", ))])
+        self.assertEqual(1, other[("test_bytes_total", ("gcs", ))])
+
+    def testMerge(self):
+        """Tests adding the snapshot of another process to a registry."""
+        self._histogram.Observe(2, serial="s1")
+        other = self._registry.Snapshot()
+        self._registry.Merge(other)
+        self._registry.Merge({("test_bytes_total", ("gcs", )): 3})
+        snapshot = self._registry.Snapshot()
+        self.assertEqual([0, 2, 0, 4, 2], snapshot[("test_seconds", ("s1", ))])
+        self.assertEqual(3, snapshot[("test_bytes_total", ("gcs", ))])
+
+    def testRequestTimer(self):
+        """Tests that the failed requests are counted."""
+        metrics.GetRegistry().Clear()
+        with metrics.RequestTimer("vti", "LeaseJob"):
+            pass
+        with self.assertRaises(IOError):
+            with metrics.RequestTimer("vti", "LeaseJob"):
+                raise IOError("test")
+        snapshot = metrics.GetRegistry().Snapshot()
+        self.assertEqual(
+            2, snapshot[("host_controller_request_seconds",
+                         ("vti", "LeaseJob"))][-1])
+        self.assertEqual(
+            1, snapshot[("host_controller_request_errors_total",
+                         ("vti", "LeaseJob"))])
+        metrics.GetRegistry().Clear()
+
+    def testMetricsServer(self):
+        """Tests serving the metrics over HTTP."""
+        self._counter.Inc(3, provider="pab")
+        server = metrics_server.MetricsServer("localhost", 0,
+                                              self._registry.Render)
+        server.Start()
+        try:
+            url = "http://localhost:%d" % server.port
+            body = urllib2.urlopen(url + metrics_server.METRICS_PATH).read()
+            with self.assertRaises(urllib2.HTTPError):
+                urllib2.urlopen(url + "/other")
+        finally:
+            server.Stop()
+        self.assertIn('test_bytes_total{provider="pab"} 3', body)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,282 @@
+#
+# Copyright (C) 2018 The Android Open Source Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""Module to store test results in a local SQLite database."""
+
+import collections
+import errno
+import os
+import sqlite3
+import time
+
+from host_controller import common
+from host_controller.utils.result import result_parser
+
+# The time to wait for another process holding the database lock.
+_LOCK_TIMEOUT_SECS = 60
+
+# The number of test rows inserted at once.
+_INSERT_BATCH_SIZE = 1000
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    start_time REAL,
+    suite_plan TEXT,
+    build_id TEXT,
+    branch TEXT,
+    target TEXT,
+    serials TEXT,
+    result_zip TEXT,
+    passed INTEGER,
+    failed INTEGER);
+CREATE INDEX IF NOT EXISTS runs_suite_plan ON runs (suite_plan, id);
+CREATE TABLE IF NOT EXISTS modules (
+    run_id INTEGER,
+    name TEXT,
+    abi TEXT,
+    done INTEGER,
+    runtime_secs REAL,
+    passed INTEGER,
+    failed INTEGER,
+    other INTEGER);
+CREATE INDEX IF NOT EXISTS modules_name ON modules (name, run_id);
+CREATE TABLE IF NOT EXISTS tests (
+    run_id INTEGER,
+    module TEXT,
+    abi TEXT,
+    test_case TEXT,
+    test TEXT,
+    result TEXT);
+CREATE INDEX IF NOT EXISTS tests_run ON tests (run_id, result);
+CREATE INDEX IF NOT EXISTS tests_name ON tests (module, test_case, test);
+"""
+
+# The subquery selecting the IDs of the recent runs of a plan.
+_RECENT_RUNS = ("SELECT id FROM runs WHERE (:plan IS NULL OR suite_plan = "
+                ":plan) ORDER BY id DESC LIMIT :runs")
+
+RunRow = collections.namedtuple(
+    "RunRow", ["id", "start_time", "suite_plan", "build_id", "branch",
+               "target", "serials", "result_zip", "passed", "failed"])
+
+FlakyTestRow = collections.namedtuple(
+    "FlakyTestRow", ["module", "test_case", "test", "fails", "runs"])
+
+DurationRow = collections.namedtuple(
+    "DurationRow", ["module", "runs", "p50_secs", "p90_secs", "max_secs"])
+
+
+def _Percentile(sorted_values, percent):
+    """Returns the nearest-rank percentile of a sorted non-empty list."""
+    index = max(0, int(round(percent / 100.0 * len(sorted_values))) - 1)
+    return sorted_values[min(index, len(sorted_values) - 1)]
+
+
+class _RunRecorder(object):
+    """Inserts the tests of a run while its report is being parsed.
+
+    Only the tests which did not pass are stored. A test passed in a run if
+    its module completed in the run and the test is not stored.
+
+    Attributes:
+        run_id: integer, the ID of the run.
+        _conn: sqlite3.Connection.
+        _rows: list of tuples, the test rows not inserted yet.
+    """
+
+    def __init__(self, conn, run_id):
+        self.run_id = run_id
+        self._conn = conn
+        self._rows = []
+
+    def _Flush(self):
+        """Inserts the buffered test rows."""
+        if self._rows:
+            self._conn.executemany(
+                "INSERT INTO tests VALUES (?, ?, ?, ?, ?, ?)", self._rows)
+            self._rows = []
+
+    def AddTest(self, module, test_case, test, result):
+        """The callback of result_parser.ParseResult."""
+        if result == "pass":
+            return
+        self._rows.append((self.run_id, module.name, module.abi, test_case,
+                           test, result))
+        if len(self._rows) >= _INSERT_BATCH_SIZE:
+            self._Flush()
+
+    def Finish(self, summary):
+        """Inserts the modules and the totals of the run.
+
+        Args:
+            summary: result_parser.ResultSummary of the run.
+        """
+        self._Flush()
+        self._conn.executemany(
+            "INSERT INTO modules VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            [(self.run_id, module.name, module.abi, int(module.done),
+              module.runtime_secs, module.passed, module.failed, module.other)
+             for module in summary.modules])
+        self._conn.execute(
+            "UPDATE runs SET suite_plan = ?, passed = ?, failed = ? "
+            "WHERE id = ?", (summary.attributes.get("suite_plan"),
+                             summary.passed, summary.failed, self.run_id))
+
+
+class ResultDb(object):
+    """The database of the test runs on the host.
+
+    Attributes:
+        _path: string, the path to the database file.
+    """
+
+    def __init__(self, path=common._RESULT_DB_FILE):
+        self._path = path
+
+    def _Connect(self):
+        """Opens the database and creates the tables if needed.
+
+        Returns:
+            sqlite3.Connection.
+        """
+        dir_path = os.path.dirname(self._path)
+        if dir_path and not os.path.exists(dir_path):
+            try:
+                os.makedirs(dir_path)
+            except OSError as e:
+                if e.errno != errno.EEXIST:
+                    raise
+        conn = sqlite3.connect(self._path, timeout=_LOCK_TIMEOUT_SECS)
+        conn.executescript(_SCHEMA)
+        return conn
+
+    def AddResultZip(self, zip_path, build_info=None, serials=None):
+        """Parses a result zip and stores the run.
+
+        Args:
+            zip_path: string, the path to the log-result zip file.
+            build_info: dict containing "build_id", "branch" and "target",
+                        e.g., console.fetch_info.
+            serials: list of strings, the device serials.
+
+        Returns:
+            A tuple of (run ID, ResultSummary). (None, None) if the zip
+            does not contain a report.
+        """
+        build_info = build_info or {}
+        conn = self._Connect()
+        try:
+            with conn:
+                cursor = conn.execute(
+                    "INSERT INTO runs (start_time, build_id, branch, target, "
+                    "serials, result_zip) VALUES (?, ?, ?, ?, ?, ?)",
+                    (time.time(), build_info.get("build_id"),
+                     build_info.get("branch"), build_info.get("target"),
+                     ",".join(serials or []), zip_path))
+                recorder = _RunRecorder(conn, cursor.lastrowid)
+                summary = result_parser.ParseResultZip(
+                    zip_path, test_callback=recorder.AddTest)
+                if summary is None:
+                    conn.rollback()
+                    return None, None
+                recorder.Finish(summary)
+            return recorder.run_id, summary
+        finally:
+            conn.close()
+
+    def GetRuns(self, limit=20):
+        """Returns the recent runs.
+
+        Args:
+            limit: integer, the maximum number of runs.
+
+        Returns:
+            A list of RunRow, the latest first.
+        """
+        conn = self._Connect()
+        try:
+            rows = conn.execute(
+                "SELECT id, start_time, suite_plan, build_id, branch, target, "
+                "serials, result_zip, passed, failed FROM runs "
+                "ORDER BY id DESC LIMIT ?", (limit, )).fetchall()
+        finally:
+            conn.close()
+        return [RunRow(*row) for row in rows]
+
+    def GetFlakyTests(self, suite_plan=None, last_runs=10):
+        """Returns the tests which both failed and passed in recent runs.
+
+        Args:
+            suite_plan: string, the test plan. None for all plans.
+            last_runs: integer, the number of recent runs to look at.
+
+        Returns:
+            A list of FlakyTestRow, the most frequently failed first.
+        """
+        conn = self._Connect()
+        try:
+            rows = conn.execute(
+                "SELECT t.module, t.test_case, t.test, "
+                "COUNT(DISTINCT t.run_id) AS fails, "
+                "(SELECT COUNT(DISTINCT m.run_id) FROM modules m "
+                " WHERE m.name = t.module AND m.done = 1 AND m.run_id IN (" +
+                _RECENT_RUNS + ")) AS runs "
+                "FROM tests t WHERE t.result = 'fail' AND t.run_id IN (" +
+                _RECENT_RUNS + ") "
+                "GROUP BY t.module, t.test_case, t.test "
+                "HAVING fails < runs ORDER BY fails DESC, t.module, "
+                "t.test_case, t.test",
+                {"plan": suite_plan, "runs": last_runs}).fetchall()
+        finally:
+            conn.close()
+        return [FlakyTestRow(*row) for row in rows]
+
+    def GetModuleDurations(self, suite_plan=None, last_runs=10, module=None):
+        """Returns the duration percentiles of the modules in recent runs.
+
+        The duration of a module in a run is the sum of its ABIs.
+
+        Args:
+            suite_plan: string, the test plan. None for all plans.
+            last_runs: integer, the number of recent runs to look at.
+            module: string, the module name. None for all modules.
+
+        Returns:
+            A list of DurationRow sorted by the median, the longest first.
+        """
+        conn = self._Connect()
+        try:
+            rows = conn.execute(
+                "SELECT name, SUM(runtime_secs) FROM modules "
+                "WHERE done = 1 AND (:module IS NULL OR name = :module) "
+                "AND run_id IN (" + _RECENT_RUNS + ") "
+                "GROUP BY run_id, name",
+                {"plan": suite_plan, "runs": last_runs,
+                 "module": module}).fetchall()
+        finally:
+            conn.close()
+
+        durations = collections.defaultdict(list)
+        for name, secs in rows:
+            durations[name].append(secs)
+        result = []
+        for name, values in durations.iteritems():
+            values.sort()
+            result.append(DurationRow(name, len(values),
+                                      _Percentile(values, 50),
+                                      _Percentile(values, 90), values[-1]))
+        result.sort(key=lambda row: (-row.p50_secs, row.module))
+        return result
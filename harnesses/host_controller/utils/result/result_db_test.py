@@ -0,0 +1,117 @@
+#!/usr/bin/env python
+#
+# Copyright (C) 2018 The Android Open Source Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+
+import os
+import shutil
+import tempfile
+import unittest
+import zipfile
+
+from host_controller.utils.result import result_db
+from host_controller.utils.result import result_parser
+
+_RESULT_XML_TEMPLATE = """<Result suite_plan="%(plan)s">
+  <Module name="A" abi="arm64-v8a" runtime="%(runtime)d" done="true">
+    <TestCase name="Case">
+      <Test result="pass" name="stable" />
+      <Test result="%(result)s" name="flaky" />
+      <Test result="fail" name="broken" />
+    </TestCase>
+  </Module>
+  <Module name="B" abi="arm64-v8a" runtime="1000" done="true" />
+</Result>
+"""
+
+
+class ResultDbTest(unittest.TestCase):
+    """Tests for ResultDb.
+
+    Attributes:
+        _temp_dir: string, the directory containing the database.
+        _db: the ResultDb being tested.
+    """
+
+    def setUp(self):
+        """Creates a database in a temporary directory."""
+        self._temp_dir = tempfile.mkdtemp()
+        self._db = result_db.ResultDb(
+            os.path.join(self._temp_dir, "data", "results.db"))
+
+    def tearDown(self):
+        """Deletes the temporary directory."""
+        shutil.rmtree(self._temp_dir)
+
+    def _AddRun(self, index, plan="vts", runtime=2000, result="pass"):
+        """Writes a result zip and adds it to the database."""
+        zip_path = os.path.join(self._temp_dir, "%d.zip" % index)
+        with zipfile.ZipFile(zip_path, "w") as result_zip:
+            result_zip.writestr(
+                result_parser.RESULT_XML_NAME, _RESULT_XML_TEMPLATE % {
+                    "plan": plan,
+                    "runtime": runtime,
+                    "result": result
+                })
+        return self._db.AddResultZip(zip_path, {"build_id": str(index)},
+                                     ["serial1", "serial2"])
+
+    def testAddResultZip(self):
+        """Tests storing a run."""
+        run_id, summary = self._AddRun(1, result="fail")
+        self.assertEqual(2, summary.failed)
+        runs = self._db.GetRuns()
+        self.assertEqual(1, len(runs))
+        self.assertEqual(run_id, runs[0].id)
+        self.assertEqual("vts", runs[0].suite_plan)
+        self.assertEqual("1", runs[0].build_id)
+        self.assertEqual("serial1,serial2", runs[0].serials)
+        self.assertEqual((1, 2), (runs[0].passed, runs[0].failed))
+
+    def testAddResultZipWithoutReport(self):
+        """Tests that a zip without report is not stored."""
+        zip_path = os.path.join(self._temp_dir, "empty.zip")
+        with zipfile.ZipFile(zip_path, "w") as result_zip:
+            result_zip.writestr("other.xml", "")
+        self.assertEqual((None, None), self._db.AddResultZip(zip_path))
+        self.assertEqual([], self._db.GetRuns())
+
+    def testGetFlakyTests(self):
+        """Tests that only the tests both passed and failed are flaky."""
+        self._AddRun(1, result="fail")
+        self._AddRun(2, result="pass")
+        self._AddRun(3, result="fail")
+        self._AddRun(4, plan="cts", result="pass")
+        flaky = self._db.GetFlakyTests("vts", 10)
+        self.assertEqual(1, len(flaky))
+        self.assertEqual(("A", "Case", "flaky", 2, 3), tuple(flaky[0]))
+        self.assertEqual([], self._db.GetFlakyTests("vts", 1))
+        self.assertEqual(1, len(self._db.GetFlakyTests(None, 10)))
+
+    def testGetModuleDurations(self):
+        """Tests the percentiles of the module durations."""
+        for index in range(10):
+            self._AddRun(index, runtime=(index + 1) * 1000)
+        durations = self._db.GetModuleDurations("vts", 10)
+        self.assertEqual(["A", "B"], [row.module for row in durations])
+        self.assertEqual((10, 5.0, 9.0, 10.0), tuple(durations[0])[1:])
+        durations = self._db.GetModuleDurations("vts", 2, "A")
+        self.assertEqual(1, len(durations))
+        self.assertEqual((2, 9.0, 10.0, 10.0), tuple(durations[0])[1:])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,164 @@
+#
+# Copyright (C) 2018 The Android Open Source Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""Module to index the files in a result directory incrementally."""
+
+import os
+import stat
+import time
+
+from host_controller.utils.metrics import metrics
+
+# A listing is reused only if it was taken this long after the last
+# modification of the directory, so that an entry added within the
+# granularity of the file system timestamps is not missed.
+_MTIME_GRANULARITY_SECS = 1.0
+
+
+class _DirEntry(object):
+    """The cached listing of a directory.
+
+    Attributes:
+        mtime: float, the modification time of the directory.
+        scan_time: float, the time when the directory was listed.
+        files: set of strings, the names of the regular files.
+        subdirs: set of strings, the names of the subdirectories which are
+                 not symbolic links.
+    """
+
+    def __init__(self, mtime, scan_time, files, subdirs):
+        self.mtime = mtime
+        self.scan_time = scan_time
+        self.files = files
+        self.subdirs = subdirs
+
+
+class ResultIndex(object):
+    """An index of the files under a directory.
+
+    Refresh lists a directory only if its modification time has changed
+    since the last listing, and classifies only the new entries. The
+    unchanged directories cost one stat call each, so the lookups after
+    a refresh do not walk the tree again.
+
+    Attributes:
+        root: string, the indexed directory.
+        _max_depth: integer, the depth of the indexed subdirectories. 0
+                    indexes the entries of the root only. None for no limit.
+        _dirs: dict of {relative path: _DirEntry}.
+    """
+
+    def __init__(self, root, max_depth=None):
+        self.root = root
+        self._max_depth = max_depth
+        self._dirs = {}
+
+    def _ListDir(self, rel_path, mtime, cached):
+        """Lists a directory and reuses the classification of known entries.
+
+        Args:
+            rel_path: string, the path relative to the root.
+            mtime: float, the current modification time of the directory.
+            cached: _DirEntry, the previous listing. None if not listed.
+
+        Returns:
+            A tuple of (_DirEntry, list of added file names).
+        """
+        scan_time = time.time()
+        dir_path = os.path.join(self.root, rel_path)
+        files = set()
+        subdirs = set()
+        added = []
+        for name in os.listdir(dir_path):
+            if cached and name in cached.files:
+                files.add(name)
+                continue
+            if cached and name in cached.subdirs:
+                subdirs.add(name)
+                continue
+            try:
+                mode = os.lstat(os.path.join(dir_path, name)).st_mode
+            except OSError:
+                continue
+            if stat.S_ISDIR(mode):
+                subdirs.add(name)
+            elif stat.S_ISREG(mode):
+                files.add(name)
+                added.append(name)
+        return _DirEntry(mtime, scan_time, files, subdirs), added
+
+    def Refresh(self):
+        """Updates the index.
+
+        Returns:
+            A list of strings, the paths of the files added since the last
+            refresh.
+        """
+        added_paths = []
+        visited = set()
+        num_listed = 0
+        stack = [("", 0)]
+        while stack:
+            rel_path, depth = stack.pop()
+            try:
+                mtime = os.stat(os.path.join(self.root, rel_path)).st_mtime
+            except OSError:
+                continue
+            visited.add(rel_path)
+            cached = self._dirs.get(rel_path)
+            if (cached is None or cached.mtime != mtime or
+                    cached.scan_time - mtime < _MTIME_GRANULARITY_SECS):
+                try:
+                    entry, added = self._ListDir(rel_path, mtime, cached)
+                except OSError:
+                    continue
+                num_listed += 1
+                self._dirs[rel_path] = entry
+                added_paths.extend(
+                    os.path.join(self.root, rel_path, name) for name in added)
+            if self._max_depth is None or depth < self._max_depth:
+                for name in self._dirs[rel_path].subdirs:
+                    stack.append((os.path.join(rel_path, name), depth + 1))
+
+        for rel_path in list(self._dirs):
+            if rel_path not in visited:
+                del self._dirs[rel_path]
+        metrics.CACHE_REQUESTS.Inc(
+            len(visited) - num_listed, cache="result_index", result="hit")
+        metrics.CACHE_REQUESTS.Inc(
+            num_listed, cache="result_index", result="miss")
+        return sorted(added_paths)
+
+    def GetFiles(self, prefix="", suffix=""):
+        """Returns the indexed files whose names match a pattern.
+
+        Args:
+            prefix: string, the prefix of the file names.
+            suffix: string, the suffix of the file names.
+
+        Returns:
+            A sorted list of strings, the paths of the files.
+        """
+        return sorted(
+            os.path.join(self.root, rel_path, name)
+            for rel_path, entry in self._dirs.iteritems()
+            for name in entry.files
+            if name.startswith(prefix) and name.endswith(suffix))
+
+    def GetSubdirs(self):
+        """Returns a sorted list of strings, the subdirectory names of the
+        root, excluding symbolic links."""
+        entry = self._dirs.get("")
+        return sorted(entry.subdirs) if entry else []
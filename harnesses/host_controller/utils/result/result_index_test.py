@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+#
+# Copyright (C) 2018 The Android Open Source Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from host_controller.utils.result import result_index
+
+_OLD_TIME = 1500000000
+
+
+class ResultIndexTest(unittest.TestCase):
+    """Tests for ResultIndex.
+
+    Attributes:
+        _temp_dir: string, the indexed directory.
+    """
+
+    def setUp(self):
+        """Creates a temporary directory."""
+        self._temp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        """Deletes the temporary directory."""
+        shutil.rmtree(self._temp_dir)
+
+    def _WriteFile(self, *names):
+        """Creates a file and its parent directories."""
+        path = os.path.join(self._temp_dir, *names)
+        if not os.path.exists(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        with open(path, "w") as f:
+            f.write("x")
+        return path
+
+    def _SetOld(self, *names):
+        """Sets the modification time of a directory to a fixed past time."""
+        path = os.path.join(self._temp_dir, *names)
+        os.utime(path, (_OLD_TIME, _OLD_TIME))
+
+    def testRefresh(self):
+        """Tests that only the added files are returned."""
+        index = result_index.ResultIndex(self._temp_dir)
+        zip_path = self._WriteFile("a", "log-result.zip")
+        other_path = self._WriteFile("b", "c", "other.zip")
+        self._WriteFile("b", "c", "log.txt")
+        self.assertEqual(3, len(index.Refresh()))
+        self.assertEqual([zip_path],
+                         index.GetFiles(prefix="log-result", suffix=".zip"))
+        self.assertEqual([zip_path, other_path], index.GetFiles(suffix=".zip"))
+        self.assertEqual(["a", "b"], index.GetSubdirs())
+        self.assertEqual([], index.Refresh())
+
+        new_path = self._WriteFile("b", "c", "new.zip")
+        self.assertEqual([new_path], index.Refresh())
+        shutil.rmtree(os.path.join(self._temp_dir, "b"))
+        self.assertEqual([], index.Refresh())
+        self.assertEqual([zip_path], index.GetFiles(suffix=".zip"))
+
+    def testUnchangedDirectoryIsNotListed(self):
+        """Tests that a listing is reused if the directory is unchanged."""
+        index = result_index.ResultIndex(self._temp_dir)
+        self._WriteFile("a", "1.zip")
+        self._SetOld("a")
+        self._SetOld()
+        index.Refresh()
+        # A file created without updating the directory time is not seen.
+        path = self._WriteFile("a", "2.zip")
+        self._SetOld("a")
+        self.assertEqual([], index.Refresh())
+        os.utime(os.path.join(self._temp_dir, "a"), None)
+        self.assertEqual([path], index.Refresh())
+
+    def testMaxDepth(self):
+        """Tests that the subdirectories below max_depth are not indexed."""
+        index = result_index.ResultIndex(self._temp_dir, max_depth=0)
+        top_path = self._WriteFile("top.zip")
+        self._WriteFile("session", "log-result.zip")
+        os.symlink(os.path.join(self._temp_dir, "session"),
+                   os.path.join(self._temp_dir, "latest"))
+        self.assertEqual([top_path], index.Refresh())
+        self.assertEqual(["session"], index.GetSubdirs())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,214 @@
+#
+# Copyright (C) 2018 The Android Open Source Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""Module to summarize TradeFed result XML in constant memory."""
+
+import logging
+import zipfile
+
+from xml.etree import ElementTree
+
+# The name of the XML report in a result zip.
+RESULT_XML_NAME = "log-result.xml"
+
+# The maximum number of failed test names kept in a summary.
+_MAX_FAILED_TESTS = 1000
+
+# The values of Test@result counted as passed or failed.
+_PASS = "pass"
+_FAIL = "fail"
+
+
+class ModuleSummary(object):
+    """The test counts of a module.
+
+    Attributes:
+        name: string, the module name.
+        abi: string, the ABI of the module, e.g., "arm64-v8a".
+        done: boolean, whether the module completed.
+        runtime_secs: float, the run time reported by TradeFed.
+        passed: integer, the number of passed tests.
+        failed: integer, the number of failed tests.
+        other: integer, the number of tests with other results, e.g.,
+               not executed or ignored.
+        failed_tests: list of strings, the failed tests in the format of
+                      <test case>#<test>. At most _MAX_FAILED_TESTS are kept.
+    """
+
+    def __init__(self, attrib):
+        self.name = attrib.get("name", "")
+        self.abi = attrib.get("abi", "")
+        self.done = attrib.get("done", "false") == "true"
+        try:
+            self.runtime_secs = int(attrib.get("runtime", 0)) / 1000.0
+        except ValueError:
+            self.runtime_secs = 0.0
+        self.passed = 0
+        self.failed = 0
+        self.other = 0
+        self.failed_tests = []
+
+    def ToDict(self):
+        """Returns the summary as a dict of built-in types."""
+        return dict(self.__dict__)
+
+
+class ResultSummary(object):
+    """The summary of a result XML.
+
+    Attributes:
+        attributes: dict of strings, the attributes of <Result>.
+        modules: list of ModuleSummary in the order in the report.
+        passed: integer, the total number of passed tests.
+        failed: integer, the total number of failed tests.
+        failed_tests: list of strings, the failed tests in the format of
+                      <module>#<test case>#<test>, at most _MAX_FAILED_TESTS.
+        failed_tests_truncated: boolean, whether failed_tests is truncated.
+    """
+
+    def __init__(self):
+        self.attributes = {}
+        self.modules = []
+        self.passed = 0
+        self.failed = 0
+        self.failed_tests = []
+        self.failed_tests_truncated = False
+
+    def ToDict(self):
+        """Returns the summary to be stored in console.test_result.
+
+        Returns:
+            A dict of built-in types.
+        """
+        return {
+            "modules": [module.ToDict() for module in self.modules],
+            "total_pass": self.passed,
+            "total_fail": self.failed,
+            "failed_tests": list(self.failed_tests),
+            "failed_tests_truncated": self.failed_tests_truncated,
+            "runtime_secs": sum(module.runtime_secs
+                                for module in self.modules),
+        }
+
+
+def ParseResult(report_file, max_failed_tests=_MAX_FAILED_TESTS,
+                test_callback=None):
+    """Summarizes a result XML without building the whole tree.
+
+    Each element is cleared when its end tag is parsed, and the root is
+    cleared after every module, so the memory usage does not grow with the
+    size of the report.
+
+    Args:
+        report_file: the file object or the path of the XML report.
+        max_failed_tests: integer, the maximum number of failed test names
+                          kept in the summary and in each module.
+        test_callback: the function called for each test with the
+                       ModuleSummary, the test case name, the test name
+                       and the result string.
+
+    Returns:
+        A ResultSummary object.
+    """
+    summary = ResultSummary()
+    root = None
+    module = None
+    test_case_name = ""
+    for event, elem in ElementTree.iterparse(report_file, ("start", "end")):
+        if event == "start":
+            if root is None:
+                root = elem
+            if elem.tag == "Result":
+                summary.attributes = dict(elem.attrib)
+            elif elem.tag == "Module":
+                module = ModuleSummary(elem.attrib)
+            elif elem.tag == "TestCase":
+                test_case_name = elem.get("name", "")
+            continue
+
+        if elem.tag == "Test" and module is not None:
+            result = elem.get("result")
+            if test_callback:
+                test_callback(module, test_case_name, elem.get("name", ""),
+                              result)
+            if result == _PASS:
+                module.passed += 1
+            elif result == _FAIL:
+                module.failed += 1
+                test_name = "%s#%s" % (test_case_name, elem.get("name", ""))
+                if len(module.failed_tests) < max_failed_tests:
+                    module.failed_tests.append(test_name)
+                if len(summary.failed_tests) < max_failed_tests:
+                    summary.failed_tests.append(
+                        "%s#%s" % (module.name, test_name))
+                else:
+                    summary.failed_tests_truncated = True
+            else:
+                module.other += 1
+            elem.clear()
+        elif elem.tag == "TestCase":
+            elem.clear()
+        elif elem.tag == "Module" and module is not None:
+            summary.modules.append(module)
+            summary.passed += module.passed
+            summary.failed += module.failed
+            module = None
+            root.clear()
+    return summary
+
+
+def MergeSummaries(summaries, max_failed_tests=_MAX_FAILED_TESTS):
+    """Merges the summaries of the runs of a test plan.
+
+    Args:
+        summaries: list of ResultSummary objects.
+        max_failed_tests: integer, the maximum number of failed test names
+                          kept in the merged summary.
+
+    Returns:
+        A ResultSummary object. The attributes are the ones of the first
+        summary.
+    """
+    merged = ResultSummary()
+    for summary in summaries:
+        if not merged.attributes:
+            merged.attributes = dict(summary.attributes)
+        merged.modules.extend(summary.modules)
+        merged.passed += summary.passed
+        merged.failed += summary.failed
+        room = max_failed_tests - len(merged.failed_tests)
+        merged.failed_tests.extend(summary.failed_tests[:room])
+        if (summary.failed_tests_truncated or
+                len(summary.failed_tests) > room):
+            merged.failed_tests_truncated = True
+    return merged
+
+
+def ParseResultZip(zip_path, test_callback=None):
+    """Summarizes the result XML in a result zip.
+
+    Args:
+        zip_path: string, the path to the log-result zip file.
+        test_callback: the function called for each test. See ParseResult.
+
+    Returns:
+        A ResultSummary object. None if the zip does not contain the XML.
+    """
+    with zipfile.ZipFile(zip_path, mode="r") as result_zip:
+        if RESULT_XML_NAME not in result_zip.namelist():
+            logging.warning("%s doesn't contain %s", zip_path, RESULT_XML_NAME)
+            return None
+        with result_zip.open(RESULT_XML_NAME, mode="rU") as result_xml:
+            return ParseResult(result_xml, test_callback=test_callback)
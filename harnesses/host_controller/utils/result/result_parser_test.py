@@ -0,0 +1,107 @@
+#!/usr/bin/env python
+#
+# Copyright (C) 2018 The Android Open Source Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import os
+import shutil
+import tempfile
+import unittest
+import zipfile
+
+from StringIO import StringIO
+
+from host_controller.utils.result import result_parser
+
+_RESULT_XML = """<?xml version='1.0' encoding='UTF-8' standalone='no' ?>
+<Result suite_plan="vts" suite_name="VTS">
+  <Build build_id="1234" />
+  <Summary pass="3" failed="2" />
+  <Module name="VtsKernelLtp" abi="arm64-v8a" runtime="1500" done="true">
+    <TestCase name="Syscalls">
+      <Test result="pass" name="open01" />
+      <Test result="fail" name="open02">
+        <Failure message="failed" />
+      </Test>
+    </TestCase>
+  </Module>
+  <Module name="VtsHalBase" abi="arm64-v8a" runtime="500" done="false">
+    <TestCase name="Base">
+      <Test result="pass" name="test1" />
+      <Test result="pass" name="test2" />
+      <Test result="fail" name="test3" />
+      <Test result="IGNORED" name="test4" />
+    </TestCase>
+  </Module>
+</Result>
+"""
+
+
+class ResultParserTest(unittest.TestCase):
+    """Tests for result_parser."""
+
+    def testParseResult(self):
+        """Tests the per-module counts and the failed tests."""
+        summary = result_parser.ParseResult(StringIO(_RESULT_XML))
+        self.assertEqual("vts", summary.attributes["suite_plan"])
+        self.assertEqual(3, summary.passed)
+        self.assertEqual(2, summary.failed)
+        self.assertEqual(["VtsKernelLtp#Syscalls#open02",
+                          "VtsHalBase#Base#test3"], summary.failed_tests)
+        self.assertFalse(summary.failed_tests_truncated)
+
+        ltp, base = summary.modules
+        self.assertEqual("VtsKernelLtp", ltp.name)
+        self.assertTrue(ltp.done)
+        self.assertEqual(1.5, ltp.runtime_secs)
+        self.assertEqual((1, 1, 0), (ltp.passed, ltp.failed, ltp.other))
+        self.assertEqual(["Syscalls#open02"], ltp.failed_tests)
+        self.assertFalse(base.done)
+        self.assertEqual((2, 1, 1), (base.passed, base.failed, base.other))
+
+        result = summary.ToDict()
+        self.assertEqual(2.0, result["runtime_secs"])
+        self.assertEqual("VtsHalBase", result["modules"][1]["name"])
+
+    def testParseResultTruncated(self):
+        """Tests the limit on the number of failed tests."""
+        summary = result_parser.ParseResult(
+            StringIO(_RESULT_XML), max_failed_tests=1)
+        self.assertEqual(2, summary.failed)
+        self.assertEqual(["VtsKernelLtp#Syscalls#open02"],
+                         summary.failed_tests)
+        self.assertTrue(summary.failed_tests_truncated)
+
+    def testParseResultZip(self):
+        """Tests reading the XML from a result zip."""
+        temp_dir = tempfile.mkdtemp()
+        try:
+            zip_path = os.path.join(temp_dir, "log-result.zip")
+            with zipfile.ZipFile(zip_path, "w") as result_zip:
+                result_zip.writestr(result_parser.RESULT_XML_NAME,
+                                    _RESULT_XML)
+            summary = result_parser.ParseResultZip(zip_path)
+            self.assertEqual(2, len(summary.modules))
+
+            empty_path = os.path.join(temp_dir, "empty.zip")
+            with zipfile.ZipFile(empty_path, "w") as result_zip:
+                result_zip.writestr("other.xml", _RESULT_XML)
+            self.assertIsNone(result_parser.ParseResultZip(empty_path))
+        finally:
+            shutil.rmtree(temp_dir)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,70 @@
+#
+# Copyright (C) 2018 The Android Open Source Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""Module to split test modules into shards of balanced durations."""
+
+import heapq
+
+
+class Shard(object):
+    """A set of modules assigned to one device.
+
+    Attributes:
+        modules: list of strings, the module names.
+        total_secs: float, the sum of the estimated durations.
+    """
+
+    def __init__(self):
+        self.modules = []
+        self.total_secs = 0.0
+
+
+def PlanShards(durations, num_shards):
+    """Assigns modules to shards by longest-processing-time-first.
+
+    The modules are sorted by duration in descending order, and each one is
+    assigned to the shard with the least total duration so far.
+
+    Args:
+        durations: dict of {module name: seconds}.
+        num_shards: integer, the number of shards.
+
+    Returns:
+        A list of num_shards Shard objects. The modules in each shard are
+        sorted by name.
+
+    Raises:
+        ValueError if num_shards is less than 1.
+    """
+    if num_shards < 1:
+        raise ValueError("Invalid number of shards: %d" % num_shards)
+
+    shards = [Shard() for _ in range(num_shards)]
+    heap = [(0.0, index) for index in range(num_shards)]
+    for name, secs in sorted(
+            durations.iteritems(), key=lambda item: (-item[1], item[0])):
+        total_secs, index = heapq.heappop(heap)
+        shards[index].modules.append(name)
+        shards[index].total_secs = total_secs + secs
+        heapq.heappush(heap, (shards[index].total_secs, index))
+
+    for shard in shards:
+        shard.modules.sort()
+    return shards
+
+
+def GetLightestShardIndex(shards):
+    """Returns the index of the shard with the least total duration."""
+    return min(range(len(shards)), key=lambda index: shards[index].total_secs)
@@ -0,0 +1,48 @@
+#!/usr/bin/env python
+#
+# Copyright (C) 2018 The Android Open Source Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import unittest
+
+from host_controller.utils.result import shard_planner
+
+
+class ShardPlannerTest(unittest.TestCase):
+    """Tests for shard_planner."""
+
+    def testPlanShards(self):
+        """Tests longest-processing-time-first assignment."""
+        durations = {"a": 70, "b": 60, "c": 50, "d": 40, "e": 30, "f": 10}
+        shards = shard_planner.PlanShards(durations, 3)
+        self.assertEqual([["a", "f"], ["b", "e"], ["c", "d"]],
+                         [shard.modules for shard in shards])
+        self.assertEqual([80, 90, 90],
+                         [shard.total_secs for shard in shards])
+        self.assertEqual(0, shard_planner.GetLightestShardIndex(shards))
+
+    def testPlanShardsMoreShardsThanModules(self):
+        """Tests that extra shards are empty."""
+        shards = shard_planner.PlanShards({"a": 1}, 2)
+        self.assertEqual([["a"], []], [shard.modules for shard in shards])
+        self.assertEqual(1, shard_planner.GetLightestShardIndex(shards))
+
+    def testPlanShardsInvalid(self):
+        """Tests an invalid number of shards."""
+        self.assertRaises(ValueError, shard_planner.PlanShards, {}, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,108 @@
+#
+# Copyright (C) 2018 The Android Open Source Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""Module to load console script files with a cache."""
+
+import hashlib
+import imp
+import logging
+import os
+import sys
+import threading
+
+from host_controller.utils.metrics import metrics
+
+# The prefix of the names of the loaded script modules in sys.modules.
+_MODULE_NAME_PREFIX = "host_controller_script_"
+
+
+def _GetModuleName(path):
+    """Returns the unique module name of a script path."""
+    return _MODULE_NAME_PREFIX + hashlib.md5(path).hexdigest()
+
+
+class ScriptLoader(object):
+    """Loads script files and caches the modules.
+
+    A script is compiled again only if its modification time or size
+    changes. Each path is loaded as a separate module, so the scripts used
+    concurrently do not replace each other. As a cached module is reused,
+    the module-level variables of a script persist between the calls.
+
+    Attributes:
+        _modules: dict of {absolute path: ((mtime, size), module)}.
+        _lock: threading.Lock, protects _modules.
+    """
+
+    def __init__(self):
+        self._modules = {}
+        self._lock = threading.Lock()
+
+    def Load(self, path):
+        """Returns the module of a script file.
+
+        Args:
+            path: string, the path to the .py file.
+
+        Returns:
+            The module object.
+
+        Raises:
+            IOError or OSError if the file cannot be read.
+            SyntaxError if the file cannot be compiled.
+            Any exception raised by the module-level code of the script.
+        """
+        path = os.path.abspath(path)
+        file_stat = os.stat(path)
+        version = (file_stat.st_mtime, file_stat.st_size)
+        with self._lock:
+            cached = self._modules.get(path)
+            if cached and cached[0] == version:
+                metrics.CACHE_REQUESTS.Inc(cache="script", result="hit")
+                return cached[1]
+            metrics.CACHE_REQUESTS.Inc(cache="script", result="miss")
+
+            with open(path, "rU") as script_file:
+                code = compile(script_file.read(), path, "exec")
+            name = _GetModuleName(path)
+            module = imp.new_module(name)
+            module.__file__ = path
+            exec code in module.__dict__
+            sys.modules[name] = module
+            self._modules[path] = (version, module)
+            logging.debug("Loaded %s as %s", path, name)
+            return module
+
+    def Clear(self):
+        """Removes all cached modules."""
+        with self._lock:
+            for path in self._modules:
+                sys.modules.pop(_GetModuleName(path), None)
+            self._modules.clear()
+
+
+_loader = ScriptLoader()
+
+
+def LoadScript(path):
+    """Loads a script with the cache shared by the process.
+
+    Args:
+        path: string, the path to the .py file.
+
+    Returns:
+        The module object.
+    """
+    return _loader.Load(path)
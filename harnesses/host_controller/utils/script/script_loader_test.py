@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+#
+# Copyright (C) 2018 The Android Open Source Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+from host_controller.utils.script import script_loader
+
+_SCRIPT = """
+LOAD_COUNT = globals().get("LOAD_COUNT", 0) + 1
+
+def EmitConsoleCommands():
+    return [%r]
+"""
+
+
+class ScriptLoaderTest(unittest.TestCase):
+    """Tests for ScriptLoader.
+
+    Attributes:
+        _temp_dir: string, the directory containing the scripts.
+        _loader: the ScriptLoader being tested.
+    """
+
+    def setUp(self):
+        """Creates a loader and a temporary directory."""
+        self._temp_dir = tempfile.mkdtemp()
+        self._loader = script_loader.ScriptLoader()
+
+    def tearDown(self):
+        """Deletes the modules and the temporary directory."""
+        self._loader.Clear()
+        shutil.rmtree(self._temp_dir)
+
+    def _WriteScript(self, name, command, mtime=None):
+        """Writes a script which emits a command."""
+        path = os.path.join(self._temp_dir, name)
+        with open(path, "w") as script_file:
+            script_file.write(_SCRIPT % command)
+        if mtime is not None:
+            os.utime(path, (mtime, mtime))
+        return path
+
+    def testLoadCache(self):
+        """Tests that a script is compiled again only after a change."""
+        path = self._WriteScript("a.py", "info", 1000)
+        module = self._loader.Load(path)
+        self.assertEqual(["info"], module.EmitConsoleCommands())
+        self.assertIs(module, self._loader.Load(path))
+
+        self._WriteScript("a.py", "list", 2000)
+        reloaded = self._loader.Load(path)
+        self.assertIsNot(module, reloaded)
+        self.assertEqual(["list"], reloaded.EmitConsoleCommands())
+        self.assertEqual(1, reloaded.LOAD_COUNT)
+
+    def testModuleNames(self):
+        """Tests that the scripts are loaded as different modules."""
+        module_a = self._loader.Load(self._WriteScript("a.py", "info"))
+        module_b = self._loader.Load(self._WriteScript("b.py", "list"))
+        self.assertNotEqual(module_a.__name__, module_b.__name__)
+        self.assertEqual(["info"], module_a.EmitConsoleCommands())
+        self.assertIs(module_b, sys.modules[module_b.__name__])
+        self._loader.Clear()
+        self.assertNotIn(module_b.__name__, sys.modules)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,246 @@
+#
+# Copyright (C) 2018 The Android Open Source Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""Module to save and restore the console state across restarts.
+
+The snapshot is a JSON file containing the console dicts, the states of the
+build providers, and the size and modification time of every file path
+found in them. When the snapshot is loaded, the entries referring to
+recorded files which are missing or modified are dropped, so that the
+console refetches them.
+"""
+
+import errno
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import time
+
+# The format version of the snapshot file.
+_VERSION = 1
+
+# The size of the blocks read to compute digests.
+_DIGEST_BLOCK_SIZE = 1024 * 1024
+
+
+def _ToStr(value):
+    """Converts the unicode strings loaded from JSON to byte strings."""
+    if isinstance(value, unicode):
+        return value.encode("utf-8")
+    if isinstance(value, list):
+        return [_ToStr(item) for item in value]
+    if isinstance(value, dict):
+        return dict((_ToStr(key), _ToStr(item))
+                    for key, item in value.iteritems())
+    return value
+
+
+def _FindPaths(value):
+    """Yields the absolute paths in a JSON-serializable value."""
+    if isinstance(value, basestring):
+        if os.path.isabs(value):
+            yield value
+    elif isinstance(value, list):
+        for item in value:
+            for path in _FindPaths(item):
+                yield path
+    elif isinstance(value, dict):
+        for item in value.itervalues():
+            for path in _FindPaths(item):
+                yield path
+
+
+def _GetDigest(path):
+    """Returns the MD5 hex digest of a file."""
+    md5 = hashlib.md5()
+    with open(path, "rb") as data_file:
+        while True:
+            data = data_file.read(_DIGEST_BLOCK_SIZE)
+            if not data:
+                break
+            md5.update(data)
+    return md5.hexdigest()
+
+
+def _DescribeFile(path, digest):
+    """Returns the record of an existing path.
+
+    Args:
+        path: string, the path to a file or a directory.
+        digest: boolean, whether to compute the digest of the file.
+
+    Returns:
+        A dict. None if the path doesn't exist.
+    """
+    if os.path.isdir(path):
+        return {"dir": True}
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    record = {"size": stat.st_size, "mtime": stat.st_mtime}
+    if digest:
+        record["md5"] = _GetDigest(path)
+    return record
+
+
+def _IsValidFile(path, record):
+    """Returns whether a path matches its record in the snapshot."""
+    if record.get("dir"):
+        return os.path.isdir(path)
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return False
+    if stat.st_size != record["size"]:
+        return False
+    if "md5" in record:
+        return _GetDigest(path) == record["md5"]
+    return stat.st_mtime == record["mtime"]
+
+
+def _FilterSerializable(entries):
+    """Returns the dict entries which can be written to JSON.
+
+    Args:
+        entries: dict, a console dict or a part of a provider state.
+
+    Returns:
+        A new dict without the entries which are not serializable.
+    """
+    result = {}
+    for key, value in entries.iteritems():
+        try:
+            json.dumps({key: value})
+        except (TypeError, ValueError):
+            logging.warning("Skip saving %s: not serializable.", key)
+            continue
+        result[key] = value
+    return result
+
+
+def SaveSnapshot(path, state, providers, digest=False):
+    """Writes the console state to a file atomically.
+
+    Args:
+        path: string, the path to the snapshot file.
+        state: dict of {attribute name: dict}, the console dicts.
+        providers: dict of {fetch type: dict}, the states returned by
+                   BuildProvider.GetState.
+        digest: boolean, whether to store the MD5 digests of the files in
+                addition to their sizes. Loading such a snapshot reads all
+                the files.
+
+    Returns:
+        integer, the number of files recorded in the snapshot.
+    """
+    state = dict((name, _FilterSerializable(entries))
+                 for name, entries in state.iteritems())
+    providers = dict(
+        (fetch_type, dict((key, _FilterSerializable(value)
+                           if isinstance(value, dict) else value)
+                          for key, value in provider_state.iteritems()))
+        for fetch_type, provider_state in providers.iteritems())
+
+    files = {}
+    for file_path in _FindPaths([state, providers]):
+        if file_path not in files:
+            record = _DescribeFile(file_path, digest)
+            if record is not None:
+                files[file_path] = record
+
+    dir_path = os.path.dirname(os.path.abspath(path))
+    if not os.path.exists(dir_path):
+        try:
+            os.makedirs(dir_path)
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                raise
+    fd, temp_path = tempfile.mkstemp(dir=dir_path, suffix=".tmp")
+    with os.fdopen(fd, "w") as temp_file:
+        json.dump({
+            "version": _VERSION,
+            "time": time.time(),
+            "state": state,
+            "providers": providers,
+            "files": files,
+        }, temp_file, indent=1, sort_keys=True)
+    os.rename(temp_path, path)
+    return len(files)
+
+
+def _DropInvalidEntries(entries, invalid_paths, prefix, dropped):
+    """Removes the dict entries referring to invalid paths.
+
+    Args:
+        entries: dict, the entries to be checked in place.
+        invalid_paths: set of strings, the missing or modified paths.
+        prefix: string, the prefix of the names in dropped.
+        dropped: list of strings, where the dropped names are appended.
+    """
+    for key in sorted(entries):
+        if any(file_path in invalid_paths
+               for file_path in _FindPaths(entries[key])):
+            del entries[key]
+            dropped.append("%s:%s" % (prefix, key))
+
+
+def LoadSnapshot(path):
+    """Reads and validates the console state in a file.
+
+    Args:
+        path: string, the path to the snapshot file.
+
+    Returns:
+        A tuple of (state, providers, dropped). state and providers are in
+        the formats of SaveSnapshot's arguments. dropped is a list of
+        strings, the names of the entries removed because their files are
+        missing or modified. (None, None, None) if the file cannot be read.
+    """
+    try:
+        with open(path, "r") as snapshot_file:
+            snapshot = _ToStr(json.load(snapshot_file))
+    except (IOError, ValueError) as e:
+        logging.error("Cannot load %s: %s", path, e)
+        return None, None, None
+    if snapshot.get("version") != _VERSION:
+        logging.error("Unknown snapshot version: %s",
+                      snapshot.get("version"))
+        return None, None, None
+
+    files = snapshot.get("files", {})
+    invalid_paths = set(file_path
+                        for file_path, record in files.iteritems()
+                        if not _IsValidFile(file_path, record))
+    dropped = []
+
+    providers = {}
+    for fetch_type, provider_state in snapshot["providers"].iteritems():
+        tmp_dirpath = provider_state.get("tmp_dirpath")
+        if not tmp_dirpath or not os.path.isdir(tmp_dirpath):
+            dropped.append("provider:%s" % fetch_type)
+            continue
+        for key, value in provider_state.iteritems():
+            if isinstance(value, dict):
+                _DropInvalidEntries(value, invalid_paths,
+                                    "%s.%s" % (fetch_type, key), dropped)
+        providers[fetch_type] = provider_state
+
+    state = snapshot["state"]
+    for name, entries in state.iteritems():
+        _DropInvalidEntries(entries, invalid_paths, name, dropped)
+    return state, providers, dropped
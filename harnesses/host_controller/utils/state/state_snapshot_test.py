@@ -0,0 +1,139 @@
+#!/usr/bin/env python
+#
+# Copyright (C) 2018 The Android Open Source Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from host_controller.utils.state import state_snapshot
+
+
+class StateSnapshotTest(unittest.TestCase):
+    """Tests for state_snapshot.
+
+    Attributes:
+        _temp_dir: The path to the temporary directory for test files.
+        _snapshot_path: The path to the snapshot file.
+    """
+
+    def setUp(self):
+        """Creates temporary directory."""
+        self._temp_dir = tempfile.mkdtemp()
+        self._snapshot_path = os.path.join(self._temp_dir, "state",
+                                           "snapshot.json")
+
+    def tearDown(self):
+        """Deletes temporary directory."""
+        shutil.rmtree(self._temp_dir)
+
+    def _CreateFile(self, name, content="data"):
+        """Creates a file and returns its path."""
+        path = os.path.join(self._temp_dir, name)
+        with open(path, "w") as data_file:
+            data_file.write(content)
+        return path
+
+    def _Save(self, digest=False):
+        """Saves a state containing two images and a provider."""
+        self._boot = self._CreateFile("boot.img")
+        self._system = self._CreateFile("system.img")
+        self._provider_dir = os.path.join(self._temp_dir, "provider")
+        os.mkdir(self._provider_dir)
+        state = {
+            "device_image_info": {
+                "boot.img": self._boot,
+                "system.img": self._system,
+            },
+            "fetch_info": {
+                "build_id": "1234",
+                "fetch_signature": object(),
+            },
+        }
+        providers = {
+            "pab": {
+                "tmp_dirpath": self._provider_dir,
+                "device_images": {"boot.img": self._boot},
+                "test_suites": {},
+            }
+        }
+        return state_snapshot.SaveSnapshot(self._snapshot_path, state,
+                                           providers, digest)
+
+    def testSaveAndLoad(self):
+        """Tests loading the saved state without changes."""
+        self.assertEqual(3, self._Save())
+        state, providers, dropped = state_snapshot.LoadSnapshot(
+            self._snapshot_path)
+        self.assertEqual([], dropped)
+        self.assertEqual({"build_id": "1234"}, state["fetch_info"])
+        self.assertEqual({"boot.img": self._boot, "system.img": self._system},
+                         state["device_image_info"])
+        self.assertIsInstance(state["device_image_info"]["boot.img"], str)
+        self.assertEqual(self._provider_dir, providers["pab"]["tmp_dirpath"])
+        self.assertEqual({"boot.img": self._boot},
+                         providers["pab"]["device_images"])
+
+    def testLoadModifiedFile(self):
+        """Tests that the entries of a modified file are dropped."""
+        self._Save()
+        self._CreateFile("boot.img", "modified")
+        state, providers, dropped = state_snapshot.LoadSnapshot(
+            self._snapshot_path)
+        self.assertEqual(["pab.device_images:boot.img",
+                          "device_image_info:boot.img"], dropped)
+        self.assertEqual({"system.img": self._system},
+                         state["device_image_info"])
+        self.assertEqual({}, providers["pab"]["device_images"])
+
+    def testLoadDigest(self):
+        """Tests that the digest detects a file modified in place."""
+        self._Save(digest=True)
+        with open(self._snapshot_path, "r") as snapshot_file:
+            snapshot = json.load(snapshot_file)
+        self.assertIn("md5", snapshot["files"][self._system])
+        stat = os.stat(self._system)
+        self._CreateFile("system.img", "DATA")
+        os.utime(self._system, (stat.st_atime, stat.st_mtime))
+        state, _, dropped = state_snapshot.LoadSnapshot(self._snapshot_path)
+        self.assertEqual(["device_image_info:system.img"], dropped)
+        self.assertNotIn("system.img", state["device_image_info"])
+
+    def testLoadMissingProviderDir(self):
+        """Tests that a provider without temp dir is dropped."""
+        self._Save()
+        shutil.rmtree(self._provider_dir)
+        state, providers, dropped = state_snapshot.LoadSnapshot(
+            self._snapshot_path)
+        self.assertEqual({}, providers)
+        self.assertEqual(["provider:pab"], dropped)
+        self.assertEqual(2, len(state["device_image_info"]))
+
+    def testLoadInvalidFile(self):
+        """Tests loading a missing or corrupted snapshot."""
+        self.assertEqual((None, None, None),
+                         state_snapshot.LoadSnapshot(self._snapshot_path))
+        self._CreateFile("corrupted.json", "{")
+        self.assertEqual((None, None, None),
+                         state_snapshot.LoadSnapshot(
+                             os.path.join(self._temp_dir, "corrupted.json")))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,120 @@
+#
+# Copyright (C) 2018 The Android Open Source Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""Module to sample the stacks of all threads periodically.
+
+cProfile records the calling thread only. The sampler complements it by
+finding where the other threads, e.g., the sub-commands of a parallel
+command and the download threads, spend time.
+"""
+
+import collections
+import os
+import sys
+import threading
+
+FunctionSamples = collections.namedtuple(
+    "FunctionSamples", ["function", "self_samples", "total_samples"])
+
+
+def _GetFunctionName(code):
+    """Returns the name of a function in the format of pstats."""
+    return "%s:%d(%s)" % (os.path.basename(code.co_filename),
+                          code.co_firstlineno, code.co_name)
+
+
+class StackSampler(object):
+    """Counts the functions on the stacks of the threads.
+
+    Usage:
+        with StackSampler(0.01) as sampler:
+            ...
+        sampler.GetTopFunctions(20)
+
+    Attributes:
+        num_samples: integer, the number of thread stacks sampled.
+        _interval_secs: float, the interval between samples.
+        _self_counts: Counter of {function name: samples}, the samples in
+                      which the function is on the top of the stack.
+        _total_counts: Counter of {function name: samples}, the samples in
+                       which the function is on the stack.
+        _stop_event: threading.Event, set to stop sampling.
+        _thread: threading.Thread, the sampling thread.
+    """
+
+    def __init__(self, interval_secs):
+        self.num_samples = 0
+        self._interval_secs = interval_secs
+        self._self_counts = collections.Counter()
+        self._total_counts = collections.Counter()
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def __enter__(self):
+        self.Start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.Stop()
+
+    def _Sample(self):
+        """Records the stacks of the threads except the sampling thread."""
+        own_id = threading.current_thread().ident
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == own_id:
+                continue
+            self._self_counts[_GetFunctionName(frame.f_code)] += 1
+            names = set()
+            while frame is not None:
+                names.add(_GetFunctionName(frame.f_code))
+                frame = frame.f_back
+            self._total_counts.update(names)
+            self.num_samples += 1
+
+    def _Run(self):
+        """Samples until Stop is called."""
+        while not self._stop_event.wait(self._interval_secs):
+            self._Sample()
+
+    def Start(self):
+        """Starts the sampling thread."""
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._Run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def Stop(self):
+        """Stops the sampling thread and waits for it."""
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
+    def GetTopFunctions(self, count):
+        """Returns the functions found in the most samples.
+
+        Args:
+            count: integer, the maximum number of functions.
+
+        Returns:
+            A list of FunctionSamples sorted by total_samples.
+        """
+        return [
+            FunctionSamples(name, self._self_counts[name], total)
+            for name, total in sorted(
+                self._total_counts.iteritems(),
+                key=lambda item: (-item[1], -self._self_counts[item[0]],
+                                  item[0]))[:count]
+        ]
@@ -0,0 +1,66 @@
+#!/usr/bin/env python
+#
+# Copyright (C) 2018 The Android Open Source Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+
+import threading
+import time
+import unittest
+
+from host_controller.utils.trace import stack_sampler
+
+
+def _BusyLoop(stop_event):
+    """Keeps the thread busy until the event is set."""
+    while not stop_event.is_set():
+        sum(range(100))
+
+
+class StackSamplerTest(unittest.TestCase):
+    """Tests for stack_sampler."""
+
+    def testSampleThread(self):
+        """Tests that a busy thread appears in the samples."""
+        stop_event = threading.Event()
+        thread = threading.Thread(target=_BusyLoop, args=(stop_event, ))
+        thread.start()
+        try:
+            with stack_sampler.StackSampler(0.001) as sampler:
+                time.sleep(0.1)
+        finally:
+            stop_event.set()
+            thread.join()
+
+        self.assertGreater(sampler.num_samples, 0)
+        functions = dict((function.function, function)
+                         for function in sampler.GetTopFunctions(100))
+        busy_loop = [name for name in functions if "(_BusyLoop)" in name]
+        self.assertEqual(1, len(busy_loop))
+        self.assertTrue(busy_loop[0].startswith("stack_sampler_test.py:"))
+        self.assertGreater(functions[busy_loop[0]].total_samples, 0)
+        self.assertFalse(any("(_Run)" in name for name in functions))
+
+    def testGetTopFunctions(self):
+        """Tests the order and the limit of the top functions."""
+        sampler = stack_sampler.StackSampler(1)
+        sampler._total_counts.update({"a": 1, "b": 3, "c": 3})
+        sampler._self_counts.update({"c": 2})
+        self.assertEqual([("c", 2, 3), ("b", 0, 3)],
+                         sampler.GetTopFunctions(2))
+
+
+if __name__ == "__main__":
+    unittest.main()
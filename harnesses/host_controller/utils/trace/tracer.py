@@ -0,0 +1,211 @@
+#
+# Copyright (C) 2018 The Android Open Source Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""Module to record nested spans of the host controller's work.
+
+The spans are kept in a bounded in-memory buffer and exported in the
+Chrome trace-event format, which can be opened in chrome://tracing or
+Perfetto as a flame chart:
+
+    with tracer.Span("flash system", category="flash", serial=serial) as span:
+        ...
+        span.args["bytes"] = os.path.getsize(image_path)
+
+    @tracer.Traced(category="fetch")
+    def Fetch(self, path):
+        ...
+
+A span is recorded when it ends. The spans of a thread nest by their
+start times and durations.
+"""
+
+import collections
+import functools
+import json
+import os
+import threading
+import time
+
+# The maximum number of spans kept in memory. The oldest spans are dropped.
+_MAX_EVENTS = 100000
+
+# The recorded spans, each a tuple of (name, category, start time,
+# duration, process ID, thread ID, job ID, args). deque.append is atomic,
+# so recording does not take a lock.
+_events = collections.deque(maxlen=_MAX_EVENTS)
+
+# The job ID of each thread.
+_thread_local = threading.local()
+
+_enabled = True
+
+
+def SetEnabled(enabled):
+    """Enables or disables recording spans.
+
+    Args:
+        enabled: boolean.
+    """
+    global _enabled
+    _enabled = enabled
+
+
+def IsEnabled():
+    """Returns whether the spans are recorded."""
+    return _enabled
+
+
+def SetJobId(job_id):
+    """Sets the job which the following spans of this thread belong to.
+
+    Args:
+        job_id: the job ID, or None if the thread is not in a job.
+    """
+    _thread_local.job_id = job_id
+
+
+def GetJobId():
+    """Returns the job ID of the current thread."""
+    return getattr(_thread_local, "job_id", None)
+
+
+class Span(object):
+    """Context manager which records the duration of a block.
+
+    Attributes:
+        name: string, the name shown in the trace.
+        category: string, the category of the span, e.g., "command".
+        args: dict, the details shown in the trace, e.g., "serial" and
+              "bytes". They can be updated inside the block.
+        _start_time: float, the time when the block is entered.
+    """
+
+    def __init__(self, name, category="", **args):
+        self.name = name
+        self.category = category
+        self.args = args
+        self._start_time = None
+
+    def __enter__(self):
+        self._start_time = time.time()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if not _enabled or self._start_time is None:
+            return False
+        if exc_type is not None:
+            self.args["error"] = exc_type.__name__
+        _events.append((self.name, self.category, self._start_time,
+                        time.time() - self._start_time, os.getpid(),
+                        threading.current_thread().ident, GetJobId(),
+                        self.args))
+        return False
+
+
+def Traced(name=None, category=""):
+    """Returns a decorator which records each call of a function as a span.
+
+    Args:
+        name: string, the span name. Default: the function name.
+        category: string, the span category.
+    """
+
+    def Decorator(func):
+        span_name = name or func.__name__
+
+        @functools.wraps(func)
+        def Wrapper(*args, **kwargs):
+            with Span(span_name, category):
+                return func(*args, **kwargs)
+
+        return Wrapper
+
+    return Decorator
+
+
+def GetEvents(job_id=None):
+    """Returns the recorded spans.
+
+    Args:
+        job_id: the job ID. None for all spans.
+
+    Returns:
+        A list of tuples, the oldest first. See _events.
+    """
+    events = list(_events)
+    if job_id is not None:
+        events = [event for event in events if event[6] == job_id]
+    return events
+
+
+def AddEvents(events, job_id=None):
+    """Adds the spans recorded in another process.
+
+    Args:
+        events: list of tuples returned by GetEvents in the other process.
+        job_id: the job ID of the spans which don't belong to a job in the
+                other process. None to keep them without a job.
+    """
+    if not _enabled:
+        return
+    for event in events:
+        if event[6] is None and job_id is not None:
+            event = event[:6] + (job_id, ) + event[7:]
+        _events.append(event)
+
+
+def Clear():
+    """Drops all recorded spans."""
+    _events.clear()
+
+
+def _ToTraceEvent(event):
+    """Converts a span to a Chrome complete event."""
+    name, category, start_time, duration, pid, tid, job_id, args = event
+    trace_args = dict(args)
+    if job_id is not None:
+        trace_args["job"] = job_id
+    return {
+        "name": name,
+        "cat": category,
+        "ph": "X",
+        "ts": int(start_time * 1000000),
+        "dur": int(duration * 1000000),
+        "pid": pid,
+        "tid": tid,
+        "args": trace_args,
+    }
+
+
+def ExportChromeTrace(path, job_id=None):
+    """Writes the recorded spans as Chrome trace-event JSON.
+
+    Args:
+        path: string, the path to the output file.
+        job_id: the job ID. None for all spans.
+
+    Returns:
+        The number of exported spans.
+    """
+    events = GetEvents(job_id)
+    dir_path = os.path.dirname(path)
+    if dir_path and not os.path.exists(dir_path):
+        os.makedirs(dir_path)
+    with open(path, "w") as trace_file:
+        json.dump({
+            "traceEvents": [_ToTraceEvent(event) for event in events],
+            "displayTimeUnit": "ms",
+        }, trace_file)
+    return len(events)
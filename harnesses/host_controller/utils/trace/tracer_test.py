@@ -0,0 +1,113 @@
+#!/usr/bin/env python
+#
+# Copyright (C) 2018 The Android Open Source Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from host_controller.utils.trace import tracer
+
+
+class TracerTest(unittest.TestCase):
+    """Tests for tracer."""
+
+    def setUp(self):
+        """Clears the spans."""
+        tracer.Clear()
+        tracer.SetEnabled(True)
+        self._temp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        """Clears the spans and deletes the temporary directory."""
+        tracer.Clear()
+        tracer.SetJobId(None)
+        shutil.rmtree(self._temp_dir)
+
+    def testNestedSpans(self):
+        """Tests that the outer span contains the inner span."""
+        with tracer.Span("outer", "command", line="fetch") as outer:
+            with tracer.Span("inner", "flash", serial="s1") as inner:
+                inner.args["bytes"] = 10
+            outer.args["done"] = True
+        events = tracer.GetEvents()
+        self.assertEqual(["inner", "outer"], [event[0] for event in events])
+        inner_event, outer_event = events
+        self.assertEqual({"serial": "s1", "bytes": 10}, inner_event[7])
+        self.assertEqual({"line": "fetch", "done": True}, outer_event[7])
+        self.assertLessEqual(outer_event[2], inner_event[2])
+        self.assertGreaterEqual(outer_event[2] + outer_event[3],
+                                inner_event[2] + inner_event[3])
+
+    def testTracedException(self):
+        """Tests that a failed call is recorded with the error."""
+
+        @tracer.Traced(category="build")
+        def Fail():
+            raise IOError("test")
+
+        self.assertRaises(IOError, Fail)
+        name, category, _, _, _, _, _, args = tracer.GetEvents()[0]
+        self.assertEqual(("Fail", "build"), (name, category))
+        self.assertEqual({"error": "IOError"}, args)
+
+    def testDisabled(self):
+        """Tests that no span is recorded when disabled."""
+        tracer.SetEnabled(False)
+        with tracer.Span("ignored"):
+            pass
+        tracer.SetEnabled(True)
+        self.assertEqual([], tracer.GetEvents())
+
+    def testExportChromeTraceByJob(self):
+        """Tests exporting the spans of a job."""
+        tracer.SetJobId(1)
+        with tracer.Span("job1", "command"):
+            pass
+        tracer.SetJobId(2)
+        with tracer.Span("job2", "command"):
+            pass
+        path = os.path.join(self._temp_dir, "sub", "trace.json")
+        self.assertEqual(1, tracer.ExportChromeTrace(path, job_id=1))
+        with open(path, "r") as trace_file:
+            trace = json.load(trace_file)
+        self.assertEqual(1, len(trace["traceEvents"]))
+        event = trace["traceEvents"][0]
+        self.assertEqual("job1", event["name"])
+        self.assertEqual("X", event["ph"])
+        self.assertEqual({"job": 1}, event["args"])
+        self.assertEqual(os.getpid(), event["pid"])
+
+    def testAddEvents(self):
+        """Tests adding the spans of another process to a job."""
+        with tracer.Span("child", "flash"):
+            pass
+        tracer.SetJobId(3)
+        with tracer.Span("child job", "flash"):
+            pass
+        events = tracer.GetEvents()
+        tracer.Clear()
+        tracer.AddEvents(events, job_id=1)
+        self.assertEqual([("child", 1), ("child job", 3)],
+                         [(event[0], event[6])
+                          for event in tracer.GetEvents()])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,350 @@
+#
+# Copyright (C) 2018 The Android Open Source Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""Module to upload test results to Google Cloud Storage."""
+
+import logging
+import os
+import Queue
+import threading
+import time
+
+from host_controller.utils.cmd import cmd_watchdog
+
+# The interval between two scans of the watched directory.
+_DEFAULT_POLL_INTERVAL_SECS = 10
+
+# A file is uploaded during the test after it is not modified for this time.
+_DEFAULT_SETTLE_SECS = 30
+
+# The deadline of one gsutil command.
+_UPLOAD_TIMEOUT_SECS = 1800
+
+# The default number of files uploaded concurrently.
+DEFAULT_NUM_WORKERS = 4
+
+# The default number of attempts to upload a file.
+DEFAULT_MAX_ATTEMPTS = 3
+
+_BYTES_PER_MB = 1024.0 * 1024.0
+
+
+def _CopyFile(gsutil_path, src_path, dest_path):
+    """Copies a file to GCS with gsutil.
+
+    Args:
+        gsutil_path: string, the path to gsutil.
+        src_path: string, the local path.
+        dest_path: string, the GCS URL.
+
+    Returns:
+        A tuple of (return code, stderr).
+    """
+    _, stderr, return_code = cmd_watchdog.ExecuteOneShellCommand(
+        "%s cp %s %s" % (gsutil_path, src_path, dest_path),
+        _UPLOAD_TIMEOUT_SECS)
+    return return_code, stderr
+
+
+class IncrementalUploader(object):
+    """Uploads the files in a directory while they are being generated.
+
+    A background thread scans the directory periodically, and uploads the
+    files which have not been modified for a while. A file is uploaded
+    again if it changes afterwards. Stop uploads the remaining files
+    concurrently, so only the files written at the end of the test are left
+    for the tail.
+
+    Attributes:
+        dest_url: string, the GCS URL of the destination directory.
+        _gsutil_path: string, the path to gsutil.
+        _num_workers: integer, the number of concurrent gsutil commands
+                      uploading the remaining files on Stop.
+        _src_dir: string, the watched directory.
+        _poll_interval_secs: float, the interval between two scans.
+        _settle_secs: float, the minimum age of a file to be uploaded during
+                      the test.
+        _uploaded: dict of {relative path: (size, mtime)}, the state of the
+                   files when they are uploaded.
+        _failed: set of strings, the relative paths which failed to upload.
+        _stop_event: threading.Event, set to stop the thread.
+        _thread: threading.Thread, the uploading thread.
+    """
+
+    def __init__(self,
+                 gsutil_path,
+                 src_dir,
+                 dest_url,
+                 poll_interval_secs=_DEFAULT_POLL_INTERVAL_SECS,
+                 settle_secs=_DEFAULT_SETTLE_SECS,
+                 num_workers=DEFAULT_NUM_WORKERS):
+        self.dest_url = dest_url.rstrip("/")
+        self._gsutil_path = gsutil_path
+        self._num_workers = num_workers
+        self._src_dir = src_dir
+        self._poll_interval_secs = poll_interval_secs
+        self._settle_secs = settle_secs
+        self._uploaded = {}
+        self._failed = set()
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def _ListChangedFiles(self, min_age_secs):
+        """Lists the files which are not uploaded in their current state.
+
+        Args:
+            min_age_secs: float, the minimum time since the last
+                          modification.
+
+        Returns:
+            A list of (relative path, (size, mtime)).
+        """
+        changed = []
+        now = time.time()
+        for dir_path, _, file_names in os.walk(self._src_dir):
+            for file_name in file_names:
+                path = os.path.join(dir_path, file_name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                if now - stat.st_mtime < min_age_secs:
+                    continue
+                rel_path = os.path.relpath(path, self._src_dir)
+                state = (stat.st_size, stat.st_mtime)
+                if self._uploaded.get(rel_path) != state:
+                    changed.append((rel_path, state))
+        return sorted(changed)
+
+    def _GetDestPath(self, rel_path):
+        """Returns the GCS URL of a file in the watched directory."""
+        return "%s/%s" % (self.dest_url, rel_path.replace(os.sep, "/"))
+
+    def _UploadFile(self, rel_path):
+        """Copies a file to the destination.
+
+        Args:
+            rel_path: string, the path relative to the watched directory.
+
+        Returns:
+            True if the file is uploaded; False otherwise.
+        """
+        src_path = os.path.join(self._src_dir, rel_path)
+        dest_path = self._GetDestPath(rel_path)
+        return_code, stderr = _CopyFile(self._gsutil_path, src_path,
+                                        dest_path)
+        if return_code:
+            logging.error("Failed to upload %s: %s", src_path, stderr)
+            return False
+        logging.info("Uploaded %s to %s", src_path, dest_path)
+        return True
+
+    def _UploadChangedFiles(self, min_age_secs):
+        """Uploads the changed files once.
+
+        Args:
+            min_age_secs: float, the minimum time since the last
+                          modification.
+        """
+        for rel_path, state in self._ListChangedFiles(min_age_secs):
+            if self._UploadFile(rel_path):
+                self._uploaded[rel_path] = state
+                self._failed.discard(rel_path)
+            else:
+                self._failed.add(rel_path)
+
+    def _Loop(self):
+        """Uploads the settled files until Stop is called."""
+        while not self._stop_event.wait(self._poll_interval_secs):
+            self._UploadChangedFiles(self._settle_secs)
+
+    def Start(self):
+        """Starts watching the directory."""
+        self._thread = threading.Thread(target=self._Loop)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def Stop(self):
+        """Stops watching and uploads all remaining files.
+
+        Returns:
+            A list of strings, the relative paths which failed to upload.
+        """
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+        changed = dict(self._ListChangedFiles(0))
+        if changed:
+            paths = dict((os.path.join(self._src_dir, rel_path), rel_path)
+                         for rel_path in changed)
+            report = ParallelUploader(
+                self._gsutil_path, self._num_workers).UploadToPaths(
+                    [(src_path, self._GetDestPath(rel_path))
+                     for src_path, rel_path in paths.iteritems()])
+            for src_path in report.uploaded:
+                rel_path = paths[src_path]
+                self._uploaded[rel_path] = changed[rel_path]
+                self._failed.discard(rel_path)
+            self._failed.update(paths[src_path] for src_path in report.failed)
+        return sorted(self._failed)
+
+    def GetUploadedFiles(self):
+        """Returns a list of strings, the relative paths uploaded so far."""
+        return sorted(self._uploaded)
+
+
+class UploadReport(object):
+    """The result of a ParallelUploader.Upload call.
+
+    Attributes:
+        uploaded: list of strings, the uploaded local paths.
+        failed: list of strings, the local paths which failed to upload.
+        missing: list of strings, the local paths which are not found when
+                 the upload starts. They are not uploaded.
+        num_bytes: integer, the total size of the uploaded files.
+        elapsed_secs: float, the wall time of the upload.
+        attempts: integer, the number of gsutil commands executed.
+    """
+
+    def __init__(self):
+        self.uploaded = []
+        self.failed = []
+        self.missing = []
+        self.num_bytes = 0
+        self.elapsed_secs = 0.0
+        self.attempts = 0
+
+    @property
+    def throughput_mbps(self):
+        """The aggregate throughput in MB/s."""
+        if self.elapsed_secs <= 0:
+            return 0.0
+        return self.num_bytes / _BYTES_PER_MB / self.elapsed_secs
+
+    def __str__(self):
+        return ("Uploaded %d files (%.1f MB) in %.1f seconds, %.2f MB/s. "
+                "%d failed. %d missing." % (len(self.uploaded),
+                                            self.num_bytes / _BYTES_PER_MB,
+                                            self.elapsed_secs,
+                                            self.throughput_mbps,
+                                            len(self.failed),
+                                            len(self.missing)))
+
+
+class ParallelUploader(object):
+    """Uploads multiple files concurrently with retries.
+
+    Attributes:
+        _gsutil_path: string, the path to gsutil.
+        _num_workers: integer, the number of concurrent gsutil commands.
+        _max_attempts: integer, the number of attempts per file.
+    """
+
+    def __init__(self,
+                 gsutil_path,
+                 num_workers=DEFAULT_NUM_WORKERS,
+                 max_attempts=DEFAULT_MAX_ATTEMPTS):
+        self._gsutil_path = gsutil_path
+        self._num_workers = max(1, num_workers)
+        self._max_attempts = max(1, max_attempts)
+
+    @staticmethod
+    def _GetDestPath(src_path, dest_url, num_files):
+        """Returns the GCS URL of a file.
+
+        As gsutil cp does, a single file is copied to dest_url unless it
+        ends with "/"; multiple files are copied into dest_url.
+        """
+        if num_files == 1 and not dest_url.endswith("/"):
+            return dest_url
+        return "%s/%s" % (dest_url.rstrip("/"), os.path.basename(src_path))
+
+    def _Worker(self, queue, report, lock):
+        """Uploads the files in the queue until it is empty."""
+        while True:
+            try:
+                src_path, dest_path, size = queue.get_nowait()
+            except Queue.Empty:
+                return
+            for attempt in range(1, self._max_attempts + 1):
+                return_code, stderr = _CopyFile(self._gsutil_path, src_path,
+                                                dest_path)
+                with lock:
+                    report.attempts += 1
+                if not return_code:
+                    break
+                logging.warning("Attempt %d to upload %s failed: %s",
+                                attempt, src_path, stderr)
+            with lock:
+                if return_code:
+                    report.failed.append(src_path)
+                else:
+                    report.uploaded.append(src_path)
+                    report.num_bytes += size
+
+    def Upload(self, src_paths, dest_url):
+        """Uploads files and waits for completion.
+
+        Args:
+            src_paths: list of strings, the local paths.
+            dest_url: string, the GCS URL of the destination.
+
+        Returns:
+            An UploadReport object.
+        """
+        return self.UploadToPaths(
+            [(src_path, self._GetDestPath(src_path, dest_url, len(src_paths)))
+             for src_path in src_paths])
+
+    def UploadToPaths(self, files):
+        """Uploads files to their own destinations and waits for completion.
+
+        Args:
+            files: list of (local path, GCS URL of the file).
+
+        Returns:
+            An UploadReport object.
+        """
+        report = UploadReport()
+        sized_files = []
+        for src_path, dest_path in files:
+            try:
+                size = os.path.getsize(src_path)
+            except OSError as e:
+                # The file may be deleted or rotated after being listed.
+                logging.warning("Skipped %s: %s", src_path, e)
+                report.missing.append(src_path)
+                continue
+            sized_files.append((src_path, dest_path, size))
+        queue = Queue.Queue()
+        # The largest files start first so that they don't end up last.
+        for sized_file in sorted(sized_files, key=lambda x: x[2],
+                                 reverse=True):
+            queue.put(sized_file)
+        lock = threading.Lock()
+        start_time = time.time()
+        threads = []
+        for _ in range(min(self._num_workers, len(sized_files))):
+            thread = threading.Thread(
+                target=self._Worker, args=(queue, report, lock))
+            thread.daemon = True
+            thread.start()
+            threads.append(thread)
+        for thread in threads:
+            thread.join()
+        report.elapsed_secs = time.time() - start_time
+        logging.info(str(report))
+        return report
@@ -0,0 +1,166 @@
+#!/usr/bin/env python
+#
+# Copyright (C) 2018 The Android Open Source Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from host_controller.utils.upload import gcs_uploader
+
+# A fake gsutil which copies gs://<path> to <bucket dir>/<path>, and fails
+# to copy the files named "fail".
+_FAKE_GSUTIL = """#!/bin/sh
+[ "$(basename "$2")" = fail ] && exit 1
+dest="%s/${3#gs://}"
+mkdir -p "$(dirname "$dest")" && cp "$2" "$dest"
+"""
+
+
+class GcsUploaderTest(unittest.TestCase):
+    """Tests for gcs_uploader with a fake gsutil.
+
+    Attributes:
+        _temp_dir: string, the temporary directory.
+        _src_dir: string, the directory to upload.
+        _bucket_dir: string, the directory simulating GCS.
+        _gsutil_path: string, the path to the fake gsutil.
+    """
+
+    def setUp(self):
+        """Creates the directories and the fake gsutil."""
+        self._temp_dir = tempfile.mkdtemp()
+        self._src_dir = os.path.join(self._temp_dir, "src")
+        self._bucket_dir = os.path.join(self._temp_dir, "bucket")
+        os.makedirs(os.path.join(self._src_dir, "logs"))
+        self._gsutil_path = os.path.join(self._temp_dir, "gsutil")
+        with open(self._gsutil_path, "w") as gsutil_file:
+            gsutil_file.write(_FAKE_GSUTIL % self._bucket_dir)
+        os.chmod(self._gsutil_path, 0755)
+
+    def tearDown(self):
+        """Deletes the temporary directory."""
+        shutil.rmtree(self._temp_dir)
+
+    def _WriteFile(self, rel_path, content, age_secs):
+        """Writes a file in the source directory with an old mtime."""
+        path = os.path.join(self._src_dir, rel_path)
+        with open(path, "w") as src_file:
+            src_file.write(content)
+        mtime = time.time() - age_secs
+        os.utime(path, (mtime, mtime))
+
+    def _ReadUploadedFile(self, rel_path):
+        """Returns the content of an uploaded file. None if not uploaded."""
+        path = os.path.join(self._bucket_dir, "results", rel_path)
+        if not os.path.exists(path):
+            return None
+        with open(path, "r") as uploaded_file:
+            return uploaded_file.read()
+
+    def testIncrementalUpload(self):
+        """Tests that settled files are uploaded before Stop."""
+        self._WriteFile(os.path.join("logs", "host_log.zip"), "log", 100)
+        self._WriteFile("log-result.zip", "partial", 0)
+        uploader = gcs_uploader.IncrementalUploader(
+            self._gsutil_path, self._src_dir, "gs://results/",
+            poll_interval_secs=0.05, settle_secs=10)
+        uploader.Start()
+        deadline = time.time() + 10
+        while not uploader.GetUploadedFiles() and time.time() < deadline:
+            time.sleep(0.05)
+        self.assertEqual("log", self._ReadUploadedFile("logs/host_log.zip"))
+        self.assertIsNone(self._ReadUploadedFile("log-result.zip"))
+
+        self._WriteFile("log-result.zip", "final", 0)
+        self.assertEqual([], uploader.Stop())
+        self.assertEqual("final", self._ReadUploadedFile("log-result.zip"))
+        self.assertEqual(["log-result.zip", os.path.join("logs",
+                                                         "host_log.zip")],
+                         uploader.GetUploadedFiles())
+
+    def testStopFailure(self):
+        """Tests that Stop returns the files failed to upload."""
+        self._WriteFile("fail", "", 0)
+        uploader = gcs_uploader.IncrementalUploader(
+            self._gsutil_path, self._src_dir, "gs://results")
+        self.assertEqual(["fail"], uploader.Stop())
+
+    def testStopUploadsConcurrently(self):
+        """Tests that Stop uploads the remaining files in parallel."""
+        slow_gsutil_path = os.path.join(self._temp_dir, "slow_gsutil")
+        with open(slow_gsutil_path, "w") as gsutil_file:
+            gsutil_file.write("#!/bin/sh\nsleep 0.5\nexec %s \"$@\"\n" %
+                              self._gsutil_path)
+        os.chmod(slow_gsutil_path, 0755)
+        rel_paths = ["a.zip", "b.zip", "c.zip",
+                     os.path.join("logs", "host_log.zip")]
+        for rel_path in rel_paths:
+            self._WriteFile(rel_path, rel_path, 0)
+        uploader = gcs_uploader.IncrementalUploader(
+            slow_gsutil_path, self._src_dir, "gs://results", num_workers=4)
+        start_time = time.time()
+        self.assertEqual([], uploader.Stop())
+        self.assertLess(time.time() - start_time, 1.5)
+        self.assertEqual(sorted(rel_paths), uploader.GetUploadedFiles())
+        self.assertEqual(os.path.join("logs", "host_log.zip"),
+                         self._ReadUploadedFile("logs/host_log.zip"))
+
+    def testParallelUpload(self):
+        """Tests uploading files into a directory with retries."""
+        for name in ("a.zip", "b.zip", "fail"):
+            self._WriteFile(name, name, 0)
+        uploader = gcs_uploader.ParallelUploader(self._gsutil_path,
+                                                 num_workers=2,
+                                                 max_attempts=2)
+        report = uploader.Upload(
+            [os.path.join(self._src_dir, name)
+             for name in ("a.zip", "b.zip", "fail")], "gs://results/dir")
+        self.assertEqual("a.zip", self._ReadUploadedFile("dir/a.zip"))
+        self.assertEqual("b.zip", self._ReadUploadedFile("dir/b.zip"))
+        self.assertEqual(2, len(report.uploaded))
+        self.assertEqual([os.path.join(self._src_dir, "fail")],
+                         report.failed)
+        self.assertEqual(10, report.num_bytes)
+        self.assertEqual(4, report.attempts)
+
+    def testParallelUploadMissingFile(self):
+        """Tests that a file deleted after listing is reported as missing."""
+        self._WriteFile("a.zip", "a", 0)
+        missing_path = os.path.join(self._src_dir, "rotated.log")
+        uploader = gcs_uploader.ParallelUploader(self._gsutil_path)
+        report = uploader.UploadToPaths(
+            [(os.path.join(self._src_dir, "a.zip"), "gs://results/a.zip"),
+             (missing_path, "gs://results/rotated.log")])
+        self.assertEqual("a", self._ReadUploadedFile("a.zip"))
+        self.assertEqual([missing_path], report.missing)
+        self.assertEqual([], report.failed)
+        self.assertEqual(1, report.num_bytes)
+        self.assertIn("1 missing", str(report))
+
+    def testParallelUploadSingleFile(self):
+        """Tests uploading a file to an object name."""
+        self._WriteFile("a.zip", "a", 0)
+        report = gcs_uploader.ParallelUploader(self._gsutil_path).Upload(
+            [os.path.join(self._src_dir, "a.zip")], "gs://results/renamed")
+        self.assertEqual("a", self._ReadUploadedFile("renamed"))
+        self.assertEqual([], report.failed)
+
+
+if __name__ == "__main__":
+    unittest.main()
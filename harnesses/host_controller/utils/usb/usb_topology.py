@@ -0,0 +1,226 @@
+#
+# Copyright (C) 2018 The Android Open Source Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""Module to schedule flashing according to the USB topology of devices."""
+
+import contextlib
+import errno
+import fcntl
+import logging
+import os
+import tempfile
+import time
+
+from host_controller import common
+
+# The sysfs directory listing the USB devices on Linux.
+_SYSFS_USB_DEVICES = "/sys/bus/usb/devices"
+
+# The default directory of the lock files shared by host controller processes.
+_DEFAULT_LOCK_DIR = os.path.join(tempfile.gettempdir(), "vts_hc_usb_locks")
+
+# The interval between attempts to acquire a slot.
+_POLL_INTERVAL_SECS = 1
+
+
+def _ReadSysfsAttr(dir_path, attr_name):
+    """Reads an attribute file in sysfs.
+
+    Args:
+        dir_path: string, the sysfs directory of a USB device.
+        attr_name: string, the attribute file name.
+
+    Returns:
+        The stripped content of the file. None if the file is not readable.
+    """
+    try:
+        with open(os.path.join(dir_path, attr_name), "r") as attr_file:
+            return attr_file.read().strip()
+    except IOError:
+        return None
+
+
+class UsbDevice(object):
+    """The location of a device in the USB tree.
+
+    Attributes:
+        serial: string, the device serial.
+        port_path: string, the sysfs name such as "1-2.3" which is the bus
+                   number followed by the port chain.
+        busnum: string, the bus number.
+        hub: string, the port path of the parent hub, or the root hub name.
+    """
+
+    def __init__(self, serial, port_path, busnum):
+        self.serial = serial
+        self.port_path = port_path
+        self.busnum = busnum
+        if "." in port_path:
+            self.hub = port_path.rsplit(".", 1)[0]
+        else:
+            self.hub = "usb%s" % busnum
+
+
+def ListUsbDevices(sysfs_root=_SYSFS_USB_DEVICES):
+    """Lists the USB devices which report serial numbers.
+
+    Interfaces (e.g., 1-2.3:1.0) and root hubs (e.g., usb1) are skipped.
+
+    Args:
+        sysfs_root: string, the sysfs directory listing USB devices.
+
+    Returns:
+        A dict of {serial: UsbDevice}. Empty if sysfs is not available.
+    """
+    try:
+        names = os.listdir(sysfs_root)
+    except OSError:
+        return {}
+
+    devices = {}
+    for name in names:
+        if ":" in name or name.startswith("usb"):
+            continue
+        dir_path = os.path.join(sysfs_root, name)
+        serial = _ReadSysfsAttr(dir_path, "serial")
+        busnum = _ReadSysfsAttr(dir_path, "busnum")
+        if not serial or not busnum:
+            continue
+        devices[serial] = UsbDevice(serial, name, busnum)
+    return devices
+
+
+def GetBusSpeedMbps(busnum, sysfs_root=_SYSFS_USB_DEVICES):
+    """Returns the speed of a USB bus.
+
+    Args:
+        busnum: string, the bus number.
+        sysfs_root: string, the sysfs directory listing USB devices.
+
+    Returns:
+        integer, the speed of the root hub in Mbps. None if unknown.
+    """
+    speed = _ReadSysfsAttr(os.path.join(sysfs_root, "usb%s" % busnum),
+                           "speed")
+    try:
+        return int(float(speed))
+    except (TypeError, ValueError):
+        return None
+
+
+class FlashScheduler(object):
+    """Limits the number of concurrent flashes on each USB bus.
+
+    The number of slots on a bus is the bus speed divided by the bandwidth
+    budget of one flash. Slots are lock files locked with flock, so the
+    limit is shared by the threads and the processes (e.g., job pool
+    processes) on the host.
+
+    Attributes:
+        _lock_dir: string, the directory containing the lock files.
+        _per_flash_mbps: integer, the bandwidth budget of one flash.
+                         0 disables scheduling.
+        _sysfs_root: string, the sysfs directory listing USB devices.
+    """
+
+    def __init__(self,
+                 per_flash_mbps=common._USB_FLASH_BANDWIDTH_MBPS,
+                 lock_dir=_DEFAULT_LOCK_DIR,
+                 sysfs_root=_SYSFS_USB_DEVICES):
+        self._per_flash_mbps = per_flash_mbps
+        self._lock_dir = lock_dir
+        self._sysfs_root = sysfs_root
+
+    def GetMaxConcurrentFlashes(self, busnum):
+        """Returns the number of devices that can flash on a bus at once.
+
+        Args:
+            busnum: string, the bus number.
+
+        Returns:
+            integer, at least 1.
+        """
+        speed = GetBusSpeedMbps(busnum, self._sysfs_root)
+        if not speed:
+            return 1
+        return max(1, speed // self._per_flash_mbps)
+
+    def _TryLock(self, lock_path):
+        """Tries to lock a file without blocking.
+
+        Args:
+            lock_path: string, the path to the lock file.
+
+        Returns:
+            The locked file object. None if the file is locked by others.
+        """
+        lock_file = open(lock_path, "a")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except IOError as e:
+            lock_file.close()
+            if e.errno in (errno.EAGAIN, errno.EACCES):
+                return None
+            raise
+        return lock_file
+
+    @contextlib.contextmanager
+    def Slot(self, serial):
+        """Waits for a free flash slot on the bus of a device.
+
+        Devices not found in sysfs are not limited.
+
+        Args:
+            serial: string, the device serial.
+        """
+        usb_device = None
+        if self._per_flash_mbps > 0 and serial:
+            usb_device = ListUsbDevices(self._sysfs_root).get(serial)
+        if usb_device is None:
+            yield
+            return
+
+        max_flashes = self.GetMaxConcurrentFlashes(usb_device.busnum)
+        if not os.path.exists(self._lock_dir):
+            try:
+                os.makedirs(self._lock_dir)
+            except OSError as e:
+                if e.errno != errno.EEXIST:
+                    raise
+        lock_paths = [
+            os.path.join(self._lock_dir, "bus%s.slot%d" % (usb_device.busnum,
+                                                          index))
+            for index in range(max_flashes)
+        ]
+
+        lock_file = None
+        start_time = time.time()
+        while lock_file is None:
+            for lock_path in lock_paths:
+                lock_file = self._TryLock(lock_path)
+                if lock_file:
+                    break
+            else:
+                time.sleep(_POLL_INTERVAL_SECS)
+
+        wait_secs = time.time() - start_time
+        logging.info("%s (%s) got flash slot %s after %.1f seconds.", serial,
+                     usb_device.port_path, os.path.basename(lock_file.name),
+                     wait_secs)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+            lock_file.close()
@@ -0,0 +1,125 @@
+#!/usr/bin/env python
+#
+# Copyright (C) 2018 The Android Open Source Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+from host_controller.utils.usb import usb_topology
+
+
+class UsbTopologyTest(unittest.TestCase):
+    """Tests for usb_topology with a fake sysfs directory.
+
+    Attributes:
+        _temp_dir: string, the temporary directory for sysfs and locks.
+        _sysfs_root: string, the fake /sys/bus/usb/devices.
+        _lock_dir: string, the directory of the lock files.
+    """
+
+    def setUp(self):
+        """Creates a USB 2.0 bus with two devices behind a hub and a USB 3.0
+        bus with one device."""
+        self._temp_dir = tempfile.mkdtemp()
+        self._sysfs_root = os.path.join(self._temp_dir, "sysfs")
+        self._lock_dir = os.path.join(self._temp_dir, "locks")
+        self._AddEntry("usb1", speed="480", busnum="1")
+        self._AddEntry("usb2", speed="5000", busnum="2")
+        self._AddEntry("1-2", busnum="1")
+        self._AddEntry("1-2.1", serial="ABC001", busnum="1")
+        self._AddEntry("1-2.1:1.0", serial="ABC001", busnum="1")
+        self._AddEntry("1-2.2", serial="ABC002", busnum="1")
+        self._AddEntry("2-1", serial="ABC003", busnum="2")
+
+    def tearDown(self):
+        """Deletes the temporary directory."""
+        shutil.rmtree(self._temp_dir)
+
+    def _AddEntry(self, name, **attrs):
+        """Creates a fake sysfs directory for a USB device.
+
+        Args:
+            name: string, the directory name.
+            **attrs: the attribute file names and contents.
+        """
+        dir_path = os.path.join(self._sysfs_root, name)
+        os.makedirs(dir_path)
+        for attr_name, value in attrs.items():
+            with open(os.path.join(dir_path, attr_name), "w") as attr_file:
+                attr_file.write(value + "\n")
+
+    def _CreateScheduler(self, per_flash_mbps=300):
+        """Creates a FlashScheduler with the fake sysfs."""
+        return usb_topology.FlashScheduler(per_flash_mbps, self._lock_dir,
+                                           self._sysfs_root)
+
+    def testListUsbDevices(self):
+        """Tests finding devices and their hubs."""
+        devices = usb_topology.ListUsbDevices(self._sysfs_root)
+        self.assertEqual(["ABC001", "ABC002", "ABC003"], sorted(devices))
+        self.assertEqual("1-2.1", devices["ABC001"].port_path)
+        self.assertEqual("1", devices["ABC001"].busnum)
+        self.assertEqual("1-2", devices["ABC001"].hub)
+        self.assertEqual("usb2", devices["ABC003"].hub)
+
+    def testListUsbDevicesWithoutSysfs(self):
+        """Tests that no device is found on hosts without sysfs."""
+        self.assertEqual({}, usb_topology.ListUsbDevices(
+            os.path.join(self._temp_dir, "not_exist")))
+
+    def testGetMaxConcurrentFlashes(self):
+        """Tests the number of slots derived from bus speed."""
+        scheduler = self._CreateScheduler()
+        self.assertEqual(1, scheduler.GetMaxConcurrentFlashes("1"))
+        self.assertEqual(16, scheduler.GetMaxConcurrentFlashes("2"))
+        self.assertEqual(1, scheduler.GetMaxConcurrentFlashes("3"))
+
+    def testSlotOnSharedBus(self):
+        """Tests that devices on a USB 2.0 bus flash one at a time."""
+        scheduler = self._CreateScheduler()
+        acquired = threading.Event()
+
+        def AcquireSlot():
+            with scheduler.Slot("ABC002"):
+                acquired.set()
+
+        with scheduler.Slot("ABC001"):
+            thread = threading.Thread(target=AcquireSlot)
+            thread.daemon = True
+            thread.start()
+            self.assertFalse(acquired.wait(0.5))
+            # Devices on another bus or unknown devices are not blocked.
+            with scheduler.Slot("ABC003"):
+                pass
+            with scheduler.Slot("UNKNOWN"):
+                pass
+        self.assertTrue(acquired.wait(5))
+        thread.join()
+
+    def testSlotDisabled(self):
+        """Tests that zero budget disables the limit."""
+        scheduler = self._CreateScheduler(per_flash_mbps=0)
+        with scheduler.Slot("ABC001"):
+            with scheduler.Slot("ABC002"):
+                pass
+        self.assertFalse(os.path.exists(self._lock_dir))
+
+
+if __name__ == "__main__":
+    unittest.main()
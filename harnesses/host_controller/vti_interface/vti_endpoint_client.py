@@ -19,6 +19,8 @@ import requests
 import threading
 import time
 
+from host_controller.utils.metrics import metrics
+
 # Job status dict
 JOB_STATUS_DICT = {
     # scheduled but not leased yet
@@ -32,6 +34,21 @@ JOB_STATUS_DICT = {
 }
 
 
+def _Post(method, url, **kwargs):
+    """Sends a POST request and records its latency.
+
+    Args:
+        method: string, the name of the client method, used as the label.
+        url: string, the request URL.
+        **kwargs: the arguments of requests.post.
+
+    Returns:
+        requests.Response.
+    """
+    with metrics.RequestTimer("vti", method):
+        return requests.post(url, **kwargs)
+
+
 class VtiEndpointClient(object):
     """VTI (Vendor Test Infrastructure) endpoint client.
 
@@ -68,8 +85,8 @@ class VtiEndpointClient(object):
         url = self._url + "build_info/v1/set"
         fail = False
         for build in builds:
-            response = requests.post(url, data=json.dumps(build),
-                                     headers=self._headers)
+            response = _Post("UploadBuildInfo", url, data=json.dumps(build),
+                             headers=self._headers)
             if response.status_code != requests.codes.ok:
                 print("UploadBuildInfo error: %s" % response)
                 fail = True
@@ -98,8 +115,8 @@ class VtiEndpointClient(object):
                 "product": device["product"],
                 "status": device["status"]}
             payload["devices"].append(new_device)
-        response = requests.post(url, data=json.dumps(payload),
-                                 headers=self._headers)
+        response = _Post("UploadDeviceInfo", url, data=json.dumps(payload),
+                         headers=self._headers)
         if response.status_code != requests.codes.ok:
             print("UploadDeviceInfo error: %s" % response)
             return False
@@ -119,9 +136,9 @@ class VtiEndpointClient(object):
 
         url = self._url + "schedule_info/v1/clear"
         succ = True
-        response = requests.post(
-            url, data=json.dumps({"manifest_branch": "na"}),
-            headers=self._headers)
+        response = _Post("UploadScheduleInfo", url,
+                         data=json.dumps({"manifest_branch": "na"}),
+                         headers=self._headers)
         if response.status_code != requests.codes.ok:
             print("UploadScheduleInfo error: %s" % response)
             succ = False
@@ -148,8 +165,9 @@ class VtiEndpointClient(object):
                     schedule["test_branch"] = test_schedule.test_branch
                     schedule["test_build_target"] = test_schedule.test_build_target
                     schedule["test_pab_account_id"] = test_schedule.test_pab_account_id
-                    response = requests.post(url, data=json.dumps(schedule),
-                                             headers=self._headers)
+                    response = _Post("UploadScheduleInfo", url,
+                                     data=json.dumps(schedule),
+                                     headers=self._headers)
                     if response.status_code != requests.codes.ok:
                         print("UploadScheduleInfo error: %s" % response)
                         succ = False
@@ -169,8 +187,8 @@ class VtiEndpointClient(object):
 
         url = self._url + "lab_info/v1/clear"
         succ = True
-        response = requests.post(url, data=json.dumps({"name": "na"}),
-                                 headers=self._headers)
+        response = _Post("UploadLabInfo", url, data=json.dumps({"name": "na"}),
+                         headers=self._headers)
         if response.status_code != requests.codes.ok:
             print("UploadLabInfo error: %s" % response)
             succ = False
@@ -197,8 +215,8 @@ class VtiEndpointClient(object):
                         new_device["product"] = device.product
                         new_host["device"].append(new_device)
                 lab["host"].append(new_host)
-            response = requests.post(url, data=json.dumps(lab),
-                                     headers=self._headers)
+            response = _Post("UploadLabInfo", url, data=json.dumps(lab),
+                             headers=self._headers)
             if response.status_code != requests.codes.ok:
                 print("UploadLabInfo error: %s" % response)
                 succ = False
@@ -220,8 +238,9 @@ class VtiEndpointClient(object):
             return None, {}
 
         url = self._url + "job_queue/v1/get"
-        response = requests.post(url, data=json.dumps({"hostname": hostname}),
-                                 headers=self._headers)
+        response = _Post("LeaseJob", url,
+                         data=json.dumps({"hostname": hostname}),
+                         headers=self._headers)
         if response.status_code != requests.codes.ok:
             print("LeaseJob error: %s" % response.status_code)
             return None, {}
@@ -278,8 +297,8 @@ class VtiEndpointClient(object):
 
         thread = threading.currentThread()
         while getattr(thread, 'keep_running', True):
-            response = requests.post(url, data=json.dumps(self._job),
-                                     headers=self._headers)
+            response = _Post("UpdateLeasedJobStatus", url,
+                             data=json.dumps(self._job), headers=self._headers)
             if response.status_code != requests.codes.ok:
                 print("UpdateLeasedJobStatus error: %s" % response)
             time.sleep(update_interval)
@@ -318,8 +337,8 @@ class VtiEndpointClient(object):
             self._job["status"] == JOB_STATUS_DICT["leased"]):
             self._job["status"] = JOB_STATUS_DICT[status]
 
-        response = requests.post(url, data=json.dumps(self._job),
-                                 headers=self._headers)
+        response = _Post("StopHeartbeat", url, data=json.dumps(self._job),
+                         headers=self._headers)
         if response.status_code != requests.codes.ok:
             print("StopHeartbeat error: %s" % response)
 